@@ -0,0 +1,5 @@
+"""Benchmarks of the hot views and tasks.
+
+Run them against a database populated by the generate_community command,
+see run.py for usage.
+"""
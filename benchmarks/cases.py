@@ -0,0 +1,192 @@
+"""The benchmarked views and tasks.
+
+Each case is set up once, from the data found in the database (for example
+the most followed user), and returns the callable that is measured. Setup
+and measurements run in a transaction that is rolled back, so cases can
+modify the data freely.
+"""
+from dataclasses import dataclass
+from typing import Callable, List
+
+from actstream.models import Action
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Q
+from django.test import Client
+from django.urls import reverse
+
+import dillo.tasks.feeds
+from dillo.models.comments import Comment
+from dillo.models.feeds import ActionExtra, ActionGroup, ExploreFeedItem, FeedEntry
+from dillo.models.posts import Post
+from dillo.models.profiles import Profile
+
+
+class SetupError(Exception):
+    """The database does not contain the data needed by a case."""
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[['Context'], Callable[[], None]]
+
+
+class Context:
+    """Shared state of the cases, such as the test client."""
+
+    def __init__(self, search_term: str):
+        self.search_term = search_term
+        self.client = Client()
+
+
+def task_function(task):
+    """Return the function wrapped by a background task.
+
+    Tasks are measured as the worker would run them, whether or not
+    BACKGROUND_TASKS_AS_FOREGROUND is set.
+    """
+    return getattr(task, 'task_function', task)
+
+
+def get(context: Context, url: str, **params) -> Callable[[], None]:
+    def request():
+        response = context.client.get(url, params)
+        if response.status_code != 200:
+            raise AssertionError(f'GET {url} returned {response.status_code}')
+
+    return request
+
+
+def get_most_followed_user() -> User:
+    profile = Profile.objects.order_by('-followers_count', 'user_id').first()
+    if not profile:
+        raise SetupError('No users found')
+    return profile.user
+
+
+def setup_post_list(sort: str, layout: str):
+    def setup(context: Context):
+        return get(context, reverse('embed_posts_list'), sort=sort, layout=layout)
+
+    return setup
+
+
+def setup_comments_list(context: Context):
+    """Comments of the most commented post."""
+    post_ct = ContentType.objects.get_for_model(Post)
+    most_commented = (
+        Comment.objects.filter(entity_content_type=post_ct, parent_comment__isnull=True)
+        .values('entity_object_id')
+        .annotate(comments=Count('id'))
+        .order_by('-comments')
+        .first()
+    )
+    if not most_commented:
+        raise SetupError('No comments found')
+    url = reverse(
+        'api-comments-list',
+        kwargs={
+            'entity_content_type_id': post_ct.id,
+            'entity_object_id': most_commented['entity_object_id'],
+        },
+    )
+    return get(context, url)
+
+
+def setup_user_list(context: Context):
+    return get(context, reverse('api-user-list'))
+
+
+def setup_user_globe(context: Context):
+    return get(context, reverse('api-user-globe'))
+
+
+def setup_notifications(context: Context):
+    """Notifications of the user with the most of them."""
+    most_notified = (
+        FeedEntry.objects.filter(category='notification')
+        .values('user_id')
+        .annotate(entries=Count('id'))
+        .order_by('-entries')
+        .first()
+    )
+    if not most_notified:
+        raise SetupError('No notifications found')
+    context.client.force_login(User.objects.get(pk=most_notified['user_id']))
+    return get(context, reverse('api-notifications'))
+
+
+def setup_posts_search(context: Context):
+    return get(context, reverse('embed_posts_search'), q=context.search_term)
+
+
+def setup_reel_detail(context: Context):
+    """The reel in the middle of the reels gallery."""
+    profiles = Profile.objects.exclude(Q(reel='') | Q(reel_thumbnail_16_9='')).order_by(
+        '-likes_count', 'user_id'
+    )
+    count = profiles.count()
+    if not count:
+        raise SetupError('No reels found')
+    profile = profiles[count // 2]
+    return get(context, reverse('reel-detail', kwargs={'profile_id': profile.user_id}))
+
+
+def setup_activity_fanout(context: Context):
+    """Fan out the latest post of the most followed user."""
+    user = get_most_followed_user()
+    action = (
+        Action.objects.filter(
+            actor_content_type=ContentType.objects.get_for_model(User),
+            actor_object_id=str(user.id),
+            verb='posted',
+        )
+        .order_by('-timestamp')
+        .first()
+    )
+    if not action:
+        raise SetupError('The most followed user has no posts')
+    fanout = task_function(dillo.tasks.feeds.activity_fanout_to_feeds)
+    # Start from the state before the action was fanned out
+    FeedEntry.objects.filter(action=action).delete()
+    ExploreFeedItem.objects.filter(action=action).delete()
+    ActionExtra.objects.filter(action=action).delete()
+    ActionGroup.objects.filter(parent_action=action).delete()
+    return lambda: fanout(action.id)
+
+
+def setup_repopulate_timeline(context: Context):
+    """A user starts following the most followed user."""
+    followed = get_most_followed_user()
+    follower = (
+        User.objects.exclude(pk=followed.pk).order_by('-profile__following_count', 'id').first()
+    )
+    if not follower:
+        raise SetupError('No users found')
+    user_ct = ContentType.objects.get_for_model(User)
+    repopulate = task_function(dillo.tasks.feeds.repopulate_timeline_content)
+    # Make sure that the posts are not in the timeline already
+    FeedEntry.objects.filter(
+        user=follower,
+        category='timeline',
+        action__actor_content_type=user_ct,
+        action__actor_object_id=str(followed.id),
+    ).delete()
+    return lambda: repopulate(user_ct.id, followed.id, follower.id, 'follow')
+
+
+CASES: List[Case] = [
+    Case('posts_top_list', setup_post_list('top', 'list')),
+    Case('posts_top_grid', setup_post_list('top', 'grid')),
+    Case('posts_latest_list', setup_post_list('latest', 'list')),
+    Case('posts_latest_grid', setup_post_list('latest', 'grid')),
+    Case('comments_list', setup_comments_list),
+    Case('user_list', setup_user_list),
+    Case('user_globe', setup_user_globe),
+    Case('notifications', setup_notifications),
+    Case('posts_search', setup_posts_search),
+    Case('reel_detail', setup_reel_detail),
+    Case('activity_fanout_to_feeds', setup_activity_fanout),
+    Case('repopulate_timeline_content', setup_repopulate_timeline),
+]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""Measure latency, queries and peak memory of the hot views and tasks.
+
+The benchmarks run against the database of the settings module, which
+should be populated first with the generate_community command, e.g.:
+
+    ./manage.py generate_community --users 10000
+    python -m benchmarks.run --settings mysite.settings --baseline benchmarks/baseline.json
+
+Results are written as JSON (--output). When a baseline file is given, the
+results are compared with it, and the exit status is 1 if any case got
+slower, or uses more queries or memory, than the tolerance allows. Use
+--save-baseline to store the results as the new baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+import django
+
+# Metrics compared with the baseline, and whether they allow for tolerance
+COMPARED_METRICS = {'p95_ms': True, 'queries': False, 'peak_memory_kb': True}
+# Queries of the savepoint that every measured run is wrapped in
+SAVEPOINT_QUERIES = 3
+
+
+def percentile(timings: List[float], value: int) -> float:
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[value - 1]
+
+
+def measure(run, iterations: int, warmup: int) -> Dict:
+    """Measure the callable run, each time in a savepoint that is rolled back."""
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    def run_and_rollback():
+        with transaction.atomic():
+            run()
+            transaction.set_rollback(True)
+
+    for _ in range(warmup):
+        run_and_rollback()
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            run_and_rollback()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+
+    # Tracing allocations slows down the code, so memory is measured separately
+    tracemalloc.start()
+    try:
+        run_and_rollback()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'queries': max(queries) - SAVEPOINT_QUERIES,
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def run_benchmarks(
+    iterations: int = 20, warmup: int = 2, only=None, search_term: str = 'render'
+) -> Dict:
+    from django.conf import settings
+    from django.db import transaction
+
+    from benchmarks.cases import CASES, Context, SetupError
+
+    context = Context(search_term=search_term)
+    results = {}
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        with transaction.atomic():
+            try:
+                run = case.setup(context)
+            except SetupError as e:
+                print(f'{case.name:<30} skipped: {e}')
+                continue
+            results[case.name] = measure(run, iterations, warmup)
+            transaction.set_rollback(True)
+        print(
+            '{:<30} p50 {p50_ms:>9.2f}ms  p95 {p95_ms:>9.2f}ms  p99 {p99_ms:>9.2f}ms  '
+            '{queries:>5} queries  {peak_memory_kb:>7} KiB'.format(case.name, **results[case.name])
+        )
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'database': settings.DATABASES['default']['NAME'],
+        'iterations': iterations,
+        'cases': results,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return the regressions of results compared with baseline."""
+    regressions = []
+    for name, metrics in results['cases'].items():
+        baseline_metrics = baseline['cases'].get(name)
+        if not baseline_metrics:
+            continue
+        for metric, tolerated in COMPARED_METRICS.items():
+            limit = baseline_metrics[metric]
+            if tolerated:
+                limit *= 1 + tolerance
+            if metrics[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {metrics[metric]} (baseline {baseline_metrics[metric]})'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', help='Settings module, default DJANGO_SETTINGS_MODULE')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', nargs='+', help='Names of the cases to run')
+    parser.add_argument('--search-term', default='render', help='Query of the posts search')
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--baseline', help='Compare the results with this file')
+    parser.add_argument(
+        '--save-baseline', action='store_true', help='Write the results to the baseline file'
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25, help='Allowed slowdown, as a fraction'
+    )
+    args = parser.parse_args()
+
+    if args.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    django.setup()
+    from django.test.utils import setup_test_environment
+
+    # Allow the test client host, and keep emails in memory
+    setup_test_environment()
+    results = run_benchmarks(args.iterations, args.warmup, args.only, args.search_term)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    sys.exit(bool(regressions))
+
+
+if __name__ == '__main__':
+    main()
@@ -464,7 +464,7 @@ class UserAdmin(BaseUserAdmin):
     def make_member(self, request, queryset):
         for u in queryset:
             u.profile.trust_level = dillo.models.profiles.TrustLevel.MEMBER
-            u.profile.save()
+            u.profile.save(update_fields=['trust_level'])
         self.message_user(request, "Set 'member' status.")
 
     def get_queryset(self, request):
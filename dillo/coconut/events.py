@@ -1,16 +1,24 @@
 # Collection of functions used when the coconut_webhook is called
 
 import logging
+import select
+import time
 from urllib.parse import urlparse
 
 from django.conf import settings
+from django.db import connection
 from django.http.response import JsonResponse
+from dillo.encoding import get_preview_format, get_stream_path
 from dillo.models.entities import Entity
 from dillo.models.static_assets import Video
-from dillo.tasks.files import move_blob_from_upload_to_storage
+from dillo.tasks.files import move_blob_from_upload_to_storage, move_blobs_from_upload_to_storage
 
 log = logging.getLogger(__name__)
 
+# PostgreSQL channel notified with the id of the owner of an entity, when
+# the processing status of the entity changes
+PROCESSING_STATUS_CHANNEL = 'dillo_processing_status'
+
 
 def source_transferred(job: dict, video: Video):
     """Handle a source.transferred event."""
@@ -51,6 +59,41 @@ def output_processed_video(job: dict, video: Video):
         move_blob_from_upload_to_storage(source_path)
 
 
+def output_processed_preview(job: dict, video: Video):
+    """Handle an output.processed event for a looping preview.
+
+    Animated images (gif or webp) are used as url_preview, animated WebP
+    being preferred when both exist. A muted mp4 is used as url_preview_video.
+    """
+    output_processed_video(job, video)
+    preview_format = get_preview_format(job['format'])
+    if preview_format == 'mp4':
+        video.has_preview_video = True
+    elif preview_format == 'webp' or video.preview_format != 'webp':
+        video.preview_format = preview_format
+    video.save()
+
+
+def output_processed_stream(job: dict, video: Video):
+    """Handle an output.processed event for the httpstream.
+
+    The httpstream is a directory containing the HLS master playlist and
+    one sub-directory (playlist and segments) for each variant.
+    """
+    stream_path = get_stream_path(video.static_asset.source.name)
+    if settings.DEFAULT_FILE_STORAGE == 'storages.backends.s3boto3.S3Boto3Storage':
+        move_blobs_from_upload_to_storage(f'{stream_path}/')
+
+    video.has_stream = True
+    video.save()
+
+
+def job_progress(job: dict, video: Video):
+    """Handle a job.progress event, where progress is a string like '45%'."""
+    video.encoding_job_progress = job['progress']
+    video.save(update_fields=['encoding_job_progress'])
+
+
 def job_completed(job: dict, video: Video, entity):
     if not isinstance(entity, Entity):
         return
@@ -60,3 +103,92 @@ def job_completed(job: dict, video: Video, entity):
         return
     log.debug('Video has been processed, attempting to publish')
     entity.publish()
+
+
+def notify_processing_status(entity):
+    """Notify the owner of an entity that its processing status changed.
+
+    The notification is delivered once the current transaction is committed,
+    to the ProcessingStatusListener of any database connection.
+    """
+    user_id = getattr(entity, 'user_id', None)
+    if user_id is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [PROCESSING_STATUS_CHANNEL, str(user_id)])
+
+
+class ProcessingStatusListener:
+    """Listen to the processing status notifications of a user.
+
+    Used as a context manager, so that the database connection stops
+    listening when done.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+    def __enter__(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {PROCESSING_STATUS_CHANNEL}')
+        return self
+
+    def __exit__(self, *args):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UNLISTEN {PROCESSING_STATUS_CHANNEL}')
+        del connection.connection.notifies[:]
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for a notification for the user, for at most timeout seconds.
+
+        Return False if none was received in time.
+        """
+        pg_connection = connection.connection
+        deadline = time.monotonic() + timeout
+        while True:
+            pg_connection.poll()
+            user_ids = {n.payload for n in pg_connection.notifies}
+            del pg_connection.notifies[:]
+            if str(self.user_id) in user_ids:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            select.select([pg_connection], [], [], remaining)
+
+
+def process_event(job: dict, video: Video, entity):
+    """Dispatch an encoding job event to the matching handler.
+
+    The job dict follows the format of the Coconut webhook payload, and
+    is also produced by the local encoding backend (dillo.encoding.local).
+    """
+    if video.encoding_job_id != job['id']:
+        # If the job id changed, we likely restarted the job (manually)
+        video.encoding_job_status = None
+        video.encoding_job_id = job['id']
+        video.save()
+
+    log.info('Updating video %i processing status: %s' % (video.id, job['event']))
+    # On source.transferred
+    if job['event'] == 'source.transferred':
+        source_transferred(job, video)
+    # On output.processed (thumbnail)
+    elif job['event'] == 'output.processed' and job['format'].startswith('jpg'):
+        output_processed_images(job, video)
+    # On output.processed (adaptive bitrate stream)
+    elif job['event'] == 'output.processed' and job['format'].startswith('httpstream'):
+        output_processed_stream(job, video)
+    # On output.processed (looping preview)
+    elif job['event'] == 'output.processed' and get_preview_format(job['format']):
+        output_processed_preview(job, video)
+    # On output.processed (video variation)
+    elif job['event'] == 'output.processed' and job['format'].startswith('mp4'):
+        output_processed_video(job, video)
+    # On job.progress
+    elif job['event'] == 'job.progress':
+        job_progress(job, video)
+    # On job.completed
+    elif job['event'] == 'job.completed':
+        job_completed(job, video, entity)
+    notify_processing_status(entity)
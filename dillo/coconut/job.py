@@ -1,6 +1,6 @@
-import requests
 from requests.auth import HTTPBasicAuth
 
+from dillo import http_client
 from dillo.coconut import config
 
 USER_AGENT = 'Coconut/2.2.0 (Python)'
@@ -8,7 +8,7 @@ USER_AGENT = 'Coconut/2.2.0 (Python)'
 
 def submit(config_content, **kwargs):
     headers = {'User-Agent': USER_AGENT, 'Content-Type': 'text/plain', 'Accept': 'application/json'}
-    response = requests.post(
+    response = http_client.post(
         'https://api.coconut.co/v1/job',
         data=config_content,
         headers=headers,
@@ -0,0 +1,119 @@
+"""Counters buffered in memory and written to the database in batches.
+
+Incrementing a counter does not touch the database. Increments are added
+up in the process, and flushed COUNTERS_FLUSH_INTERVAL seconds (default 10)
+after the first pending one, with one UPDATE ... SET field = field + n
+statement for all the rows incremented by the same amount. Counts in the
+database are then late by at most the flush interval, and hot rows are
+updated once per interval instead of once per hit.
+
+With COUNTERS_FLUSH_INTERVAL = 0 increments are flushed immediately.
+Pending increments are also flushed when the process exits.
+"""
+import atexit
+import collections
+import logging
+import threading
+import typing
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+
+_counters: typing.List['BufferedCounter'] = []
+_lock = threading.Lock()
+_timer: typing.Optional[threading.Timer] = None
+
+
+class BufferedCounter:
+    """A counter field of a model, incremented in batches.
+
+    Rows are identified by the value of their lookup field, for example
+    user_id for the Profile of a user.
+    """
+
+    def __init__(self, model: str, field: str, lookup: str = 'pk'):
+        self.model = model
+        self.field = field
+        self.lookup = lookup
+        self.pending: typing.Dict[typing.Any, int] = collections.Counter()
+        _counters.append(self)
+
+    def __repr__(self):
+        return f'BufferedCounter({self.model}.{self.field})'
+
+    def increment(self, key, amount: int = 1):
+        """Add amount to the counter of the row matching key."""
+        with _lock:
+            self.pending[key] += amount
+        schedule_flush()
+
+    def get_pending(self, key) -> int:
+        """Return the increments of a row not flushed yet."""
+        with _lock:
+            return self.pending.get(key, 0)
+
+    def write(self, pending: typing.Dict[typing.Any, int]):
+        """Write increments, grouping the rows incremented by the same amount."""
+        model = apps.get_model(self.model)
+        keys_by_amount = collections.defaultdict(list)
+        for key, amount in pending.items():
+            keys_by_amount[amount].append(key)
+        for amount, keys in keys_by_amount.items():
+            # Sorted, so that concurrent flushes lock rows in the same order
+            rows = model.objects.filter(**{f'{self.lookup}__in': sorted(keys)})
+            rows.update(**{self.field: F(self.field) + amount})
+        log.debug('Flushed %i rows of %r' % (len(pending), self))
+
+
+def flush():
+    """Write all pending increments to the database."""
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        pending = []
+        for counter in _counters:
+            if counter.pending:
+                pending.append((counter, counter.pending))
+                counter.pending = collections.Counter()
+    for counter, counter_pending in pending:
+        try:
+            counter.write(counter_pending)
+        except Exception:
+            log.exception('Failed flushing %r, %i rows lost' % (counter, len(counter_pending)))
+
+
+def flush_in_thread():
+    try:
+        flush()
+    finally:
+        # The thread is about to end, do not leave its connection open
+        connection.close()
+
+
+def schedule_flush():
+    """Flush the pending increments at the end of the flush interval."""
+    global _timer
+    interval = getattr(settings, 'COUNTERS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    if not interval:
+        flush()
+        return
+    with _lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(interval, flush_in_thread)
+        _timer.daemon = True
+        _timer.start()
+
+
+atexit.register(flush)
+
+profile_views = BufferedCounter('dillo.Profile', 'views_count', lookup='user_id')
+video_views = BufferedCounter('dillo.Video', 'views_count', lookup='static_asset_id')
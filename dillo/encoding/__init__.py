@@ -0,0 +1,119 @@
+"""Video encoding backends.
+
+An encoder takes the source of a Video and produces the versions listed
+in OUTPUTS. Regardless of the backend, progress is reported through the
+handlers in dillo.coconut.events, which update the Video and publish the
+entity once the job is completed.
+
+The backend is picked with the VIDEO_ENCODING_BACKEND setting, which can
+be 'coconut' (default), 'local' or a dotted path to an Encoder subclass.
+"""
+import json
+import logging
+import pathlib
+import subprocess
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+log = logging.getLogger(__name__)
+
+# Output formats (using the Coconut syntax) and the suffix replacing the
+# extension of the source path. The httpstream output is a directory.
+OUTPUTS = {
+    'jpg:1280x': '.thumbnail.jpg',
+    'mp4:0x720_3000k': '.720p.mp4',
+    'httpstream': '.stream',
+}
+
+# Looping previews shown when hovering video thumbnails. The formats
+# produced are set with VIDEO_PREVIEW_FORMATS. The 'gif' preview is the
+# legacy one, animated WebP and muted MP4 are much smaller. 'noa' drops
+# the audio track of the MP4 preview, like '-an' in the local encoder.
+PREVIEW_OUTPUTS = {
+    'gif': ('gif:240x', '.preview.gif'),
+    'webp': ('webp:240x', '.preview.webp'),
+    'mp4': ('mp4:240x_400k_noa', '.preview.mp4'),
+}
+DEFAULT_PREVIEW_FORMATS = ['webp', 'mp4']
+
+# Adaptive bitrate ladder of the httpstream output, as (height, video bitrate)
+STREAM_VARIANTS = [
+    (360, '800k'),
+    (480, '1500k'),
+    (720, '3000k'),
+]
+
+# HLS master playlist, at the root of the httpstream output directory
+STREAM_MANIFEST = 'master.m3u8'
+
+ENCODERS = {
+    'coconut': 'dillo.encoding.coconut.CoconutEncoder',
+    'local': 'dillo.encoding.local.LocalEncoder',
+}
+
+
+class Encoder:
+    """Base class for video encoding backends."""
+
+    def submit(self, content_type_id: str, object_id: str, video_id: int):
+        """Encode the video attached to an entity.
+
+        The arguments are the same as the create_video_encoding_job task,
+        which calls this method.
+        """
+        raise NotImplementedError
+
+
+def get_encoder() -> Encoder:
+    """Return an instance of the configured encoding backend."""
+    backend = getattr(settings, 'VIDEO_ENCODING_BACKEND', 'coconut')
+    return import_string(ENCODERS.get(backend, backend))()
+
+
+def get_preview_formats() -> list:
+    return getattr(settings, 'VIDEO_PREVIEW_FORMATS', DEFAULT_PREVIEW_FORMATS)
+
+
+def get_outputs(source_path) -> dict:
+    """Map each output format to its path, relative to the storage root."""
+    source_path = pathlib.PurePath(source_path)
+    outputs = {format: str(source_path.with_suffix(suffix)) for format, suffix in OUTPUTS.items()}
+    for preview_format in get_preview_formats():
+        format, suffix = PREVIEW_OUTPUTS[preview_format]
+        outputs[format] = str(source_path.with_suffix(suffix))
+    return outputs
+
+
+def get_preview_paths(source_path) -> list:
+    """Paths of all the possible previews, regardless of VIDEO_PREVIEW_FORMATS."""
+    source_path = pathlib.PurePath(source_path)
+    return [str(source_path.with_suffix(suffix)) for _, suffix in PREVIEW_OUTPUTS.values()]
+
+
+def get_preview_format(output_format: str):
+    """Return 'gif', 'webp' or 'mp4' if output_format is a preview, else None."""
+    for preview_format, (format, _) in PREVIEW_OUTPUTS.items():
+        if format == output_format:
+            return preview_format
+    return None
+
+
+def get_stream_path(source_path) -> str:
+    """Path of the httpstream output directory, relative to the storage root."""
+    return str(pathlib.PurePath(source_path).with_suffix(OUTPUTS['httpstream']))
+
+
+def get_video_data_with_ffprobe(filepath) -> dict:
+    """Return video duration and resolution given an input file path."""
+    ffprobe_inspect = [
+        getattr(settings, 'FFPROBE_BIN', 'ffprobe'),
+        '-loglevel',
+        'error',
+        '-show_streams',
+        str(filepath),
+        '-print_format',
+        'json',
+    ]
+
+    return json.loads(subprocess.check_output(ffprobe_inspect))
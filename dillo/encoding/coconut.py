@@ -0,0 +1,75 @@
+import logging
+
+from django.conf import settings
+from django.urls import reverse
+
+import dillo.coconut.job
+import dillo.models.static_assets
+from dillo.encoding import Encoder, get_outputs, STREAM_VARIANTS
+from dillo.tasks.storage import get_storage_paths
+
+log = logging.getLogger(__name__)
+
+
+class CoconutEncoder(Encoder):
+    """Encode videos with the Coconut API.
+
+    The video versions produced are the following:
+    - a jpg thumbnail, 1280px wide
+    - looping previews, 240px wide and without audio, in the formats set
+      by VIDEO_PREVIEW_FORMATS (animated webp and mp4 by default)
+    - a regular 720p, h264 with mp4 container
+    - an httpstream using fragmented mp4, packaged for HLS, with the
+      variants listed in STREAM_VARIANTS (360p, 480p and 720p)
+
+    Encoding updates are sent by Coconut to the coconut_webhook view.
+    """
+
+    def submit(self, content_type_id: str, object_id: str, video_id: int):
+        if not getattr(settings, 'COCONUT_API_KEY', None):
+            log.info('Missing COCONUT_API_KEY: no video encoding will be performed')
+            return
+
+        storage_base_src, storage_base_dst = get_storage_paths()
+
+        video = dillo.models.static_assets.Video.objects.get(id=video_id)
+        source_path = video.static_asset.source.name
+
+        # Outputs, with paths relative to MEDIA_ROOT
+        outputs = {
+            format: f'{storage_base_dst}{path}' for format, path in get_outputs(source_path).items()
+        }
+
+        # The httpstream, using fragmented mp4 packaged for HLS, with one
+        # variant for each step of the bitrate ladder
+        httpstream_variants = ','.join(
+            f'mp4:{height}p_{bitrate}' for height, bitrate in STREAM_VARIANTS
+        )
+        httpstream_dst = outputs['httpstream']
+        outputs['httpstream'] = f'{httpstream_dst}/, hlsfmp4=/, variants={httpstream_variants}'
+
+        # Webhook for encoding updates
+        job_webhook = reverse(
+            'coconut-webhook',
+            kwargs={
+                'content_type_id': content_type_id,
+                'object_id': object_id,
+                'video_id': video_id,
+            },
+        )
+
+        j = dillo.coconut.job.create(
+            api_key=settings.COCONUT_API_KEY,
+            source=f'{storage_base_src}{source_path}',
+            webhook=f'{settings.COCONUT_DECLARED_HOSTNAME}{job_webhook}, events=true, metadata=true',
+            outputs=outputs,
+        )
+
+        if j['status'] == 'processing':
+            log.info('Started processing job %i' % j['id'])
+            # Events of other jobs for this video are ignored from now on
+            dillo.models.static_assets.Video.objects.filter(id=video_id).exclude(
+                encoding_job_id=j['id']
+            ).update(encoding_job_id=j['id'], encoding_job_status=None)
+        else:
+            log.error('Error processing job %i' % (j['id']))
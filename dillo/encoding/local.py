@@ -0,0 +1,333 @@
+"""Encode videos on the local machine with ffmpeg.
+
+The outputs are the same as the ones produced by Coconut, and are stored
+where Coconut would upload them (the uploads bucket when using S3, or
+MEDIA_ROOT otherwise). Each step of the job is reported as a Coconut-like
+event to dillo.coconut.events.process_event, so that Video and entity are
+updated exactly like when the coconut_webhook is called.
+
+ffmpeg processes run in a thread pool shared by all jobs, and limited to
+VIDEO_ENCODING_LOCAL_WORKERS (default 2) concurrent encodes.
+"""
+import dataclasses
+import logging
+import pathlib
+import secrets
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+import dillo.models.static_assets
+from dillo.coconut import events
+from dillo.encoding import (
+    Encoder,
+    get_outputs,
+    get_video_data_with_ffprobe,
+    STREAM_MANIFEST,
+    STREAM_VARIANTS,
+)
+from dillo.tasks.storage import s3_client
+
+log = logging.getLogger(__name__)
+
+# ffmpeg arguments (between input and output file) for every output format
+FFMPEG_OUTPUT_ARGS = {
+    'jpg:1280x': ['-vf', 'thumbnail,scale=1280:-2', '-frames:v', '1'],
+    'gif:240x': [
+        '-vf',
+        'fps=12,scale=240:-2:flags=lanczos,split[a][b];[a]palettegen[p];[b][p]paletteuse',
+        '-an',
+    ],
+    'webp:240x': [
+        '-vf',
+        'fps=12,scale=240:-2',
+        '-c:v',
+        'libwebp_anim',
+        '-quality',
+        '60',
+        '-loop',
+        '0',
+        '-an',
+    ],
+    # Muted, meant to be played in a looping <video>
+    'mp4:240x_400k_noa': [
+        '-vf',
+        'scale=240:-2',
+        '-c:v',
+        'libx264',
+        '-b:v',
+        '400k',
+        '-pix_fmt',
+        'yuv420p',
+        '-an',
+        '-movflags',
+        '+faststart',
+    ],
+    'mp4:0x720_3000k': [
+        '-vf',
+        'scale=-2:720',
+        '-c:v',
+        'libx264',
+        '-b:v',
+        '3000k',
+        '-maxrate',
+        '3000k',
+        '-bufsize',
+        '6000k',
+        '-pix_fmt',
+        'yuv420p',
+        '-c:a',
+        'aac',
+        '-b:a',
+        '128k',
+        '-movflags',
+        '+faststart',
+    ],
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the thread pool running ffmpeg, creating it if needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'VIDEO_ENCODING_LOCAL_WORKERS', 2),
+                thread_name_prefix='ffmpeg',
+            )
+    return _executor
+
+
+def new_job_id() -> int:
+    """Return a random, negative job id.
+
+    Local job ids never collide with Coconut ones, which are positive, and
+    are not ordered: only the job recorded on the Video is the current one.
+    """
+    # Video.encoding_job_id is a 32-bit integer
+    return -(secrets.randbelow(2147483647) + 1)
+
+
+@dataclasses.dataclass
+class EncodingReport:
+    """Timing of an encoding job."""
+
+    job_id: int
+    source_duration: float = 0.0
+    wall_time: float = 0.0
+    output_times: typing.Dict[str, float] = dataclasses.field(default_factory=dict)
+
+    @property
+    def realtime_factor(self) -> float:
+        """Seconds of source video encoded per second of wall time."""
+        if not self.wall_time:
+            return 0.0
+        return self.source_duration / self.wall_time
+
+
+def get_stream_variants(streams: list) -> list:
+    """Return the STREAM_VARIANTS not taller than the source video."""
+    video_stream = next(item for item in streams if item['codec_type'] == 'video')
+    variants = [v for v in STREAM_VARIANTS if v[0] <= video_stream['height']]
+    # Always keep at least the smallest variant
+    return variants or STREAM_VARIANTS[:1]
+
+
+def get_stream_args(streams: list, dst) -> typing.List[str]:
+    """Build ffmpeg arguments to package the source as an HLS ladder in dst.
+
+    Every variant gets its own directory, referenced by the master playlist.
+    """
+    variants = get_stream_variants(streams)
+    has_audio = any(stream['codec_type'] == 'audio' for stream in streams)
+    split = f'[0:v]split={len(variants)}' + ''.join(f'[v{i}]' for i in range(len(variants)))
+    scales = [f'[v{i}]scale=-2:{height}[v{i}o]' for i, (height, _) in enumerate(variants)]
+    args = ['-filter_complex', ';'.join([split, *scales])]
+    for i, (_, bitrate) in enumerate(variants):
+        args += ['-map', f'[v{i}o]']
+        if has_audio:
+            args += ['-map', '0:a:0']
+        args += [f'-b:v:{i}', bitrate, f'-maxrate:v:{i}', bitrate]
+        args += [f'-bufsize:v:{i}', f'{int(bitrate[:-1]) * 2}k']
+    stream_map = ' '.join(f'v:{i},a:{i}' if has_audio else f'v:{i}' for i in range(len(variants)))
+    args += [
+        '-c:v',
+        'libx264',
+        '-pix_fmt',
+        'yuv420p',
+        # Fixed GOP, so that segments of all variants are aligned
+        '-g',
+        '48',
+        '-keyint_min',
+        '48',
+        '-sc_threshold',
+        '0',
+        '-c:a',
+        'aac',
+        '-b:a',
+        '128k',
+        '-f',
+        'hls',
+        '-hls_time',
+        '4',
+        '-hls_playlist_type',
+        'vod',
+        '-hls_segment_type',
+        'fmp4',
+        '-hls_segment_filename',
+        f'{dst}/%v/segment_%03d.m4s',
+        '-master_pl_name',
+        STREAM_MANIFEST,
+        '-var_stream_map',
+        stream_map,
+    ]
+    return args
+
+
+def get_ffmpeg_command(format: str, src, dst, streams: list = ()) -> typing.List[str]:
+    """Build the ffmpeg command for an output format.
+
+    The httpstream format also needs the source streams (as returned by
+    ffprobe) to build the bitrate ladder, and dst is a directory.
+    """
+    if format == 'httpstream':
+        output_args = get_stream_args(streams, dst)
+        dst = f'{dst}/%v/index.m3u8'
+    else:
+        output_args = FFMPEG_OUTPUT_ARGS[format]
+    return [
+        getattr(settings, 'FFMPEG_BIN', 'ffmpeg'),
+        '-loglevel',
+        'error',
+        '-y',
+        '-i',
+        str(src),
+        *output_args,
+        str(dst),
+    ]
+
+
+def encode_output(format: str, src, dst, streams: list = ()) -> float:
+    """Run ffmpeg for one output format and return the elapsed time."""
+    start = time.monotonic()
+    command = get_ffmpeg_command(format, src, dst, streams)
+    subprocess.run(command, check=True, capture_output=True)
+    return time.monotonic() - start
+
+
+def store_output(local_path, key):
+    """Store an encoded file where Coconut would have uploaded it.
+
+    If local_path is a directory, its content is stored under key.
+    """
+    local_path = pathlib.Path(local_path)
+    if local_path.is_dir():
+        for path in sorted(local_path.rglob('*')):
+            if path.is_file():
+                store_output(path, f'{key}/{path.relative_to(local_path).as_posix()}')
+        return
+    if settings.DEFAULT_FILE_STORAGE == 'storages.backends.s3boto3.S3Boto3Storage':
+        log.debug('Uploading %s to %s/%s' % (local_path, settings.AWS_UPLOADS_BUCKET_NAME, key))
+        s3_client.upload_file(str(local_path), settings.AWS_UPLOADS_BUCKET_NAME, key)
+    else:
+        dst = pathlib.Path(settings.MEDIA_ROOT) / key
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_path, dst)
+
+
+def download_source(static_asset, tmp_dir: pathlib.Path) -> pathlib.Path:
+    """Copy the source of a StaticAsset in tmp_dir and return its path."""
+    src = tmp_dir / pathlib.PurePath(static_asset.source.name).name
+    with static_asset.source.open('rb') as source, open(src, 'wb') as fp:
+        shutil.copyfileobj(source, fp)
+    return src
+
+
+def get_source_duration(streams: list) -> float:
+    for stream in streams:
+        if stream['codec_type'] == 'video' and 'duration' in stream:
+            return float(stream['duration'])
+    return 0.0
+
+
+class LocalEncoder(Encoder):
+    """Encode videos with ffmpeg, in a bounded worker pool."""
+
+    def submit(self, content_type_id: str, object_id: str, video_id: int):
+        video = dillo.models.static_assets.Video.objects.get(id=video_id)
+        content_type = ContentType.objects.get_for_id(content_type_id)
+        entity = content_type.get_object_for_this_type(pk=object_id)
+        source_name = video.static_asset.source.name
+        report = EncodingReport(job_id=new_job_id())
+        start = time.monotonic()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = pathlib.Path(tmp_dir)
+            src = download_source(video.static_asset, tmp_dir)
+
+            streams = get_video_data_with_ffprobe(src)['streams']
+            report.source_duration = get_source_duration(streams)
+            self.emit(
+                report,
+                video,
+                entity,
+                event='source.transferred',
+                metadata={'source': {'streams': streams}},
+            )
+
+            outputs = get_outputs(source_name)
+            executor = get_executor()
+            futures = {
+                format: executor.submit(
+                    encode_output, format, src, tmp_dir / pathlib.PurePath(key).name, streams
+                )
+                for format, key in outputs.items()
+            }
+            # Outputs are reported in submission order, as they complete
+            for format, future in futures.items():
+                key = outputs[format]
+                try:
+                    report.output_times[format] = future.result()
+                except subprocess.CalledProcessError as e:
+                    log.error('Error encoding %s for video %i' % (format, video.id))
+                    log.error(e.stderr.decode(errors='replace'))
+                    continue
+                store_output(tmp_dir / pathlib.PurePath(key).name, key)
+                url = f'/{key}/{STREAM_MANIFEST}' if format == 'httpstream' else f'/{key}'
+                if format.startswith('jpg'):
+                    self.emit(
+                        report, video, entity, event='output.processed', format=format, urls=[url]
+                    )
+                else:
+                    self.emit(
+                        report, video, entity, event='output.processed', format=format, url=url
+                    )
+
+        report.wall_time = time.monotonic() - start
+        if len(report.output_times) < len(outputs):
+            log.error('Job %i failed for video %i' % (report.job_id, video.id))
+            video.encoding_job_status = 'job.failed'
+            video.save()
+            return report
+
+        self.emit(report, video, entity, event='job.completed')
+        log.info(
+            'Job %i for video %i completed in %.2fs (%.2fx realtime)'
+            % (report.job_id, video.id, report.wall_time, report.realtime_factor)
+        )
+        return report
+
+    @staticmethod
+    def emit(report: EncodingReport, video, entity, **job):
+        """Send a Coconut-like event to the encoding event handlers."""
+        events.process_event({'id': report.job_id, **job}, video, entity)
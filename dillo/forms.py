@@ -22,11 +22,21 @@ log = logging.getLogger(__name__)
 class ImageWidget(forms.ClearableFileInput):
     """Overrides the ClearableFileInput template_name.
 
-    This way we can display a preview of the image, if available.
+    This way we can display a preview of the image, if available. Otherwise
+    the image at placeholder_url is displayed, if given.
     """
 
     template_name = 'dillo/components/_image_input.html'
 
+    def __init__(self, attrs=None, placeholder_url=None):
+        super().__init__(attrs)
+        self.placeholder_url = placeholder_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['placeholder_url'] = self.placeholder_url
+        return context
+
 
 class PostForm(forms.Form):
     post_id = forms.IntegerField(widget=forms.HiddenInput())
@@ -185,7 +195,7 @@ class CustomSignupMixin(BaseSignupForm):
         cleaned_data = super().clean()
         # Process form again, get the full "Name" and add it to user.profile
         user.profile.name = cleaned_data.get('name')
-        user.profile.save()
+        user.profile.save(update_fields=['name'])
         log.debug("Create user profile for %s" % user.profile.name)
 
         # Generate a user profile starting from the profile.name
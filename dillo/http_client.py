@@ -0,0 +1,148 @@
+"""Shared HTTP client for outbound requests.
+
+Every host gets its own requests.Session, so that connections are pooled
+and reused across requests. Requests get a default timeout, idempotent
+requests are retried with exponential backoff and jitter, and latency and
+errors are counted for each host (see get_stats).
+
+Settings:
+- HTTP_CLIENT_TIMEOUT: (connect, read) timeout in seconds
+- HTTP_CLIENT_RETRIES: retries for idempotent requests
+- HTTP_CLIENT_POOL_SIZE: connections kept open for each host
+"""
+import dataclasses
+import logging
+import random
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests
+import requests.adapters
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_RETRIES = 2
+DEFAULT_POOL_SIZE = 10
+# Chunk size to use with Response.iter_content when streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+# Base delay, in seconds, between retries. Doubled at every attempt.
+RETRY_BACKOFF = 0.3
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+_sessions: typing.Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+@dataclasses.dataclass
+class HostStats:
+    """Counters of the requests sent to a host."""
+
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.requests if self.requests else 0.0
+
+
+_stats: typing.Dict[str, HostStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_session(host: str) -> requests.Session:
+    """Return the pooled Session used for a host."""
+    with _sessions_lock:
+        if host not in _sessions:
+            pool_size = getattr(settings, 'HTTP_CLIENT_POOL_SIZE', DEFAULT_POOL_SIZE)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def record(host: str, elapsed: float, error: bool, retry: bool = False):
+    with _stats_lock:
+        stats = _stats.setdefault(host, HostStats())
+        stats.requests += 1
+        stats.errors += int(error)
+        stats.retries += int(retry)
+        stats.total_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+
+
+def get_stats() -> typing.Dict[str, HostStats]:
+    """Return a copy of the counters of every host."""
+    with _stats_lock:
+        return {host: dataclasses.replace(stats) for host, stats in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def request(method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+    """Send a request with the Session of the url host.
+
+    Accepts the same keyword arguments as requests.request. Unless retries
+    is specified, only idempotent methods are retried, on connection
+    errors and on RETRY_STATUS_CODES. The last response is returned, and
+    the last exception raised, when all attempts fail.
+    """
+    method = method.upper()
+    host = urllib.parse.urlparse(url).netloc
+    if retries is None:
+        retries = (
+            getattr(settings, 'HTTP_CLIENT_RETRIES', DEFAULT_RETRIES)
+            if method in IDEMPOTENT_METHODS
+            else 0
+        )
+    kwargs.setdefault('timeout', getattr(settings, 'HTTP_CLIENT_TIMEOUT', DEFAULT_TIMEOUT))
+    session = get_session(host)
+
+    for attempt in range(retries + 1):
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record(host, time.monotonic() - start, error=True, retry=attempt > 0)
+            log.debug('%s %s failed: %s' % (method, url, e))
+            if attempt == retries:
+                raise
+        else:
+            elapsed = time.monotonic() - start
+            record(host, elapsed, error=response.status_code >= 500, retry=attempt > 0)
+            log.debug(
+                '%s %s returned %i in %.0f ms' % (method, url, response.status_code, elapsed * 1000)
+            )
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+            response.close()
+        # Exponential backoff, with jitter to avoid synchronized retries
+        time.sleep(RETRY_BACKOFF * 2**attempt * random.uniform(0.5, 1.5))
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request('PUT', url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request('DELETE', url, **kwargs)
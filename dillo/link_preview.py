@@ -0,0 +1,204 @@
+"""Previews of links, as shown while writing a post.
+
+Previews are cached by normalized URL for LINK_PREVIEW_CACHE_TTL seconds
+(default one day). Invalid links, and previews that could not be fetched
+completely, are cached for LINK_PREVIEW_NEGATIVE_CACHE_TTL seconds
+(default 5 minutes) instead, so that they are retried soon.
+
+On a cache miss, the oEmbed data and the web page (title and image) of a
+link are fetched concurrently, in a thread pool shared by all requests.
+Both fetches must complete within LINK_PREVIEW_TIMEOUT seconds (default 5),
+otherwise the preview is built with whatever arrived in time. Concurrent
+requests for the same link wait for a single fetch.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests.exceptions
+import webpreview.excepts
+from django.conf import settings
+from django.core.cache import cache
+from micawber.contrib.mcdjango import providers
+from micawber.exceptions import ProviderNotFoundException
+from webpreview import web_preview
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_WORKERS = 8
+DEFAULT_CACHE_TTL = 60 * 60 * 24
+DEFAULT_NEGATIVE_CACHE_TTL = 60 * 5
+# Query parameters that do not change the content of a page
+TRACKING_PARAMETERS = {'fbclid', 'gclid', 'igshid', 'si'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+UNAVAILABLE_HTML = '<div class="unavailable">Preview not available for this URL</div>'
+
+_executor = None
+_executor_lock = threading.Lock()
+# Fetches in progress, by cache key
+_in_flight: typing.Dict[str, concurrent.futures.Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+class InvalidLink(Exception):
+    """The content is not a URL that can be previewed."""
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Return the thread pool fetching previews, creating it if needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'LINK_PREVIEW_WORKERS', DEFAULT_WORKERS),
+                thread_name_prefix='link-preview',
+            )
+    return _executor
+
+
+def fetch_oembed(url: str) -> dict:
+    try:
+        return providers.request(url)
+    except ProviderNotFoundException:
+        return {}
+
+
+def fetch_web_preview(url: str, timeout: float) -> typing.Tuple[str, str, str]:
+    """Return title, description and image of a web page.
+
+    Raise InvalidLink if url can not be requested at all.
+    """
+    try:
+        return web_preview(url, timeout=timeout, parser='html.parser')
+    except (requests.exceptions.InvalidURL, webpreview.excepts.EmptyURL) as e:
+        raise InvalidLink(url) from e
+
+
+def get_result(future: concurrent.futures.Future, deadline: float) -> typing.Tuple[bool, object]:
+    """Wait for future until deadline.
+
+    Return whether the future succeeded, and its result (None otherwise).
+    """
+    try:
+        return True, future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except concurrent.futures.TimeoutError:
+        log.debug('Link preview fetch timed out')
+    except (requests.exceptions.RequestException, webpreview.excepts.WebpreviewException) as e:
+        log.debug('Link preview fetch failed: %s' % e)
+    return False, None
+
+
+def fetch_preview(url: str) -> typing.Tuple[dict, bool]:
+    """Build the preview of a link.
+
+    Return a dict with the 'preview' html and the 'title' of the link, and
+    whether the preview is complete. The values of the dict are None if url
+    is not a valid URL.
+    """
+    timeout = getattr(settings, 'LINK_PREVIEW_TIMEOUT', DEFAULT_TIMEOUT)
+    deadline = time.monotonic() + timeout
+    executor = get_executor()
+    oembed_future = executor.submit(fetch_oembed, url)
+    web_preview_future = executor.submit(fetch_web_preview, url, timeout)
+
+    try:
+        web_preview_ok, web_preview_data = get_result(web_preview_future, deadline)
+    except InvalidLink:
+        oembed_future.cancel()
+        return {'preview': None, 'title': None}, False
+    title, _, image = web_preview_data or (None, None, None)
+    oembed_ok, oembed_preview = get_result(oembed_future, deadline)
+    oembed_preview = oembed_preview or {}
+
+    if 'html' in oembed_preview:
+        preview_html = oembed_preview['html']
+    elif image:
+        preview_html = f'<img src="{image}" alt="Website Preview" />'
+    else:
+        preview_html = UNAVAILABLE_HTML
+
+    if 'title' in oembed_preview:
+        title = oembed_preview['title']
+
+    return {'preview': preview_html, 'title': title}, web_preview_ok and oembed_ok
+
+
+def normalize_url(url: str) -> str:
+    """Return url without fragment, default port and tracking parameters.
+
+    Scheme and host are lowercased, and query parameters are sorted, so that
+    equivalent links share the same cached preview.
+    """
+    url = url.strip()
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ''
+    if ':' in netloc:
+        netloc = f'[{netloc}]'
+    if parts.username:
+        # Credentials are not expected in links, keep them as they are
+        netloc = parts.netloc.rsplit('@', 1)[0] + '@' + netloc
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f':{port}'
+    query = sorted(
+        (key, value)
+        for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith('utm_') and key not in TRACKING_PARAMETERS
+    )
+    return urllib.parse.urlunsplit(
+        (scheme, netloc, parts.path or '/', urllib.parse.urlencode(query), '')
+    )
+
+
+def preview_cache_key(url: str) -> str:
+    return f'dillo:link-preview:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def get_preview(url: str) -> dict:
+    """Return the preview of a link, as built by fetch_preview.
+
+    The preview is fetched only if it is not cached, and only once when
+    several threads ask for the same link at the same time.
+    """
+    url = normalize_url(url)
+    key = preview_cache_key(url)
+    preview = cache.get(key)
+    if preview is not None:
+        return preview
+
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = concurrent.futures.Future()
+            _in_flight[key] = future
+    if not is_owner:
+        log.debug('Waiting for link preview of %s' % url)
+        return future.result()
+
+    try:
+        preview, is_complete = fetch_preview(url)
+        if is_complete:
+            ttl = getattr(settings, 'LINK_PREVIEW_CACHE_TTL', DEFAULT_CACHE_TTL)
+        else:
+            ttl = getattr(settings, 'LINK_PREVIEW_NEGATIVE_CACHE_TTL', DEFAULT_NEGATIVE_CACHE_TTL)
+        cache.set(key, preview, ttl)
+        future.set_result(preview)
+        return preview
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
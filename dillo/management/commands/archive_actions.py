@@ -0,0 +1,26 @@
+from background_task.models import Task
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import dillo.tasks.feeds
+
+
+class Command(BaseCommand):
+    help = 'Move old actions, not shown in any feed, to the archive table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daily',
+            action='store_true',
+            help='Schedule the archival every day, as a background task',
+        )
+
+    def handle(self, *args, **options):
+        if not options['daily']:
+            dillo.tasks.feeds.archive_actions()
+            self.stdout.write(self.style.SUCCESS('Actions archived'))
+            return
+        if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+            raise CommandError('Background tasks are executed in the foreground')
+        dillo.tasks.feeds.archive_actions(repeat=Task.DAILY)
+        self.stdout.write(self.style.SUCCESS('Actions archival scheduled every day'))
@@ -0,0 +1,82 @@
+import pathlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from dillo.coconut import events
+from dillo.encoding import PREVIEW_OUTPUTS, get_outputs, get_preview_formats
+from dillo.encoding.local import download_source, encode_output, store_output
+from dillo.models.static_assets import Video
+
+
+def encode_previews(static_asset, preview_formats: list) -> dict:
+    """Encode and store the previews of a video. Return the stored paths by format."""
+    outputs = get_outputs(static_asset.source.name)
+    formats = [PREVIEW_OUTPUTS[preview_format][0] for preview_format in preview_formats]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        src = download_source(static_asset, tmp_dir)
+        for format in formats:
+            dst = tmp_dir / pathlib.PurePath(outputs[format]).name
+            encode_output(format, src, dst)
+            store_output(dst, outputs[format])
+    return {format: outputs[format] for format in formats}
+
+
+class Command(BaseCommand):
+    help = 'Replace the GIF previews of existing videos with VIDEO_PREVIEW_FORMATS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'VIDEO_ENCODING_LOCAL_WORKERS', 2),
+            help='Number of videos converted concurrently',
+        )
+        parser.add_argument('--limit', type=int, help='Convert at most this many videos')
+        parser.add_argument(
+            '--delete-gif', action='store_true', help='Delete GIF previews once converted'
+        )
+
+    def handle(self, *args, **options):
+        preview_formats = [f for f in get_preview_formats() if f != 'gif']
+        if not preview_formats:
+            self.stdout.write(self.style.NOTICE('No preview format other than gif is enabled'))
+            return
+
+        videos = (
+            Video.objects.filter(preview_format='gif', encoding_job_status='job.completed')
+            .exclude(static_asset__source='')
+            .select_related('static_asset')
+            .order_by('id')
+        )
+        if options['limit']:
+            videos = videos[: options['limit']]
+
+        converted_count = 0
+        # Workers only download, encode and upload. Videos are updated from
+        # this thread, as they complete.
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(encode_previews, video.static_asset, preview_formats): video
+                for video in videos
+            }
+            for future in as_completed(futures):
+                video = futures[future]
+                try:
+                    stored = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR('Video %i failed: %s' % (video.id, e)))
+                    continue
+                for format, path in stored.items():
+                    events.output_processed_preview({'format': format, 'url': f'/{path}'}, video)
+                if options['delete_gif']:
+                    source_path = pathlib.PurePath(video.static_asset.source.name)
+                    default_storage.delete(str(source_path.with_suffix('.preview.gif')))
+                converted_count += 1
+                self.stdout.write(self.style.SUCCESS('Converted previews of video %i' % video.id))
+
+        self.stdout.write(self.style.SUCCESS('%i videos converted' % converted_count))
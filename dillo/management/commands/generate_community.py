@@ -0,0 +1,443 @@
+import csv
+import datetime
+import io
+import random
+import time
+
+from actstream.models import Action, Follow
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from taggit.models import Tag, TaggedItem
+
+from dillo.models.comments import Comment
+from dillo.models.mixins import Likes, hashids
+from dillo.models.posts import Post, update_search_vector
+from dillo.models.profiles import EmailNotificationsSettings, Profile
+from dillo.models.static_assets import StaticAsset
+
+WORDS = (
+    'animation', 'blender', 'character', 'concept', 'design', 'dragon', 'environment',
+    'fluid', 'forest', 'grease', 'keyframe', 'lighting', 'lookdev', 'matte', 'modeling',
+    'motion', 'particles', 'pencil', 'portrait', 'render', 'rigging', 'robot', 'sculpt',
+    'shader', 'short', 'simulation', 'sketch', 'spaceship', 'storyboard', 'texture',
+    'timelapse', 'walkcycle', 'wip', 'world',
+)  # fmt: skip
+# Exponent of the power law giving the popularity of users and tags
+POPULARITY_EXPONENT = 1.1
+# Probability for a comment to have replies
+REPLIES_PROBABILITY = 0.3
+
+
+def copy_rows(model, fields, rows, batch_size: int) -> int:
+    """Load rows in the table of model with COPY, much faster than INSERT.
+
+    Rows are tuples of values for fields, in the same order. Return the
+    number of loaded rows.
+    """
+    columns = ', '.join(model._meta.get_field(f).column for f in fields)
+    sql = f"COPY {model._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    count = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            batch_count = 0
+            for row in rows:
+                writer.writerow(['\\N' if value is None else value for value in row])
+                batch_count += 1
+                if batch_count == batch_size:
+                    break
+            if not batch_count:
+                return count
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            count += batch_count
+
+
+def reserve_ids(model, count: int) -> list:
+    """Take count ids from the sequence of the primary key of model."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PowerLaw:
+    """Random choices among items, the first items being the most popular."""
+
+    def __init__(self, rng: random.Random, items: list):
+        self.rng = rng
+        self.items = items
+        self.cum_weights = []
+        total = 0.0
+        for rank in range(len(items)):
+            total += 1 / (rank + 1) ** POPULARITY_EXPONENT
+            self.cum_weights.append(total)
+
+    def sample(self, count: int, exclude=None) -> set:
+        """Return at most count distinct items."""
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        # Popular items are picked again and again, do not insist forever
+        for _ in range(count * 4):
+            if len(chosen) >= count:
+                break
+            item = self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic community, with users, follows, posts, comments, '
+        'likes, actions and feeds, for load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users')
+        parser.add_argument('--tags', type=int, default=200, help='Number of tags')
+        parser.add_argument('--follows', type=float, default=20, help='Average follows per user')
+        parser.add_argument('--posts', type=float, default=5, help='Average posts per user')
+        parser.add_argument('--comments', type=float, default=3, help='Average comments per post')
+        parser.add_argument('--likes', type=float, default=10, help='Average likes per post')
+        parser.add_argument(
+            '--reels', type=float, default=0.05, help='Fraction of users with a reel'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365, help='Spread the activity over this many days'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument(
+            '--prefix', default='synthetic', help='Prefix of usernames and tag names'
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--force', action='store_true', help='Generate data even if DEBUG is disabled'
+        )
+
+    def log_step(self, message: str, count: int, start: float):
+        self.stdout.write(f'{message}: {count} rows in {time.monotonic() - start:.1f}s')
+
+    def random_timestamp(self) -> datetime.datetime:
+        return self.end - datetime.timedelta(seconds=self.rng.uniform(0, self.days * 86400))
+
+    def random_delay(self) -> datetime.timedelta:
+        """Return the delay of a reaction, for example a like after a post."""
+        return datetime.timedelta(hours=self.rng.expovariate(1 / 12))
+
+    def random_count(self, average: float) -> int:
+        return int(self.rng.expovariate(1 / average)) if average else 0
+
+    def random_text(self, tags=()) -> str:
+        words = self.rng.choices(WORDS, k=self.rng.randint(3, 10))
+        return ' '.join(words + [f'#{tag}' for tag in tags]).capitalize()
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is disabled, use --force to generate data anyway')
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users prefixed with {options['prefix']} exist already")
+
+        self.rng = random.Random(options['seed'])
+        self.days = options['days']
+        # Midnight of today, so that the same seed gives the same data all day
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.end = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        batch_size = options['batch_size']
+        prefix = options['prefix']
+        user_ct = ContentType.objects.get_for_model(User)
+        post_ct = ContentType.objects.get_for_model(Post)
+        comment_ct = ContentType.objects.get_for_model(Comment)
+        tag_ct = ContentType.objects.get_for_model(Tag)
+        first_action_id = Action.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        start = time.monotonic()
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f'{prefix}-{i}',
+                    email=f'{prefix}-{i}@example.com',
+                    password='!',
+                    date_joined=self.random_timestamp(),
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = [user.id for user in users]
+        profiles = []
+        for user in users:
+            reel = {}
+            if self.rng.random() < options['reels']:
+                # Dimensions are set, so that the thumbnail file is not read
+                reel = dict(
+                    reel=f'https://vimeo.com/{user.id}',
+                    reel_thumbnail_16_9_height=720,
+                    reel_thumbnail_16_9_width=1280,
+                    reel_thumbnail_16_9=f'{prefix}/reels/{user.id}.jpg',
+                )
+            profiles.append(Profile(user=user, name=user.username, **reel))
+        Profile.objects.bulk_create(profiles, batch_size=batch_size)
+        EmailNotificationsSettings.objects.bulk_create(
+            [EmailNotificationsSettings(user=user) for user in users], batch_size=batch_size
+        )
+        self.log_step('Users', len(users), start)
+
+        start = time.monotonic()
+        tag_names = [f'{prefix}{i}' for i in range(options['tags'])]
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=name) for name in tag_names],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        tags = dict(Tag.objects.filter(name__in=tag_names).values_list('name', 'id'))
+        self.log_step('Tags', len(tags), start)
+
+        # The order of users and tags sets their popularity
+        popular_users = list(user_ids)
+        self.rng.shuffle(popular_users)
+        popular_users = PowerLaw(self.rng, popular_users)
+        popular_tags = PowerLaw(self.rng, tag_names)
+
+        start = time.monotonic()
+
+        def follows():
+            for user_id in user_ids:
+                count = self.random_count(options['follows'])
+                for followed_id in sorted(popular_users.sample(count, exclude=user_id)):
+                    yield user_id, user_ct.id, followed_id, True, '', self.random_timestamp()
+                for tag in sorted(popular_tags.sample(count // 10)):
+                    yield user_id, tag_ct.id, tags[tag], True, '', self.random_timestamp()
+
+        fields = ('user', 'content_type', 'object_id', 'actor_only', 'flag', 'started')
+        count = copy_rows(Follow, fields, follows(), batch_size)
+        self.log_step('Follows', count, start)
+
+        start = time.monotonic()
+        posts = []
+        for user_id in user_ids:
+            for _ in range(self.random_count(options['posts'])):
+                published_at = self.random_timestamp()
+                post_tags = popular_tags.sample(self.rng.randint(0, 3))
+                posts.append((user_id, published_at, sorted(post_tags)))
+        post_ids = reserve_ids(Post, len(posts))
+        Post.objects.bulk_create(
+            [
+                Post(
+                    id=post_id,
+                    hash_id=hashids.encode(post_id),
+                    user_id=user_id,
+                    title=self.random_text(post_tags),
+                    content=self.random_text(),
+                    status='published',
+                    visibility='public',
+                    published_at=published_at,
+                )
+                for post_id, (user_id, published_at, post_tags) in zip(post_ids, posts)
+            ],
+            batch_size=batch_size,
+        )
+        fields = ('tag', 'content_type', 'object_id')
+        rows = (
+            (tags[tag], post_ct.id, post_id)
+            for post_id, (_, _, post_tags) in zip(post_ids, posts)
+            for tag in post_tags
+        )
+        copy_rows(TaggedItem, fields, rows, batch_size)
+        # Posts are indexed by signals otherwise, once their tags are set
+        update_search_vector(Post.objects.filter(id__in=post_ids))
+        assets = StaticAsset.objects.bulk_create(
+            [
+                StaticAsset(
+                    source=f'{prefix}/{post_id}.jpg',
+                    source_type='image',
+                    source_filename=f'{post_id}.jpg',
+                    user_id=user_id,
+                )
+                for post_id, (user_id, _, _) in zip(post_ids, posts)
+            ],
+            batch_size=batch_size,
+        )
+        rows = ((post_id, asset.id) for post_id, asset in zip(post_ids, assets))
+        copy_rows(Post.media.through, ('post', 'staticasset'), rows, batch_size)
+        self.log_step('Posts', len(posts), start)
+
+        start = time.monotonic()
+        comments = []
+        # Creation times of comments, in the same order. They are set once
+        # actions are loaded, as bulk_create sets them to now.
+        commented_at = []
+        for post_id, (_, published_at, _) in zip(post_ids, posts):
+            for _ in range(self.random_count(options['comments'])):
+                comment = Comment(
+                    user_id=self.rng.choice(user_ids),
+                    entity_content_type=post_ct,
+                    entity_object_id=post_id,
+                    content=self.random_text(),
+                )
+                comments.append(comment)
+                commented_at.append(published_at + self.random_delay())
+        comments = Comment.objects.bulk_create(comments, batch_size=batch_size)
+        replies = []
+        for comment, comment_at in list(zip(comments, commented_at)):
+            if self.rng.random() >= REPLIES_PROBABILITY:
+                continue
+            for _ in range(self.rng.randint(1, 3)):
+                reply = Comment(
+                    user_id=self.rng.choice(user_ids),
+                    entity_content_type=post_ct,
+                    entity_object_id=comment.entity_object_id,
+                    parent_comment_id=comment.id,
+                    content=self.random_text(),
+                )
+                replies.append(reply)
+                commented_at.append(comment_at + self.random_delay())
+        replies = Comment.objects.bulk_create(replies, batch_size=batch_size)
+        self.log_step('Comments', len(comments) + len(replies), start)
+
+        start = time.monotonic()
+        likes = [
+            (liker_id, post_id, published_at)
+            for post_id, (_, published_at, _) in zip(post_ids, posts)
+            for liker_id in sorted(
+                self.rng.sample(user_ids, min(self.random_count(options['likes']), len(user_ids)))
+            )
+        ]
+        rows = ((user_id, post_ct.id, post_id) for user_id, post_id, _ in likes)
+        count = copy_rows(Likes, ('user', 'content_type', 'object_id'), rows, batch_size)
+        # The likes are not counted by signals, when copied
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE dillo_profile AS profile SET likes_count = post_likes.count
+                FROM (
+                    SELECT post.user_id, COUNT(*) AS count
+                    FROM dillo_likes AS likes
+                    JOIN dillo_post AS post ON post.id = likes.object_id
+                    WHERE likes.content_type_id = %s AND post.user_id = ANY(%s)
+                    GROUP BY post.user_id
+                ) AS post_likes
+                WHERE profile.user_id = post_likes.user_id
+                """,
+                [post_ct.id, user_ids],
+            )
+        self.log_step('Likes', count, start)
+
+        start = time.monotonic()
+
+        def actions():
+            for post_id, (user_id, published_at, _) in zip(post_ids, posts):
+                yield user_ct.id, user_id, 'posted', None, None, post_ct.id, post_id, published_at
+            for user_id, post_id, published_at in likes:
+                liked_at = published_at + self.random_delay()
+                yield user_ct.id, user_id, 'liked', None, None, post_ct.id, post_id, liked_at
+            for comment, comment_at in zip(comments + replies, commented_at):
+                verb = 'replied' if comment.parent_comment_id else 'commented'
+                yield (
+                    user_ct.id,
+                    comment.user_id,
+                    verb,
+                    post_ct.id,
+                    comment.entity_object_id,
+                    comment_ct.id,
+                    comment.id,
+                    comment_at,
+                )
+
+        fields = (
+            'actor_content_type',
+            'actor_object_id',
+            'verb',
+            'target_content_type',
+            'target_object_id',
+            'action_object_content_type',
+            'action_object_object_id',
+            'timestamp',
+        )
+        rows = (row + (True,) for row in actions())
+        count = copy_rows(Action, fields + ('public',), rows, batch_size)
+        self.log_step('Actions', count, start)
+
+        start = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE dillo_post SET created_at = published_at, updated_at = published_at '
+                'WHERE id = ANY(%s)',
+                [post_ids],
+            )
+            cursor.execute(
+                """
+                UPDATE dillo_comment AS comment
+                SET created_at = action.timestamp, updated_at = action.timestamp
+                FROM actstream_action AS action
+                WHERE action.id > %s AND action.action_object_content_type_id = %s
+                    AND action.action_object_object_id = comment.id::text
+                """,
+                [first_action_id, comment_ct.id],
+            )
+            # Timelines: posts of the user, and of the users they follow
+            cursor.execute(
+                """
+                INSERT INTO dillo_feedentry (user_id, is_read, action_id, created_at,
+                    updated_at, category, actors_count, latest_actor_ids)
+                SELECT recipient.user_id, false, action.id, action.timestamp, action.timestamp,
+                    'timeline', 1, '[]'
+                FROM actstream_action AS action
+                JOIN (
+                    SELECT user_id, object_id FROM actstream_follow WHERE content_type_id = %s
+                    UNION
+                    SELECT id, id::text FROM auth_user WHERE id = ANY(%s)
+                ) AS recipient ON recipient.object_id = action.actor_object_id
+                WHERE action.id > %s AND action.verb = 'posted'
+                """,
+                [user_ct.id, user_ids, first_action_id],
+            )
+            count = cursor.rowcount
+            # Notifications about likes, for the owners of the posts
+            cursor.execute(
+                """
+                INSERT INTO dillo_feedentry (user_id, is_read, action_id, created_at,
+                    updated_at, category, actors_count, latest_actor_ids)
+                SELECT post.user_id, action.timestamp < %s, action.id, action.timestamp,
+                    action.timestamp, 'notification', 1, '[]'
+                FROM actstream_action AS action
+                JOIN dillo_post AS post
+                    ON post.id = action.action_object_object_id::integer
+                WHERE action.id > %s AND action.verb = 'liked'
+                    AND post.user_id::text != action.actor_object_id
+                """,
+                [self.end - datetime.timedelta(days=7), first_action_id],
+            )
+            count += cursor.rowcount
+            # Posts on the explore feed
+            cursor.execute(
+                """
+                INSERT INTO actstream_action_extra (action_id, is_on_explore_feed)
+                SELECT id, true FROM actstream_action WHERE id > %s AND verb = 'posted'
+                """,
+                [first_action_id],
+            )
+            cursor.execute(
+                """
+                INSERT INTO dillo_explorefeeditem (action_id, near_actions_count, score)
+                SELECT id, 0, EXTRACT(EPOCH FROM timestamp)
+                FROM actstream_action WHERE id > %s AND verb = 'posted'
+                """,
+                [first_action_id],
+            )
+        self.log_step('Feed entries', count, start)
+
+        call_command('recount_follows', stdout=io.StringIO())
+        call_command('recount_tag_usage', stdout=io.StringIO())
+        call_command('update_trending_tags', stdout=io.StringIO())
+        call_command('update_user_directory', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(f'Community of {len(users)} users generated'))
@@ -0,0 +1,26 @@
+from background_task.models import Task
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import dillo.tasks.feeds
+
+
+class Command(BaseCommand):
+    help = 'Delete old timeline entries and read notifications.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daily',
+            action='store_true',
+            help='Schedule the pruning every day, as a background task',
+        )
+
+    def handle(self, *args, **options):
+        if not options['daily']:
+            dillo.tasks.feeds.prune_feed_entries()
+            self.stdout.write(self.style.SUCCESS('Feeds pruned'))
+            return
+        if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+            raise CommandError('Background tasks are executed in the foreground')
+        dillo.tasks.feeds.prune_feed_entries(repeat=Task.DAILY)
+        self.stdout.write(self.style.SUCCESS('Feeds pruning scheduled every day'))
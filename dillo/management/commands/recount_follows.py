@@ -0,0 +1,59 @@
+from actstream.models import Follow
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, Count, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+from taggit.models import Tag
+
+from dillo.models.profiles import Profile
+from dillo.models.tags import TagStats
+
+
+def count_subquery(follows, **filters) -> Coalesce:
+    """Count the follows matching filters, grouped by a single field."""
+    counts = (
+        follows.filter(**filters)
+        .order_by()
+        .values(*filters.keys())
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recount the followers and following counters of Profiles and Tags.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        user_follows = Follow.objects.filter(content_type=ContentType.objects.get_for_model(User))
+        tag_follows = Follow.objects.filter(content_type=ContentType.objects.get_for_model(Tag))
+        # Follow.object_id is a string
+        user_id = Cast(OuterRef('user_id'), output_field=CharField())
+
+        profiles_count = Profile.objects.update(
+            followers_count=count_subquery(user_follows, object_id=user_id),
+            following_count=count_subquery(user_follows, user_id=OuterRef('user_id')),
+        )
+        self.stdout.write(self.style.SUCCESS('Recounted follows of %i profiles' % profiles_count))
+
+        tag_id = Cast(OuterRef('tag_id'), output_field=CharField())
+        TagStats.objects.update(followers_count=count_subquery(tag_follows, object_id=tag_id))
+        # Create the missing stats of followed tags
+        followed_tag_ids = (
+            Tag.objects.filter(stats__isnull=True)
+            .annotate(object_id=Cast('id', output_field=CharField()))
+            .filter(object_id__in=tag_follows.values('object_id'))
+            .values_list('id', flat=True)
+        )
+        tag_stats = TagStats.objects.bulk_create(
+            [TagStats(tag_id=tag_id) for tag_id in followed_tag_ids]
+        )
+        TagStats.objects.filter(tag_id__in=[stats.tag_id for stats in tag_stats]).update(
+            followers_count=count_subquery(tag_follows, object_id=tag_id)
+        )
+        self.stdout.write(
+            self.style.SUCCESS('Recounted follows of tags, %i tags added' % len(tag_stats))
+        )
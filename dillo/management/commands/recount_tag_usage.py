@@ -0,0 +1,46 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from taggit.models import Tag, TaggedItem
+
+from dillo.models.tags import TagStats, USAGE_COUNT_FIELDS
+
+
+def usage_counts() -> dict:
+    """Subqueries counting the tagged items of a tag, by TagStats counter."""
+    counts = {}
+    for model_name, count_field in USAGE_COUNT_FIELDS.items():
+        tagged_items = (
+            TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_by_natural_key('dillo', model_name),
+                tag_id=OuterRef('tag_id'),
+            )
+            .order_by()
+            .values('tag_id')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        counts[count_field] = Coalesce(Subquery(tagged_items), 0)
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Recount how many Posts and Profiles use each Tag.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        # Create the missing stats of used tags
+        used_tag_ids = Tag.objects.filter(
+            stats__isnull=True, taggit_taggeditem_items__isnull=False
+        ).values_list('id', flat=True)
+        tag_stats = TagStats.objects.bulk_create(
+            [TagStats(tag_id=tag_id) for tag_id in set(used_tag_ids)]
+        )
+        tags_count = TagStats.objects.update(**usage_counts())
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Recounted usage of %i tags, %i tags added' % (tags_count, len(tag_stats))
+            )
+        )
@@ -0,0 +1,26 @@
+from background_task.models import Task
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import dillo.tasks.profile
+
+
+class Command(BaseCommand):
+    help = 'Update the outdated oEmbed html of profile reels.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daily',
+            action='store_true',
+            help='Schedule the update every day, as a background task',
+        )
+
+    def handle(self, *args, **options):
+        if not options['daily']:
+            dillo.tasks.profile.refresh_profile_reel_embeds()
+            self.stdout.write(self.style.SUCCESS('Reel embeds update queued'))
+            return
+        if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+            raise CommandError('Background tasks are executed in the foreground')
+        dillo.tasks.profile.refresh_profile_reel_embeds(repeat=Task.DAILY)
+        self.stdout.write(self.style.SUCCESS('Reel embeds update scheduled every day'))
@@ -0,0 +1,26 @@
+from background_task.models import Task
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import dillo.tasks.tags
+
+
+class Command(BaseCommand):
+    help = 'Compute the trending score of tags, based on recent posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hourly',
+            action='store_true',
+            help='Schedule the update every hour, as a background task',
+        )
+
+    def handle(self, *args, **options):
+        if not options['hourly']:
+            dillo.tasks.tags.update_trending_tags()
+            self.stdout.write(self.style.SUCCESS('Trending tags updated'))
+            return
+        if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+            raise CommandError('Background tasks are executed in the foreground')
+        dillo.tasks.tags.update_trending_tags(repeat=Task.HOURLY)
+        self.stdout.write(self.style.SUCCESS('Trending tags update scheduled every hour'))
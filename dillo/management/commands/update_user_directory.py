@@ -0,0 +1,26 @@
+from background_task.models import Task
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import dillo.tasks.directory
+
+
+class Command(BaseCommand):
+    help = 'Update the entries of the user directory, with the counters of profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hourly',
+            action='store_true',
+            help='Schedule the update every hour, as a background task',
+        )
+
+    def handle(self, *args, **options):
+        if not options['hourly']:
+            dillo.tasks.directory.update_user_directory()
+            self.stdout.write(self.style.SUCCESS('User directory updated'))
+            return
+        if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+            raise CommandError('Background tasks are executed in the foreground')
+        dillo.tasks.directory.update_user_directory(repeat=Task.HOURLY)
+        self.stdout.write(self.style.SUCCESS('User directory update scheduled every hour'))
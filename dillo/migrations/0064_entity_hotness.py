@@ -4,12 +4,23 @@ from django.db import migrations, models
 
 
 def set_hotness(apps, schema_editor):
-    """Set hotness for posts."""
+    """Set hotness for posts.
 
-    from dillo.models.posts import Post
+    Historical models are used, since the current Post model can have
+    columns that do not exist yet at this point.
+    """
 
-    for post in Post.objects.all():
-        post.update_hotness()
+    from dillo.models.sorting import compute_hotness
+
+    Post = apps.get_model('dillo', 'Post')
+    Likes = apps.get_model('dillo', 'Likes')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    post_content_type = ContentType.objects.filter(app_label='dillo', model='post').first()
+
+    for post in Post.objects.exclude(published_at=None):
+        likes_count = Likes.objects.filter(content_type=post_content_type, object_id=post.id).count()
+        hotness = compute_hotness(likes_count, 0, post.published_at)
+        Post.objects.filter(pk=post.pk).update(hotness=hotness)
         print(f'Set hotness for post {post.id}')
 
 
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dillo', '0078_organizations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='has_stream',
+            field=models.BooleanField(default=False),
+        ),
+    ]
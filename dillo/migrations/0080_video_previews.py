@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dillo', '0079_video_has_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='has_preview_video',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='preview_format',
+            field=models.CharField(default='gif', max_length=4),
+        ),
+    ]
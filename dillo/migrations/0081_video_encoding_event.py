@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dillo', '0080_video_previews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoEncodingEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='date created')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='date edited')),
+                ('entity_object_id', models.PositiveIntegerField()),
+                ('job_id', models.IntegerField()),
+                ('event', models.CharField(max_length=64)),
+                ('format', models.CharField(blank=True, default='', max_length=128)),
+                ('payload', models.JSONField()),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('entity_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='encoding_events', to='dillo.video')),
+            ],
+            options={
+                'db_table': 'dillo_staticasset_video_encoding_event',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='videoencodingevent',
+            index=models.Index(fields=['video', 'processed_at'], name='dillo_stati_video_i_ba27bd_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='videoencodingevent',
+            constraint=models.UniqueConstraint(fields=('job_id', 'event', 'format'), name='unique_video_encoding_event'),
+        ),
+    ]
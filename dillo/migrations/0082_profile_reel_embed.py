@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dillo', '0081_video_encoding_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='reel_embed_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='reel_embed_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are created without locking the table for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0083_follow_counts'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'category', '-created_at'], name='feedentry_user_category'),
+        ),
+        AddIndexConcurrently(
+            model_name='feedentry',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', 'category'], name='feedentry_user_unread'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dillo', '0084_feedentry_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAction',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('actor_object_id', models.CharField(max_length=255)),
+                ('verb', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('target_object_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('action_object_object_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('public', models.BooleanField(default=True)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('action_object_content_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('actor_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('target_content_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+        ),
+    ]
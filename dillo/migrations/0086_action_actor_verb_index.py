@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The index is created without locking the table for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0085_archived_action'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX CONCURRENTLY IF NOT EXISTS actstream_action_actor_verb_ts "
+            "ON actstream_action (actor_content_type_id, actor_object_id, verb, timestamp);",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS actstream_action_actor_verb_ts;",
+        ),
+    ]
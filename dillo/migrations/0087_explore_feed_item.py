@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actstream', '0003_add_follow_flag'),
+        ('dillo', '0086_action_actor_verb_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExploreFeedItem',
+            fields=[
+                ('action', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='explore_feed_item', serialize=False, to='actstream.action')),
+                ('near_actions_count', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='explorefeeditem',
+            index=models.Index(fields=['-score', '-action'], name='explorefeeditem_rank'),
+        ),
+        # Backfill the items of the actions already grouped
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO dillo_explorefeeditem (action_id, near_actions_count, score)
+            SELECT extra.action_id,
+                (SELECT COUNT(*) FROM actstream_action_extra AS near
+                    WHERE near.parent_action_id = extra.action_id),
+                EXTRACT(EPOCH FROM action.timestamp)
+            FROM actstream_action_extra AS extra
+            JOIN actstream_action AS action ON action.id = extra.action_id
+            WHERE extra.is_on_explore_feed AND extra.parent_action_id IS NULL;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actstream', '0003_add_follow_flag'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dillo', '0087_explore_feed_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionGroup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_object_id', models.CharField(max_length=255)),
+                ('verb', models.CharField(max_length=255)),
+                ('last_action_at', models.DateTimeField()),
+                ('action_object_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('actor_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('parent_action', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='actstream.action')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='actiongroup',
+            constraint=models.UniqueConstraint(fields=('actor_content_type', 'actor_object_id', 'verb', 'action_object_content_type'), name='actiongroup_unique_key'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:59
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is created without locking the table for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0088_action_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='actors_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='aggregation_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='latest_actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        AddIndexConcurrently(
+            model_name='feedentry',
+            index=models.Index(condition=models.Q(('aggregation_key__isnull', False)), fields=['user', 'aggregation_key', '-created_at'], name='feedentry_user_aggregation'),
+        ),
+    ]
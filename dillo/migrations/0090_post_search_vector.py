@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:27
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Same vector as dillo.models.posts.update_search_vector
+UPDATE_SEARCH_VECTORS = """
+UPDATE dillo_post AS post SET search_vector =
+    setweight(to_tsvector('english', COALESCE(post.title, '')), 'A')
+    || setweight(to_tsvector('english', COALESCE((
+        SELECT string_agg(tag.name, ' ')
+        FROM taggit_taggeditem AS item JOIN taggit_tag AS tag ON tag.id = item.tag_id
+        WHERE item.object_id = post.id AND item.content_type_id = (
+            SELECT id FROM django_content_type WHERE app_label = 'dillo' AND model = 'post'
+        )
+    ), '')), 'B')
+    || setweight(to_tsvector('english', COALESCE((
+        SELECT CONCAT(profile.name, ' ', author.username)
+        FROM auth_user AS author LEFT JOIN dillo_profile AS profile ON profile.user_id = author.id
+        WHERE author.id = post.user_id
+    ), '')), 'C')
+"""
+
+
+class Migration(migrations.Migration):
+    # The index is created without locking the table for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0089_feedentry_aggregation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(UPDATE_SEARCH_VECTORS, migrations.RunSQL.noop),
+        AddIndexConcurrently(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='post_search_vector'),
+        ),
+    ]
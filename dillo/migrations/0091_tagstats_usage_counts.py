@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:35
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+COUNT_TAG_USAGE = """
+INSERT INTO dillo_tagstats (tag_id, followers_count, posts_count, profiles_count)
+SELECT
+    item.tag_id,
+    0,
+    COUNT(*) FILTER (WHERE content_type.model = 'post'),
+    COUNT(*) FILTER (WHERE content_type.model = 'profile')
+FROM taggit_taggeditem AS item
+JOIN django_content_type AS content_type ON content_type.id = item.content_type_id
+WHERE content_type.app_label = 'dillo' AND content_type.model IN ('post', 'profile')
+GROUP BY item.tag_id
+ON CONFLICT (tag_id) DO UPDATE SET
+    posts_count = EXCLUDED.posts_count, profiles_count = EXCLUDED.profiles_count
+"""
+
+
+class Migration(migrations.Migration):
+    # The indexes are created without locking the tables for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0090_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tagstats',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tagstats',
+            name='profiles_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(COUNT_TAG_USAGE, migrations.RunSQL.noop),
+        AddIndexConcurrently(
+            model_name='tagstats',
+            index=models.Index(fields=['-posts_count'], name='tagstats_posts_count'),
+        ),
+        AddIndexConcurrently(
+            model_name='tagstats',
+            index=models.Index(fields=['-profiles_count'], name='tagstats_profiles_count'),
+        ),
+        # Case insensitive prefix search of tag names, as in name__istartswith
+        migrations.RunSQL(
+            sql="CREATE INDEX CONCURRENTLY IF NOT EXISTS taggit_tag_name_prefix "
+            "ON taggit_tag (UPPER(name::text) text_pattern_ops);",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS taggit_tag_name_prefix;",
+        ),
+    ]
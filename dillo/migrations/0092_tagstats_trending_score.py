@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is created without locking the table for writes
+    atomic = False
+
+    dependencies = [
+        ('dillo', '0091_tagstats_usage_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tagstats',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        AddIndexConcurrently(
+            model_name='tagstats',
+            index=models.Index(
+                condition=models.Q(('trending_score__gt', 0)),
+                fields=['-trending_score'],
+                name='tagstats_trending_score',
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:49
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_DIRECTORY_ENTRIES = """
+INSERT INTO dillo_directoryentry (
+    profile_id,
+    is_looking_for_work,
+    posts_count,
+    likes_count,
+    views_count,
+    tag_ids,
+    badge_ids,
+    city_ref_id
+)
+SELECT
+    profile.user_id,
+    profile.is_looking_for_work,
+    (SELECT COUNT(*) FROM dillo_post AS post WHERE post.user_id = profile.user_id),
+    profile.likes_count,
+    profile.views_count,
+    ARRAY(
+        SELECT item.tag_id FROM taggit_taggeditem AS item
+        WHERE item.content_type_id = (
+            SELECT id FROM django_content_type WHERE app_label = 'dillo' AND model = 'profile'
+        )
+        AND item.object_id = profile.user_id
+        ORDER BY item.tag_id
+    ),
+    ARRAY(
+        SELECT badge.badge_id FROM dillo_profile_badges AS badge
+        WHERE badge.profile_id = profile.user_id
+        ORDER BY badge.badge_id
+    ),
+    profile.city_ref_id
+FROM dillo_profile AS profile
+JOIN auth_user AS u ON u.id = profile.user_id
+WHERE u.is_active
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dillo', '0092_tagstats_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryEntry',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='directory_entry', serialize=False, to='dillo.profile')),
+                ('is_looking_for_work', models.BooleanField(default=False)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('views_count', models.PositiveIntegerField(default=0)),
+                ('tag_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('badge_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('city_ref', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dillo.city')),
+            ],
+            options={
+                'verbose_name_plural': 'directory entries',
+            },
+        ),
+        migrations.RunSQL(CREATE_DIRECTORY_ENTRIES, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='directoryentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='directoryentry_tag_ids'),
+        ),
+        migrations.AddIndex(
+            model_name='directoryentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['badge_ids'], name='directoryentry_badge_ids'),
+        ),
+        migrations.AddIndex(
+            model_name='directoryentry',
+            index=models.Index(fields=['is_looking_for_work', '-likes_count', 'profile'], name='directoryentry_likes_count'),
+        ),
+        migrations.AddIndex(
+            model_name='directoryentry',
+            index=models.Index(fields=['is_looking_for_work', '-posts_count', 'profile'], name='directoryentry_posts_count'),
+        ),
+        migrations.AddIndex(
+            model_name='directoryentry',
+            index=models.Index(fields=['is_looking_for_work', '-views_count', 'profile'], name='directoryentry_views_count'),
+        ),
+    ]
@@ -0,0 +1,170 @@
+import typing
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.core.cache import cache
+from django.db import connection, models
+
+# Facet counts of get_directory_facet_counts, by is_looking_for_work
+FACET_COUNTS_CACHE_KEY = 'directory_facet_counts:%i'
+
+UPDATE_DIRECTORY_ENTRIES = """
+INSERT INTO dillo_directoryentry (
+    profile_id,
+    is_looking_for_work,
+    posts_count,
+    likes_count,
+    views_count,
+    tag_ids,
+    badge_ids,
+    city_ref_id
+)
+SELECT
+    profile.user_id,
+    profile.is_looking_for_work,
+    (SELECT COUNT(*) FROM dillo_post AS post WHERE post.user_id = profile.user_id),
+    profile.likes_count,
+    profile.views_count,
+    ARRAY(
+        SELECT item.tag_id FROM taggit_taggeditem AS item
+        WHERE item.content_type_id = (
+            SELECT id FROM django_content_type WHERE app_label = 'dillo' AND model = 'profile'
+        )
+        AND item.object_id = profile.user_id
+        ORDER BY item.tag_id
+    ),
+    ARRAY(
+        SELECT badge.badge_id FROM dillo_profile_badges AS badge
+        WHERE badge.profile_id = profile.user_id
+        ORDER BY badge.badge_id
+    ),
+    profile.city_ref_id
+FROM dillo_profile AS profile
+JOIN auth_user AS u ON u.id = profile.user_id
+WHERE u.is_active {user_ids_filter}
+ON CONFLICT (profile_id) DO UPDATE SET
+    is_looking_for_work = EXCLUDED.is_looking_for_work,
+    posts_count = EXCLUDED.posts_count,
+    likes_count = EXCLUDED.likes_count,
+    views_count = EXCLUDED.views_count,
+    tag_ids = EXCLUDED.tag_ids,
+    badge_ids = EXCLUDED.badge_ids,
+    city_ref_id = EXCLUDED.city_ref_id
+WHERE (
+    dillo_directoryentry.is_looking_for_work,
+    dillo_directoryentry.posts_count,
+    dillo_directoryentry.likes_count,
+    dillo_directoryentry.views_count,
+    dillo_directoryentry.tag_ids,
+    dillo_directoryentry.badge_ids,
+    dillo_directoryentry.city_ref_id
+) IS DISTINCT FROM (
+    EXCLUDED.is_looking_for_work,
+    EXCLUDED.posts_count,
+    EXCLUDED.likes_count,
+    EXCLUDED.views_count,
+    EXCLUDED.tag_ids,
+    EXCLUDED.badge_ids,
+    EXCLUDED.city_ref_id
+)
+"""
+
+# Number of entries by badge, tag and city, in one grouped query
+COUNT_DIRECTORY_FACETS = """
+SELECT 'badges', badge_id, COUNT(*)
+FROM dillo_directoryentry, unnest(badge_ids) AS badge_id
+WHERE is_looking_for_work = %(is_looking_for_work)s
+GROUP BY badge_id
+UNION ALL
+SELECT 'tags', tag_id, COUNT(*)
+FROM dillo_directoryentry, unnest(tag_ids) AS tag_id
+WHERE is_looking_for_work = %(is_looking_for_work)s
+GROUP BY tag_id
+UNION ALL
+SELECT 'cities', city_ref_id, COUNT(*)
+FROM dillo_directoryentry
+WHERE is_looking_for_work = %(is_looking_for_work)s AND city_ref_id IS NOT NULL
+GROUP BY city_ref_id
+"""
+
+
+class DirectoryEntry(models.Model):
+    """Profile of an active user, as listed and filtered in the user directory.
+
+    Tags, badges and the city of the profile are updated via signals, while
+    the counters are copied periodically by the update_user_directory task.
+    """
+
+    profile = models.OneToOneField(
+        'Profile', on_delete=models.CASCADE, primary_key=True, related_name='directory_entry'
+    )
+    is_looking_for_work = models.BooleanField(default=False)
+    posts_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    views_count = models.PositiveIntegerField(default=0)
+    tag_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    badge_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    city_ref = models.ForeignKey(
+        'City', on_delete=models.SET_NULL, related_name='+', null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name_plural = 'directory entries'
+        indexes = [
+            GinIndex(fields=['tag_ids'], name='directoryentry_tag_ids'),
+            GinIndex(fields=['badge_ids'], name='directoryentry_badge_ids'),
+            models.Index(
+                fields=['is_looking_for_work', '-likes_count', 'profile'],
+                name='directoryentry_likes_count',
+            ),
+            models.Index(
+                fields=['is_looking_for_work', '-posts_count', 'profile'],
+                name='directoryentry_posts_count',
+            ),
+            models.Index(
+                fields=['is_looking_for_work', '-views_count', 'profile'],
+                name='directoryentry_views_count',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Directory entry of {self.profile}'
+
+
+def update_directory_entries(user_ids: typing.Optional[typing.List[int]] = None):
+    """Create or update the directory entries of active users.
+
+    Only the entries of user_ids are updated, if given. Entries of users
+    that are no longer active are deleted.
+    """
+    inactive_entries = DirectoryEntry.objects.filter(profile__user__is_active=False)
+    params = {}
+    user_ids_filter = ''
+    if user_ids is not None:
+        inactive_entries = inactive_entries.filter(profile_id__in=user_ids)
+        params['user_ids'] = list(user_ids)
+        user_ids_filter = 'AND profile.user_id = ANY(%(user_ids)s)'
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_DIRECTORY_ENTRIES.format(user_ids_filter=user_ids_filter), params)
+    inactive_entries.delete()
+
+
+def get_directory_facet_counts(is_looking_for_work: bool) -> typing.Dict[str, typing.Dict]:
+    """Return the number of directory entries by badge, tag and city id.
+
+    Counts are cached for DIRECTORY_FACETS_CACHE_TTL seconds (default 300),
+    or until the next update_user_directory task.
+    """
+    cache_key = FACET_COUNTS_CACHE_KEY % is_looking_for_work
+    facet_counts = cache.get(cache_key)
+    if facet_counts is not None:
+        return facet_counts
+
+    facet_counts = {'badges': {}, 'tags': {}, 'cities': {}}
+    with connection.cursor() as cursor:
+        cursor.execute(COUNT_DIRECTORY_FACETS, {'is_looking_for_work': is_looking_for_work})
+        for facet, value, count in cursor.fetchall():
+            facet_counts[facet][value] = count
+    cache.set(cache_key, facet_counts, getattr(settings, 'DIRECTORY_FACETS_CACHE_TTL', 300))
+    return facet_counts
@@ -1,7 +1,11 @@
 from actstream.models import Action
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
+# Actors kept in aggregated notifications
+LATEST_ACTORS_COUNT = 3
+
 
 class FeedEntry(models.Model):
     """Activity entries associate with a User.
@@ -25,13 +29,51 @@ class FeedEntry(models.Model):
     updated_at = models.DateTimeField('date edited', auto_now=True)
     category = models.CharField(max_length=20, choices=CATEGORIES, default='notification')
     # TODO(fsiddi) consider adding weight for improved grouping and sorting
+    # Aggregated notifications, e.g. likes of the same post, point to their
+    # latest action, and keep track of how many actors took part in them.
+    aggregation_key = models.CharField(max_length=255, blank=True, null=True)
+    actors_count = models.PositiveIntegerField(default=1)
+    latest_actor_ids = models.JSONField(default=list, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Feeds of a user, newest first. Also used when pruning timelines.
+            models.Index(
+                fields=['user', 'category', '-created_at'], name='feedentry_user_category'
+            ),
+            # Unread notifications count
+            models.Index(
+                fields=['user', 'category'],
+                condition=models.Q(is_read=False),
+                name='feedentry_user_unread',
+            ),
+            # Open aggregated notifications
+            models.Index(
+                fields=['user', 'aggregation_key', '-created_at'],
+                condition=models.Q(aggregation_key__isnull=False),
+                name='feedentry_user_aggregation',
+            ),
+        ]
 
     def __str__(self):
         return 'FeedEntry: %s %s' % (self.action.actor, self.action.verb)
 
+    def aggregate(self, action: Action):
+        """Add the actor of action to the aggregated notification.
+
+        The entry then points to action, and is moved on top of the
+        notifications, as unread.
+        """
+        actor_id = int(action.actor_object_id)
+        if actor_id not in self.latest_actor_ids:
+            self.actors_count += 1
+        other_actor_ids = [i for i in self.latest_actor_ids if i != actor_id]
+        self.latest_actor_ids = [actor_id] + other_actor_ids[: LATEST_ACTORS_COUNT - 1]
+        self.action = action
+        self.created_at = action.timestamp
+        self.is_read = False
+
 
 class ActionExtra(models.Model):
     action = models.OneToOneField(Action, on_delete=models.CASCADE, related_name='extra')
@@ -56,3 +98,97 @@ class ActionExtra(models.Model):
 
     def __str__(self):
         return 'ActionExtra: %s' % self.action
+
+
+class ActionGroup(models.Model):
+    """The latest group of similar actions of an actor.
+
+    Actions with the same actor, verb and action object type, created less
+    than ACTIONS_GROUPING_WINDOW minutes apart, are grouped under the first
+    one (the parent action). One row is kept for each combination, so
+    that grouping a new action is a single lookup.
+    """
+
+    actor_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    actor_object_id = models.CharField(max_length=255)
+    verb = models.CharField(max_length=255)
+    action_object_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name='+'
+    )
+    parent_action = models.ForeignKey(Action, on_delete=models.CASCADE, related_name='+')
+    last_action_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'actor_content_type',
+                    'actor_object_id',
+                    'verb',
+                    'action_object_content_type',
+                ],
+                name='actiongroup_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return 'ActionGroup: %s %s' % (self.actor_object_id, self.verb)
+
+
+class ExploreFeedItem(models.Model):
+    """An item of the explore feed: a parent action and its near actions.
+
+    Rows are created, and their near_actions_count updated, as actions are
+    grouped by establish_time_proximity. Items are listed by descending
+    score, then action id, which is also the pagination key.
+    """
+
+    action = models.OneToOneField(
+        Action, on_delete=models.CASCADE, primary_key=True, related_name='explore_feed_item'
+    )
+    near_actions_count = models.PositiveIntegerField(default=0)
+    # Ranking of the item, for now the timestamp of the action
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-action'], name='explorefeeditem_rank'),
+        ]
+
+    def __str__(self):
+        return 'ExploreFeedItem: %s' % self.action
+
+    @staticmethod
+    def get_score(action: Action) -> float:
+        return action.timestamp.timestamp()
+
+
+class ArchivedAction(models.Model):
+    """An Action moved out of the actstream table, once it became cold.
+
+    Actions older than ACTIONS_ARCHIVE_AFTER_DAYS, and not referenced by any
+    FeedEntry or ActionExtra, are moved here by the archive_actions task,
+    keeping their id. This keeps the actstream table, and its indexes,
+    limited to the actions that feeds query.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    actor_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    actor_object_id = models.CharField(max_length=255)
+    verb = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    target_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    target_object_id = models.CharField(max_length=255, blank=True, null=True)
+    action_object_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    action_object_object_id = models.CharField(max_length=255, blank=True, null=True)
+    timestamp = models.DateTimeField(db_index=True)
+    public = models.BooleanField(default=True)
+    data = models.JSONField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return 'ArchivedAction: %s %s' % (self.actor_object_id, self.verb)
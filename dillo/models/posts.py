@@ -1,4 +1,3 @@
-import datetime
 import logging
 import pathlib
 import typing
@@ -9,11 +8,16 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.db import models
+from django.db.models.functions import Concat
 from django.urls import reverse
-from django.utils import timezone
 from taggit.managers import TaggableManager
+from taggit.models import Tag, TaggedItem
 
 from dillo.models.mixins import (
     LikesMixin,
@@ -21,7 +25,7 @@ from dillo.models.mixins import (
     get_upload_to_hashed_path,
     HashIdGenerationMixin,
 )
-from dillo.tasks.video_processing import create_coconut_job
+from dillo.tasks.video_processing import create_video_encoding_job
 from .communities import Community, CommunityCategory
 from .entities import Entity
 from dillo.models.static_assets import StaticAsset, Image, Video
@@ -29,34 +33,44 @@ from dillo.templatetags.dillo_filters import website_hostname
 
 log = logging.getLogger(__name__)
 
+# Text search configuration of Post.search_vector, and of the queries on it
+SEARCH_CONFIG = 'english'
+# Cache of get_trending_tags, cleared by the update_trending_tags task
+TRENDING_TAGS_CACHE_KEY = 'trending_tags'
 
 # Custom signal to trigger activity generation based on parsed Tags.
 post_published = django.dispatch.Signal(providing_args=["instance"])
 
 
-def get_trending_tags():
-    """Find the top 10 used tags since the past 15 days.
+def get_trending_tags() -> typing.List[Tag]:
+    """Return the 10 tags with the highest trending score.
 
-    We query all Posts created in the past 15 days, aggregate, count and
-    sort the Tags.
+    Scores are computed periodically by the update_trending_tags task. If
+    less than 10 tags are trending, the most used tags complete the list.
+    The list is cached for TRENDING_TAGS_CACHE_TTL seconds (default 300).
     """
-    time_delta_in_days = 15
-    time_limit = timezone.now() - datetime.timedelta(days=time_delta_in_days)
-    recent_tags = Post.tags.most_common(
-        extra_filters={'post__created_at__gte': time_limit, 'post__visibility': 'public'}
-    )[:10]
-
-    missing_tags_count = 10 - len(recent_tags)
+    trending_tags = cache.get(TRENDING_TAGS_CACHE_KEY)
+    if trending_tags is not None:
+        return trending_tags
 
+    count = 10
+    trending_tags = Tag.objects.filter(stats__trending_score__gt=0).order_by(
+        '-stats__trending_score', 'name'
+    )
+    trending_tags = list(trending_tags[:count])
+    missing_tags_count = count - len(trending_tags)
     if missing_tags_count:
-        log.debug("Not enough common tags found, querying all tags")
+        log.debug("Not enough trending tags found, using the most used tags")
         popular_tags = (
-            Post.tags.exclude(id__in=recent_tags)
-            .annotate(num_times=models.Count(Post.tags.through.tag_relname()))
-            .order_by("-num_times")[:missing_tags_count]
+            Tag.objects.filter(stats__posts_count__gt=0)
+            .exclude(id__in=[tag.id for tag in trending_tags])
+            .order_by('-stats__posts_count', 'name')[:missing_tags_count]
         )
-        recent_tags = recent_tags.union(popular_tags)
-    return recent_tags
+        trending_tags += list(popular_tags)
+    cache.set(
+        TRENDING_TAGS_CACHE_KEY, trending_tags, getattr(settings, 'TRENDING_TAGS_CACHE_TTL', 300)
+    )
+    return trending_tags
 
 
 def extract_hash_tags(s):
@@ -78,6 +92,8 @@ class Post(Entity, LikesMixin, MentionsMixin):
         related_query_name='post',
     )
     media = models.ManyToManyField(StaticAsset, related_name='post', blank=True)
+    # Weighted title, tags and author name, maintained by update_search_vector
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def get_absolute_url(self):
         if self.community and 'communities.apps.CommunitiesConfig' in settings.INSTALLED_APPS:
@@ -169,7 +185,7 @@ class Post(Entity, LikesMixin, MentionsMixin):
         # Set status as processing, without triggering Post save signals
         Post.objects.filter(pk=self.id).update(status='processing')
         # Create a background job, using only hashable arguments
-        create_coconut_job(str(self.content_type_id), str(self.id), video.id)
+        create_video_encoding_job(str(self.content_type_id), str(self.id), video.id)
 
     def publish(self):
         super(Post, self).publish()
@@ -187,6 +203,33 @@ class Post(Entity, LikesMixin, MentionsMixin):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [GinIndex(fields=['search_vector'], name='post_search_vector')]
+
+
+def update_search_vector(posts: models.QuerySet) -> int:
+    """Update the search vector of posts, in a single query.
+
+    The title weighs the most, then the tags, then the name of the author.
+    Return the number of updated posts.
+    """
+    tag_names = (
+        TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post), object_id=models.OuterRef('pk')
+        )
+        .values('object_id')
+        .annotate(names=StringAgg('tag__name', ' '))
+        .values('names')
+    )
+    author_name = User.objects.filter(pk=models.OuterRef('user_id')).values(
+        name=Concat('profile__name', models.Value(' '), 'username')
+    )
+    return posts.update(
+        search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(models.Subquery(tag_names), weight='B', config=SEARCH_CONFIG)
+            + SearchVector(models.Subquery(author_name), weight='C', config=SEARCH_CONFIG)
+        )
+    )
 
 
 class PostMediaImage(models.Model):
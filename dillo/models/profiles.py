@@ -1,7 +1,7 @@
 import logging
 import urllib.parse
 
-from actstream.models import followers, following, Follow
+from actstream.models import Follow
 from actstream import action
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
@@ -13,6 +13,7 @@ from django.utils import timezone
 from taggit.managers import TaggableManager
 from django_countries.fields import CountryField
 
+import dillo.models.posts
 import dillo.tasks.profile
 from dillo.models.cities import City
 from dillo.models.communities import Community
@@ -93,6 +94,11 @@ class Profile(ChangeAwareness, CreatedUpdatedMixin, models.Model):
     )
     reel_thumbnail_16_9_height = models.PositiveIntegerField(null=True)
     reel_thumbnail_16_9_width = models.PositiveIntegerField(null=True)
+    # oEmbed HTML of the reel, rendered in place of the reel url so that
+    # profile pages do not request it from the provider at every view.
+    # Updated by the update_profile_reel task.
+    reel_embed_html = models.TextField(blank=True)
+    reel_embed_updated_at = models.DateTimeField(null=True, blank=True)
 
     is_setup_complete = models.BooleanField(default=False)
     # Which page should be displayed to the user after they sign up,
@@ -110,8 +116,13 @@ class Profile(ChangeAwareness, CreatedUpdatedMixin, models.Model):
     # user is liked or unliked. The update is done via signals.
     likes_count = models.PositiveIntegerField(default=0)
 
-    # Amount of profile views (visits to /<username>. This value
-    # is atomically incremented based on the ITEM_HITS_FACTOR
+    # Cache-like fields, counting the Users following the user and the
+    # Users that the user is following. Updated via Follow signals.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    # Amount of profile views (visits to /<username>). This value
+    # is incremented in batches, via dillo.counters.profile_views
     views_count = models.PositiveIntegerField(default=0)
 
     ip_address = models.GenericIPAddressField(blank=True, null=True)
@@ -133,15 +144,6 @@ class Profile(ChangeAwareness, CreatedUpdatedMixin, models.Model):
 
     tags = TaggableManager(blank=True)
 
-    @property
-    def followers_count(self):
-        return len(followers(self.user))
-
-    @property
-    def following_count(self):
-        """The Users that a user is following."""
-        return len(following(self.user, User))
-
     @property
     def next_events_attending(self):
         """The closest public events that a user will attend in the future."""
@@ -182,7 +184,7 @@ class Profile(ChangeAwareness, CreatedUpdatedMixin, models.Model):
         for post in self.user.post_set.all():
             likes_count += post.likes.count()
         self.likes_count = likes_count
-        self.save()
+        self.save(update_fields=['likes_count'])
 
     @property
     def first_name_guess(self):
@@ -215,21 +217,33 @@ class Profile(ChangeAwareness, CreatedUpdatedMixin, models.Model):
             return ''
 
     def save(self, *args, **kwargs):
-        """Extend save() with reel thumbnail fetching.
+        """Extend save() with reel embed and thumbnail fetching.
 
-        If reel is set, fetch thumbnail_url via micawber and set it as reel_thumbnail.
+        If reel is set, fetch its oEmbed data via micawber, and store the embed
+        html and thumbnail_url as reel_embed_html and reel_thumbnail.
         """
         # Look up city in the City table and try to associate it
         self.city_ref = City.objects.filter(name__iexact=self.city).first()
 
+        if self.data_changed(['reel']):
+            # The embed of the previous reel is outdated
+            self.reel_embed_html = ''
+            self.reel_embed_updated_at = None
+
         super().save(*args, **kwargs)
 
+        if self.data_changed(['name']):
+            # The name of the author is part of the search vector of posts
+            dillo.models.posts.update_search_vector(
+                dillo.models.posts.Post.objects.filter(user_id=self.user_id)
+            )
+
         if self.reel == '':
             log.debug('Skipping thumbnail fetch for reel of profile %i' % self.user_id)
             return
         if self.data_changed(['reel']):
-            log.debug('Updating reel thumbnail for user %i' % self.user_id)
-            dillo.tasks.profile.update_profile_reel_thumbnail(self.user_id)
+            log.debug('Updating reel embed and thumbnail for user %i' % self.user_id)
+            dillo.tasks.profile.update_profile_reel(self.user_id)
             # Create activity for reel update
             action.send(self.user, verb='updated their reel', action_object=self)
 
@@ -1,6 +1,8 @@
 import pathlib
 import urllib.parse
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 from dillo.models.mixins import (
@@ -9,8 +11,11 @@ from dillo.models.mixins import (
     CreatedUpdatedMixin,
 )
 
+from dillo.encoding import OUTPUTS, STREAM_MANIFEST
 from dillo.storage import S3Boto3CustomStorage
 
+STREAM_SUFFIX = OUTPUTS['httpstream']
+
 
 class StaticAsset(CreatedUpdatedMixin, HashIdGenerationMixin, models.Model):
     STATIC_ASSET_TYPES = (
@@ -77,9 +82,16 @@ class Video(models.Model):
     encoding_job_id = models.IntegerField(null=True)
     encoding_job_status = models.CharField(max_length=128, null=True)
     encoding_job_progress = models.CharField(max_length=10, null=True, blank=True)
-    # Amount of video loops views (hits to /v/<video_id>. This value
-    # is atomically incremented in VideoViewsCountIncreaseView
+    # Amount of video loops views (hits to /v/<video_id>). This value
+    # is incremented in batches, via dillo.counters.video_views
     views_count = models.PositiveIntegerField(default=0)
+    # Set once the httpstream output (HLS bitrate ladder) has been processed
+    has_stream = models.BooleanField(default=False)
+    # Format of the animated image preview (gif for videos encoded before
+    # webp previews were introduced)
+    preview_format = models.CharField(max_length=4, default='gif')
+    # Set once the muted, looping mp4 preview has been processed
+    has_preview_video = models.BooleanField(default=False)
 
     def replace_extension(self, extension):
         """Replace the extension of self.source.url."""
@@ -99,7 +111,56 @@ class Video(models.Model):
 
     @property
     def url_preview(self):
-        return self.replace_extension('.preview.gif')
+        return self.replace_extension(f'.preview.{self.preview_format}')
+
+    @property
+    def url_preview_video(self):
+        """URL of the mp4 preview, or None if there is no such preview."""
+        if not self.has_preview_video:
+            return None
+        return self.replace_extension('.preview.mp4')
+
+    @property
+    def url_stream(self):
+        """URL of the HLS master playlist, or None if there is no stream."""
+        if not self.has_stream:
+            return None
+        url = urllib.parse.urlparse(self.replace_extension(STREAM_SUFFIX))
+        return urllib.parse.urlunparse(url._replace(path=f'{url.path}/{STREAM_MANIFEST}'))
 
     def __str__(self):
         return self.static_asset.source_filename
+
+
+class VideoEncodingEvent(CreatedUpdatedMixin, models.Model):
+    """Append-only log of the events received by the coconut_webhook.
+
+    Events are deduplicated on (job_id, event, format), and processed in
+    order by the process_video_encoding_events task. The only rows being
+    updated are 'job.progress' ones: a single row per job is kept, holding
+    the latest progress.
+    """
+
+    class Meta:
+        db_table = "dillo_staticasset_video_encoding_event"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job_id', 'event', 'format'], name='unique_video_encoding_event'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['video', 'processed_at']),
+        ]
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='encoding_events')
+    entity_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    entity_object_id = models.PositiveIntegerField()
+    entity = GenericForeignKey('entity_content_type', 'entity_object_id')
+    job_id = models.IntegerField()
+    event = models.CharField(max_length=64)
+    format = models.CharField(max_length=128, blank=True, default='')
+    payload = models.JSONField()
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.job_id} {self.event} {self.format}'.strip()
@@ -0,0 +1,56 @@
+from django.db import models
+from taggit.models import Tag
+
+# Usage counters of TagStats, by model name of the tagged objects
+USAGE_COUNT_FIELDS = {'post': 'posts_count', 'profile': 'profiles_count'}
+
+
+class TagStats(models.Model):
+    """Cache-like counters of a Tag, updated via signals."""
+
+    tag = models.OneToOneField(
+        Tag, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    # Users following the tag
+    followers_count = models.PositiveIntegerField(default=0)
+    # Posts and profiles tagged with the tag
+    posts_count = models.PositiveIntegerField(default=0)
+    profiles_count = models.PositiveIntegerField(default=0)
+    # Recent usage in posts, updated periodically by update_trending_tags
+    trending_score = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'tag stats'
+        indexes = [
+            models.Index(fields=['-posts_count'], name='tagstats_posts_count'),
+            models.Index(fields=['-profiles_count'], name='tagstats_profiles_count'),
+            models.Index(
+                fields=['-trending_score'],
+                condition=models.Q(trending_score__gt=0),
+                name='tagstats_trending_score',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Stats of {self.tag}'
+
+
+def get_tag_followers_count(tag: Tag) -> int:
+    return TagStats.objects.filter(tag=tag).values_list('followers_count', flat=True).first() or 0
+
+
+def get_most_used_tags(model_name: str, prefix: str = '', limit: int = 10) -> models.QuerySet:
+    """Return the stats of the tags most used on model_name objects.
+
+    Tags can be filtered by prefix (case insensitive), which is backed by an
+    index on the tag name. The count of each tag is annotated as usage_count.
+    """
+    count_field = USAGE_COUNT_FIELDS[model_name]
+    stats = TagStats.objects.filter(**{f'{count_field}__gt': 0})
+    if prefix:
+        stats = stats.filter(tag__name__istartswith=prefix)
+    return (
+        stats.select_related('tag')
+        .annotate(usage_count=models.F(count_field))
+        .order_by(f'-{count_field}', 'tag__name')[:limit]
+    )
@@ -31,7 +31,7 @@ def deactivate_user_and_remove_content(user: User):
         is_active=False,
     )
     restored_user.profile.ip_address = profile_copy.ip_address
-    restored_user.profile.save()
+    restored_user.profile.save(update_fields=['ip_address'])
 
     for e in account_email_copy:
         EmailAddress.objects.create(user=restored_user, email=e.email)
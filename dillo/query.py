@@ -1,17 +1,56 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import DurationField, ExpressionWrapper, F, FloatField, QuerySet
+from django.db.models.functions import Extract, Now
+
+from dillo.models.comments import Comment
+from dillo.models.posts import Post, SEARCH_CONFIG
+
+
 def parse_text_query(text: str, filters: dict):
     """Extend query filters by parsing text.
 
     If a test looks like user=harry, add it as a dedicated filter to the
-    `filters` dictionary.
+    `filters` dictionary. The rest of the text is matched against the
+    search vector of posts.
     """
     text_filter = ''
     for t in text.split():
         if t.startswith('user='):
             filters['user__username'] = t.split('=')[1]
         elif t.startswith('commented-by='):
-            filters['comments__user__username'] = t.split('=')[1]
+            # A subquery rather than a join, which would repeat posts for every comment
+            filters['id__in'] = Comment.objects.filter(
+                user__username=t.split('=')[1],
+                entity_content_type__app_label='dillo',
+                entity_content_type__model='post',
+            ).values('entity_object_id')
         else:
             text_filter = f"{text_filter} {t}"
     if text_filter:
-        filters['title__search'] = text_filter.strip()
+        filters['search_vector'] = SearchQuery(text_filter.strip(), config=SEARCH_CONFIG)
     return filters
+
+
+def search_posts(text: str) -> QuerySet:
+    """Find published and public posts matching text.
+
+    Posts are sorted by search rank, which decreases with their age, so that
+    after POSTS_SEARCH_RECENCY_DAYS (default 30) the rank of a post is halved.
+    Queries without text, e.g. 'user=harry', list the latest posts first.
+    """
+    filters = parse_text_query(text, {'visibility': 'public', 'status': 'published'})
+    posts = Post.objects.filter(**filters)
+    search_query = filters.get('search_vector')
+    if not search_query:
+        return posts.order_by('-published_at')
+
+    recency_days = getattr(settings, 'POSTS_SEARCH_RECENCY_DAYS', 30)
+    age = Extract(
+        ExpressionWrapper(Now() - F('published_at'), output_field=DurationField()), 'epoch'
+    )
+    rank = ExpressionWrapper(
+        SearchRank(F('search_vector'), search_query) / (1.0 + age / (recency_days * 86400.0)),
+        output_field=FloatField(),
+    )
+    return posts.annotate(rank=rank).order_by('-rank', '-published_at')
@@ -2,29 +2,31 @@ import logging
 import typing
 import re
 import pathlib
-import requests
 
 from actstream import action, models as models_actstream
 from actstream.actions import follow
 from allauth.socialaccount.models import SocialAccount
-from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.signals import user_logged_in
 from django.contrib.contenttypes.models import ContentType
-from django.core.files.base import ContentFile
-from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.db.models import F
 from django.db import IntegrityError, transaction
 from django.dispatch import receiver
 from django.core.files.storage import default_storage
 from allauth.account.signals import email_confirmed, email_changed
 from allauth.account.models import EmailAddress
+from taggit.models import Tag, TaggedItem
 
+import dillo.encoding
 import dillo.models.comments
+import dillo.models.directory
+import dillo.models.feeds
 import dillo.models.mixins
 import dillo.models.posts
 import dillo.models.profiles
 import dillo.models.static_assets
+import dillo.models.tags
 import dillo.tasks.feeds
 import dillo.tasks.profile
 
@@ -108,6 +110,7 @@ def on_saved_post(sender, instance, created, **kwargs):
     # Extract tags and mentions from text and assign them to the Post
     tags, mentions = extract_tags_and_mentions(instance.title)
     instance.tags.set(*tags)
+    dillo.models.posts.update_search_vector(dillo.models.posts.Post.objects.filter(pk=instance.pk))
     # Delete all existing mentions
     dillo.models.mixins.Mentions.objects.filter(
         content_type_id=instance.content_type_id, object_id=instance.id
@@ -166,6 +169,18 @@ def on_pre_delete_post_delete_all_media(sender, instance: dillo.models.posts.Pos
         static_asset.delete()
 
 
+def delete_directory_from_storage(path: str):
+    """Recursively delete a directory (or prefix) from default_storage."""
+    try:
+        directories, files = default_storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for file in files:
+        default_storage.delete(f'{path}/{file}')
+    for directory in directories:
+        delete_directory_from_storage(f'{path}/{directory}')
+
+
 @receiver(post_delete, sender=dillo.models.static_assets.StaticAsset)
 def on_deleted_static_asset_delete_all_files(
     sender, instance: dillo.models.static_assets.StaticAsset, using, **kwargs
@@ -178,8 +193,10 @@ def on_deleted_static_asset_delete_all_files(
         if not instance.source:
             return
         source_path = pathlib.Path(str(instance.source))
-        default_storage.delete(str(source_path.with_suffix('.preview.gif')))
+        for preview_path in dillo.encoding.get_preview_paths(source_path):
+            default_storage.delete(preview_path)
         default_storage.delete(str(source_path.with_suffix('.720p.mp4')))
+        delete_directory_from_storage(dillo.encoding.get_stream_path(source_path))
         log.debug('Removed video and variations from storage')
     instance.source.delete(False)
 
@@ -245,14 +262,13 @@ def on_social_account_added(sender, instance: SocialAccount, created, **kwargs):
     if name:
         log.debug('Updating name via socialaccount for user %i' % instance.user.id)
         instance.user.profile.name = name
-        instance.user.profile.save()
+        instance.user.profile.save(update_fields=['name'])
 
     # Look for Social Account avatar and update the avatar
     url_avatar = instance.get_avatar_url()
     if url_avatar:
         log.debug('Updating avatar via socialaccount for user %i' % instance.user.id)
-        image_content = ContentFile(requests.get(url_avatar).content)
-        instance.user.profile.avatar.save("profile.jpg", image_content)
+        dillo.tasks.profile.download_profile_avatar(instance.user.id, url_avatar)
 
 
 @receiver(post_save, sender=models_actstream.Action)
@@ -261,26 +277,48 @@ def on_created_action(sender, instance: models_actstream.Action, created, **kwar
     if not created:
         return
 
-    # If content_type is Post or Profile
-    if (
-        instance.action_object_content_type
-        == ContentType.objects.get_for_model(dillo.models.posts.Post)
-        and instance.verb == 'posted'
-    ) or (
-        instance.action_object_content_type
-        == ContentType.objects.get_for_model(dillo.models.profiles.Profile)
-        and instance.verb == 'updated their reel'
-    ):
-        dillo.tasks.feeds.establish_time_proximity(instance)
-
     log.debug('Creating background fanout operation for action %i' % instance.id)
     dillo.tasks.feeds.activity_fanout_to_feeds(instance.id)
 
 
+@receiver(post_delete, sender=dillo.models.feeds.ActionExtra)
+def on_deleted_action_extra(sender, instance: dillo.models.feeds.ActionExtra, **kwargs):
+    """Keep the near actions count of the explore feed item up to date."""
+    if not instance.parent_action_id:
+        return
+    dillo.models.feeds.ExploreFeedItem.objects.filter(
+        action_id=instance.parent_action_id, near_actions_count__gt=0
+    ).update(near_actions_count=F('near_actions_count') - 1)
+
+
+def update_follow_counts(follow: models_actstream.Follow, delta: int):
+    """Add delta to the follow counters of a followed User or Tag.
+
+    Counters never go below 0, in case they were not backfilled yet.
+    """
+    content_type = ContentType.objects.get_for_id(follow.content_type_id)
+    if content_type.model_class() is User:
+        followed = dillo.models.profiles.Profile.objects.filter(user_id=follow.object_id)
+        follower = dillo.models.profiles.Profile.objects.filter(user_id=follow.user_id)
+        if delta < 0:
+            followed = followed.filter(followers_count__gte=-delta)
+            follower = follower.filter(following_count__gte=-delta)
+        followed.update(followers_count=F('followers_count') + delta)
+        follower.update(following_count=F('following_count') + delta)
+    elif content_type.model_class() is Tag:
+        stats = dillo.models.tags.TagStats.objects.filter(tag_id=follow.object_id)
+        if delta > 0:
+            dillo.models.tags.TagStats.objects.get_or_create(tag_id=follow.object_id)
+        else:
+            stats = stats.filter(followers_count__gte=-delta)
+        stats.update(followers_count=F('followers_count') + delta)
+
+
 @receiver(post_save, sender=models_actstream.Follow)
 def on_created_follow(sender, instance: models_actstream.Follow, created, **kwargs):
     if not created:
         return
+    update_follow_counts(instance, 1)
     dillo.tasks.feeds.repopulate_timeline_content(
         instance.content_type_id, instance.object_id, instance.user_id, 'follow'
     )
@@ -291,11 +329,84 @@ def on_deleted_follow(sender, instance: models_actstream.Follow, **kwargs):
     """User stops following something."""
     content_type = ContentType.objects.get_for_id(instance.content_type_id)
     log.debug("Unfollowing %s %s" % (content_type.name, instance.object_id))
+    update_follow_counts(instance, -1)
     dillo.tasks.feeds.repopulate_timeline_content(
         instance.content_type_id, instance.object_id, instance.user_id, 'unfollow'
     )
 
 
+def update_tag_usage_counts(tagged_item: TaggedItem, delta: int):
+    """Add delta to the usage counter of a tag, for Posts and Profiles."""
+    content_type = ContentType.objects.get_for_id(tagged_item.content_type_id)
+    count_field = dillo.models.tags.USAGE_COUNT_FIELDS.get(content_type.model)
+    if content_type.app_label != 'dillo' or not count_field:
+        return
+    stats = dillo.models.tags.TagStats.objects.filter(tag_id=tagged_item.tag_id)
+    if delta > 0:
+        dillo.models.tags.TagStats.objects.get_or_create(tag_id=tagged_item.tag_id)
+    else:
+        stats = stats.filter(**{f'{count_field}__gte': -delta})
+    stats.update(**{count_field: F(count_field) + delta})
+
+
+def update_profile_directory_entry(tagged_item: TaggedItem):
+    """Update the directory entry of a profile, if the tagged item is one."""
+    content_type = ContentType.objects.get_for_id(tagged_item.content_type_id)
+    if content_type.model_class() is not dillo.models.profiles.Profile:
+        return
+    dillo.models.directory.update_directory_entries([tagged_item.object_id])
+
+
+@receiver(post_save, sender=TaggedItem)
+def on_created_tagged_item(sender, instance: TaggedItem, created, **kwargs):
+    if not created:
+        return
+    update_tag_usage_counts(instance, 1)
+    update_profile_directory_entry(instance)
+
+
+@receiver(post_delete, sender=TaggedItem)
+def on_deleted_tagged_item(sender, instance: TaggedItem, **kwargs):
+    update_tag_usage_counts(instance, -1)
+    update_profile_directory_entry(instance)
+
+
+@receiver(post_save, sender=User)
+def on_saved_user_update_directory_entry(sender, instance: User, created, update_fields, **kwargs):
+    """Add or remove the user from the directory, if activated or deactivated."""
+    # Entries of new users are created with their profile
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    dillo.models.directory.update_directory_entries([instance.id])
+
+
+@receiver(post_save, sender=dillo.models.profiles.Profile)
+def on_saved_profile_update_directory_entry(
+    sender, instance: dillo.models.profiles.Profile, created, update_fields, **kwargs
+):
+    """Update the directory entry of a profile, if a field listed in the directory changed.
+
+    The counters are copied by the update_user_directory task instead.
+    """
+    if update_fields is not None:
+        if not {'is_looking_for_work', 'city', 'city_ref'}.intersection(update_fields):
+            return
+    elif not created and not instance.data_changed(['is_looking_for_work', 'city_ref_id']):
+        return
+    dillo.models.directory.update_directory_entries([instance.user_id])
+
+
+@receiver(m2m_changed, sender=dillo.models.profiles.Profile.badges.through)
+def on_changed_badges_update_directory_entry(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        dillo.models.directory.update_directory_entries([instance.user_id])
+    elif pk_set:
+        # Badges assigned from the badge side, e.g. badge.badges.add(profile)
+        dillo.models.directory.update_directory_entries(list(pk_set))
+
+
 @receiver(email_confirmed)
 def on_email_confirmed(request, email_address: EmailAddress, **kwargs):
     """If confirmed, subscribe to newsletter."""
@@ -313,23 +424,9 @@ def on_email_email_changed(
 
 @receiver(pre_delete, sender=User)
 def user_pre_delete(sender, instance: User, **kwargs):
-    """Delete the user from the newsletter."""
-
-    if not hasattr(settings, 'ANYMAIL'):
-        log.info("Mailgun not configured, skipping mailing list subscription update")
-        return
-
-    if not hasattr(settings, 'MAILING_LIST_NEWSLETTER_EMAIL'):
-        log.debug("Newsletter not configured, skipping mailing list subscription update")
-        return
-
-    api_url_base = f"https://api.mailgun.net/v3"
-    api_url_newsletter = f"{api_url_base}/lists/{settings.MAILING_LIST_NEWSLETTER_EMAIL}"
-    requests.delete(
-        f"{api_url_newsletter}/members/{instance.email}",
-        auth=('api', settings.ANYMAIL['MAILGUN_API_KEY']),
-    )
-    log.info("Deleted user %i from mailing list" % instance.id)
+    """Delete the user from the newsletter, once the user is deleted."""
+    email = instance.email
+    transaction.on_commit(lambda: dillo.tasks.profile.delete_mailing_list_member(email))
 
 
 @receiver(user_logged_in)
@@ -343,4 +440,5 @@ def on_logged_in_save_ip(sender, request, user: User, **kwargs):
     else:
         ip = request.META.get('REMOTE_ADDR')
     user.profile.ip_address = ip
-    user.profile.save()
+    # Save only the ip, as the counters of the profile might be outdated
+    user.profile.save(update_fields=['ip_address'])
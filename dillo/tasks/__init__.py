@@ -1,6 +1,8 @@
+import dillo.tasks.directory
 import dillo.tasks.feeds
 import dillo.tasks.files
 import dillo.tasks.profile
 import dillo.tasks.storage
+import dillo.tasks.tags
 import dillo.tasks.video_processing
 import dillo.tasks.emails
@@ -0,0 +1,27 @@
+import logging
+
+from background_task import background
+from django.conf import settings
+from django.core.cache import cache
+
+import dillo.models.directory
+
+log = logging.getLogger(__name__)
+
+
+@background(remove_existing_tasks=True)
+def update_user_directory():
+    """Update the directory entries of all active users.
+
+    Signals keep the tags, badges and city of the entries up to date, while
+    the posts, likes and views counters are copied here. The cached facet
+    counts are cleared afterwards.
+    """
+    dillo.models.directory.update_directory_entries()
+    cache.delete_many([dillo.models.directory.FACET_COUNTS_CACHE_KEY % v for v in (False, True)])
+    log.info('Updated the user directory')
+
+
+if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+    log.debug('Executing background tasks synchronously')
+    update_user_directory = update_user_directory.task_function
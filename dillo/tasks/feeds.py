@@ -1,10 +1,15 @@
 import datetime
 import logging
+import time
+import typing
 from actstream import models as models_actstream
 from background_task import background
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import CharField, Count, F
+from django.db.models.functions import Cast
 from django.template.defaultfilters import truncatechars
 from django.utils import timezone
 from taggit import models as models_taggit
@@ -12,11 +17,64 @@ from taggit import models as models_taggit
 import dillo.models
 import dillo.models.feeds
 import dillo.models.posts
+import dillo.models.profiles
 import dillo.views
 from dillo.tasks.emails import send_notification_mail
 
 log = logging.getLogger(__name__)
 
+# Verbs of the notifications aggregated by action object or, for comments
+# and replies, by target (the commented entity)
+AGGREGATED_VERBS = {'liked', 'commented', 'replied'}
+
+
+def add_notification(user_id: int, action: models_actstream.Action) -> bool:
+    """Notify a user about an action.
+
+    Likes are aggregated by action object, comments and replies by target,
+    with the latest notification of the same kind if it is less than
+    NOTIFICATIONS_AGGREGATION_WINDOW hours old (default 24).
+    Return True if a new notification was created.
+    """
+    FeedEntry = dillo.models.feeds.FeedEntry
+    if action.verb not in AGGREGATED_VERBS:
+        FeedEntry.objects.create(user_id=user_id, action=action)
+        return True
+
+    window = getattr(settings, 'NOTIFICATIONS_AGGREGATION_WINDOW', 24)
+    if action.verb == 'liked':
+        content_type_id = action.action_object_content_type_id
+        object_id = action.action_object_object_id
+    else:
+        # Every comment is a new action object, while the entity is the same
+        content_type_id = action.target_content_type_id
+        object_id = action.target_object_id
+    aggregation_key = f'{action.verb}:{content_type_id}:{object_id}'
+    with transaction.atomic():
+        entry = (
+            FeedEntry.objects.select_for_update()
+            .filter(
+                user_id=user_id,
+                category='notification',
+                aggregation_key=aggregation_key,
+                created_at__gte=action.timestamp - datetime.timedelta(hours=window),
+            )
+            .order_by('-created_at')
+            .first()
+        )
+        if entry is None:
+            FeedEntry.objects.create(
+                user_id=user_id,
+                action=action,
+                aggregation_key=aggregation_key,
+                latest_actor_ids=[int(action.actor_object_id)],
+            )
+            return True
+        entry.aggregate(action)
+        entry.save()
+    log.debug('Aggregated action %i in notification %i' % (action.id, entry.id))
+    return False
+
 
 def feeds_fanout_liked(action):
     # Do not notify user of own activity
@@ -30,9 +88,9 @@ def feeds_fanout_liked(action):
         return
     # Fanout like notifications (only to owner)
     log.debug('Update notification feed about like')
-    dillo.models.feeds.FeedEntry.objects.create(
-        user=recipient, action=action,
-    )
+    if not add_notification(recipient.id, action):
+        # The owner was notified about likes of this content already
+        return
     # Email notifications
     log.debug('Sending notification email to user %i', recipient.id)
 
@@ -61,68 +119,87 @@ def feeds_fanout_liked(action):
     )
 
 
+def send_comment_notification_mail(action, follower: User):
+    content_name = truncatechars(action.action_object.entity.title, 20)
+    content_text = truncatechars(action.action_object.content, 30)
+    comment_context = dillo.views.emails.CommentOrReplyContext(
+        subject='Your post has a new comment!',
+        own_name=follower.profile.first_name_guess or follower.username,
+        own_profile_absolute_url=follower.profile.absolute_url,
+        action_author_name=action.actor.profile.first_name_guess or action.actor.username,
+        action_author_absolute_url=action.actor.profile.absolute_url,
+        content_name=content_name,
+        content_absolute_url=action.action_object.absolute_url,
+        content_text=content_text,
+    ).as_dict
+
+    send_notification_mail(
+        f'New comment on "{content_name}"',
+        follower,
+        template='comment',
+        context=comment_context,
+    )
+
+
+def send_reply_notification_mail(action, follower: User):
+    content_name = truncatechars(action.action_object.entity.title, 20)
+    content_text = truncatechars(action.action_object.content, 30)
+    reply_context = dillo.views.emails.CommentOrReplyContext(
+        subject='Your comment has a new reply!',
+        own_name=follower.profile.first_name_guess or follower.username,
+        own_profile_absolute_url=follower.profile.absolute_url,
+        action_author_name=action.actor.profile.first_name_guess or action.actor.username,
+        action_author_absolute_url=action.actor.profile.absolute_url,
+        content_name=content_name,
+        content_absolute_url=action.action_object.absolute_url,
+        content_text=content_text,
+    ).as_dict
+    send_notification_mail(
+        f'New reply to "{content_name}"', follower, template='reply', context=reply_context,
+    )
+
+
+def get_follower_ids(obj) -> typing.List[int]:
+    return list(
+        models_actstream.Follow.objects.followers_qs(obj)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+
+
+def schedule_fanout_shards(action, user_ids: typing.Iterable[int], category: str):
+    """Split the recipients of an action in shards, each fanned out by its own task.
+
+    Shards hold at most FEED_FANOUT_SHARD_SIZE users (default 500).
+    """
+    shard_size = getattr(settings, 'FEED_FANOUT_SHARD_SIZE', 500)
+    # Sorted, so that shards of the same action never overlap
+    user_ids = sorted(set(user_ids))
+    for start in range(0, len(user_ids), shard_size):
+        fanout_shard(action.id, user_ids[start : start + shard_size], category)
+    log.debug(
+        'Scheduled fanout of action %i to %i users in %i shards'
+        % (action.id, len(user_ids), -(-len(user_ids) // shard_size))
+    )
+
+
 def feeds_fanout_commented(action):
     # Fan out notification to Post followers
-    for follower in models_actstream.followers(action.action_object.entity):
-        if action.actor == follower:
-            log.debug('Skipping notification generation post owner')
-            continue
-        log.debug(
-            'Generating notification for user %i about comment %i'
-            % (follower.id, action.action_object.id)
-        )
-        follower.feed_entries.create(action=action)
-        # Email notification
-        content_name = truncatechars(action.action_object.entity.title, 20)
-        content_text = truncatechars(action.action_object.content, 30)
-        comment_context = dillo.views.emails.CommentOrReplyContext(
-            subject='Your post has a new comment!',
-            own_name=follower.profile.first_name_guess or follower.username,
-            own_profile_absolute_url=follower.profile.absolute_url,
-            action_author_name=action.actor.profile.first_name_guess or action.actor.username,
-            action_author_absolute_url=action.actor.profile.absolute_url,
-            content_name=content_name,
-            content_absolute_url=action.action_object.absolute_url,
-            content_text=content_text,
-        ).as_dict
-
-        send_notification_mail(
-            f'New comment on "{content_name}"',
-            follower,
-            template='comment',
-            context=comment_context,
-        )
+    follower_ids = get_follower_ids(action.action_object.entity)
+    log.debug('Generating notifications about comment %i' % action.action_object.id)
+    schedule_fanout_shards(
+        action, [i for i in follower_ids if i != action.actor.id], 'notification'
+    )
 
 
 def feeds_fanout_replied(action):
     """Distribute notifications about a comment being replied to."""
-    # Fan out notification to parent Comment followers
-    for follower in models_actstream.followers(action.action_object.parent_comment):
-        if action.actor == follower:
-            # If the reply author is the same as the parent comment author
-            log.debug('Skipping notification generation for comment owner')
-            continue
-        log.debug(
-            'Generating notification for user %i about reply %i'
-            % (follower.id, action.action_object.id)
-        )
-        follower.feed_entries.create(action=action)
-        # Email notification
-        content_name = truncatechars(action.action_object.entity.title, 20)
-        content_text = truncatechars(action.action_object.content, 30)
-        reply_context = dillo.views.emails.CommentOrReplyContext(
-            subject='Your comment has a new reply!',
-            own_name=follower.profile.first_name_guess or follower.username,
-            own_profile_absolute_url=follower.profile.absolute_url,
-            action_author_name=action.actor.profile.first_name_guess or action.actor.username,
-            action_author_absolute_url=action.actor.profile.absolute_url,
-            content_name=content_name,
-            content_absolute_url=action.action_object.absolute_url,
-            content_text=content_text,
-        ).as_dict
-        send_notification_mail(
-            f'New reply to "{content_name}"', follower, template='reply', context=reply_context,
-        )
+    # Fan out notification to parent Comment followers, except the reply author
+    follower_ids = get_follower_ids(action.action_object.parent_comment)
+    log.debug('Generating notifications about reply %i' % action.action_object.id)
+    schedule_fanout_shards(
+        action, [i for i in follower_ids if i != action.actor.id], 'notification'
+    )
 
 
 def feeds_fanout_started_following(action):
@@ -182,30 +259,12 @@ def feeds_fanout_started_following(action):
 
 def feeds_fanout_posted(action):
     """Populate users feeds from the given action."""
-    # Define list of processed users (to prevent multiple timeline
-    # entries for the same post)
-    processed_users = []
-
-    def add_to_timeline(user, action):
-        user.feed_entries.create(
-            category='timeline', action=action,
-        )
-        log.debug('Adding post activity %i to user %i timeline' % (action.id, user.id))
-        processed_users.append(user)
-
-    # Add to the timeline of the post owner
-    add_to_timeline(action.actor, action)
-
-    # Find followers of user
-    for follower in models_actstream.followers(action.actor):
-        add_to_timeline(follower, action)
-
+    # The post owner, followers of the owner and followers of the post tags.
+    # Duplicates are removed, so that a post is only once in a timeline.
+    user_ids = [action.actor.id] + get_follower_ids(action.actor)
     for tag in action.action_object.tags.all():
-        for follower in models_actstream.followers(tag):
-            if follower in processed_users:
-                log.debug('Skip adding post to timeline, it exists already')
-                continue
-            add_to_timeline(follower, action)
+        user_ids += get_follower_ids(tag)
+    schedule_fanout_shards(action, user_ids, 'timeline')
 
 
 # TODO(fsiddi) turn this into a shared enum to use with action.send
@@ -219,9 +278,68 @@ fanout_functions = {
 }
 
 
+# Emails sent to the users notified about an action, by verb
+notification_mail_functions = {
+    'commented': send_comment_notification_mail,
+    'replied': send_reply_notification_mail,
+}
+
+
+@background()
+def fanout_shard(actstream_action_id, user_ids, category):
+    """Add an action to the feed of some users.
+
+    Users that have the action in their feed already are skipped, so that
+    a shard can be safely run again.
+    """
+    start = time.monotonic()
+    action = models_actstream.Action.objects.get(pk=actstream_action_id)
+    FeedEntry = dillo.models.feeds.FeedEntry
+    existing_user_ids = set(
+        FeedEntry.objects.filter(
+            action=action, category=category, user_id__in=user_ids
+        ).values_list('user_id', flat=True)
+    )
+    new_user_ids = [i for i in user_ids if i not in existing_user_ids]
+    if category == 'notification':
+        for user_id in new_user_ids:
+            add_notification(user_id, action)
+    else:
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=i, action=action, category=category) for i in new_user_ids]
+        )
+    if category == 'notification' and action.verb in notification_mail_functions:
+        for user in User.objects.filter(pk__in=new_user_ids).select_related('profile'):
+            notification_mail_functions[action.verb](action, user)
+    log.info(
+        'Added action %i to the %s of %i users (%i skipped) in %.0f ms'
+        % (
+            action.id,
+            category,
+            len(new_user_ids),
+            len(existing_user_ids),
+            (time.monotonic() - start) * 1000,
+        )
+    )
+
+
+def is_on_explore_feed(action: models_actstream.Action) -> bool:
+    """Whether the action is about a published post or an updated reel."""
+    get_for_model = ContentType.objects.get_for_model
+    return (
+        action.action_object_content_type_id == get_for_model(dillo.models.posts.Post).id
+        and action.verb == 'posted'
+    ) or (
+        action.action_object_content_type_id == get_for_model(dillo.models.profiles.Profile).id
+        and action.verb == 'updated their reel'
+    )
+
+
 @background()
 def activity_fanout_to_feeds(actstream_action_id):
     action = models_actstream.Action.objects.get(pk=actstream_action_id)
+    if is_on_explore_feed(action):
+        establish_time_proximity(action)
     log.debug('Processing "%s" action for feed fanout' % action.verb)
     if action.verb not in fanout_functions:
         return
@@ -232,29 +350,12 @@ def activity_fanout_to_feeds(actstream_action_id):
 def repopulate_timeline_content(content_type_id, object_id, user_id, action_verb):
     """Based on the follow/unfollow action.
 
-    Only repopulates if a User object is being followed or unfollowed.
-    Tags are TODO.
+    When following a User or a Tag, the 'posted' actions of their latest
+    TIMELINE_REPOPULATION_DEPTH posts (default 10) are added to the user
+    timeline, unless already there. When unfollowing a User, all the
+    'posted' actions of the User are removed from the user timeline, and
+    when unfollowing a Tag, the ones of its latest posts.
     """
-
-    def push_action_in_user_feed(user, action):
-        # Push activities if they don't exist
-        if user.feed_entries.filter(action_id=action.pk).exists():
-            log.debug('Skipping existing activity in user feed')
-            return
-        else:
-            log.debug('Populating timeline with action %i' % action.pk)
-            user.feed_entries.create(
-                category='timeline', action=action,
-            )
-
-    def pull_action_from_user_feed(user, action):
-        # Do a lookup on the current user's feed, and remove any matching activity found.
-        try:
-            log.debug('Removing action %i from user %i feed' % (action.pk, user.pk))
-            user.feed_entries.filter(action_id=action.pk).delete()
-        except dillo.models.feeds.FeedEntry.DoesNotExist:
-            pass
-
     content_type = ContentType.objects.get_for_id(content_type_id)
     content_type_class = content_type.model_class()
     try:
@@ -262,92 +363,249 @@ def repopulate_timeline_content(content_type_id, object_id, user_id, action_verb
     except content_type_class.DoesNotExist:
         log.debug("Skipping timeline repopulation, content was deleted")
         return
-    # If follow User
-    if action_verb == 'follow' and isinstance(target, User):
-        # If following user, get 10 posts and check if their creation activity is already in the
-        # users timeline feed. If not, add push to the timeline
-        actions = models_actstream.Action.objects.filter(verb='posted', actor_object_id=target.pk)[
-            :10
-        ]
-        user = User.objects.get(pk=user_id)
-        for action in actions:
-            push_action_in_user_feed(user, action)
-    elif action_verb == 'follow' and isinstance(target, models_taggit.Tag):
-        # Get 10 posts with that tag
-        posts = dillo.models.posts.Post.objects.filter(tags__name__in=[target.name])[:10]
-        for post in posts:
-            # Find post action (get only the first, as the same post could be
-            # connected with multiple tags)
-            action = models_actstream.Action.objects.filter(
-                verb='posted', action_object_object_id=post.pk
-            ).first()
-            push_action_in_user_feed(User.objects.get(pk=user_id), action)
-    # If unfollow User
-    elif action_verb == 'unfollow' and isinstance(target, User):
-        # Fetch all actions from the unfollowed users
-        actions = models_actstream.Action.objects.filter(
-            verb='posted', actor_object_id=target.pk
-        ).all()
-        # Fetch current user
-        user = User.objects.get(pk=user_id)
-        for action in actions:
-            pull_action_from_user_feed(user, action)
-    elif action_verb == 'unfollow' and isinstance(target, models_taggit.Tag):
-        # Get the latest 10 posts with that tag
-        posts = dillo.models.posts.Post.objects.filter(tags__name__in=[target.name]).order_by(
-            '-created_at'
-        )[:10]
-        for post in posts:
-            # Find post action
-            action = models_actstream.Action.objects.get(
-                verb='posted', action_object_object_id=post.pk
-            )
-            user = User.objects.get(pk=user_id)
-            pull_action_from_user_feed(user, action)
+
+    depth = getattr(settings, 'TIMELINE_REPOPULATION_DEPTH', 10)
+    posted_actions = models_actstream.Action.objects.filter(verb='posted')
+    if isinstance(target, User):
+        actions = posted_actions.filter(
+            actor_content_type=ContentType.objects.get_for_model(User),
+            actor_object_id=str(target.pk),
+        )
+        if action_verb == 'follow':
+            actions = actions.order_by('-timestamp')[:depth]
+    elif isinstance(target, models_taggit.Tag):
+        # Action object ids are strings
+        post_ids = (
+            dillo.models.posts.Post.objects.filter(tags=target)
+            .order_by('-created_at')
+            .annotate(object_id=Cast('id', output_field=CharField()))
+            .values('object_id')[:depth]
+        )
+        actions = posted_actions.filter(
+            action_object_content_type=ContentType.objects.get_for_model(dillo.models.posts.Post),
+            action_object_object_id__in=post_ids,
+        )
+    else:
+        return
+
+    timeline = dillo.models.feeds.FeedEntry.objects.filter(user_id=user_id)
+    if action_verb == 'follow':
+        action_ids = (
+            posted_actions.filter(pk__in=actions.values('pk'))
+            .exclude(pk__in=timeline.values('action_id'))
+            .values_list('pk', flat=True)
+        )
+        feed_entries = dillo.models.feeds.FeedEntry.objects.bulk_create(
+            [
+                dillo.models.feeds.FeedEntry(user_id=user_id, category='timeline', action_id=pk)
+                for pk in action_ids
+            ]
+        )
+        log.info('Added %i actions to user %i timeline' % (len(feed_entries), user_id))
+    elif action_verb == 'unfollow':
+        deleted_count, _ = timeline.filter(
+            category='timeline', action_id__in=actions.values('pk')
+        ).delete()
+        log.info('Removed %i actions from user %i timeline' % (deleted_count, user_id))
+
+
+def get_parent_action_id(action: models_actstream.Action):
+    """Return the id of the parent of a new action, or None if it starts a group.
+
+    The group of the actor, verb and action object type is looked up, and
+    updated, in the ActionGroup table.
+    """
+    window = getattr(settings, 'ACTIONS_GROUPING_WINDOW', 60)
+    with transaction.atomic():
+        group, created = dillo.models.feeds.ActionGroup.objects.select_for_update().get_or_create(
+            actor_content_type_id=action.actor_content_type_id,
+            actor_object_id=action.actor_object_id,
+            verb=action.verb,
+            action_object_content_type_id=action.action_object_content_type_id,
+            defaults={'parent_action': action, 'last_action_at': action.timestamp},
+        )
+        if created:
+            return None
+        is_near = action.timestamp - group.last_action_at < datetime.timedelta(minutes=window)
+        parent_action_id = group.parent_action_id if is_near else None
+        if not is_near:
+            group.parent_action = action
+        group.last_action_at = max(group.last_action_at, action.timestamp)
+        group.save()
+    return parent_action_id
 
 
 def establish_time_proximity(action: models_actstream.Action):
     """Add Extra information a Post-related action.
 
-    If a similar action (same actor, same object type, time delta less than 1h)
-    was created, set the action_parent to said action.
+    If a similar action (same actor, same object type) was created less than
+    ACTIONS_GROUPING_WINDOW minutes (default 60) before, set the parent_action
+    to the parent of said action.
+
+    Actions that have extra info already are skipped, so that the fanout
+    task can be safely run again.
 
     TODO(fsiddi): Refactor into add_extra_properties, with subfunctions for
     time proximity and feature in explore feed.
     """
-    adjacent_action = (
-        models_actstream.Action.objects.filter(
-            actor_content_type=action.actor_content_type,
-            actor_object_id=action.actor_object_id,
-            verb=action.verb,
-            action_object_content_type=action.action_object_content_type,
-            timestamp__gte=(timezone.now() - datetime.timedelta(minutes=60)),
+    ActionExtra = dillo.models.feeds.ActionExtra
+    ExploreFeedItem = dillo.models.feeds.ExploreFeedItem
+    with transaction.atomic():
+        if ActionExtra.objects.filter(action=action).exists():
+            log.debug('Action %i has extra info already' % action.id)
+            return
+        parent_action_id = get_parent_action_id(action)
+
+        log.debug('Adding extra info to action %i' % action.id)
+        ActionExtra.objects.create(
+            action=action, parent_action_id=parent_action_id, is_on_explore_feed=True
         )
-        .exclude(pk=action.id)
-        .order_by('-timestamp')
-        .first()
-    )
-    parent_action = None
-
-    if adjacent_action:
-        adjancent_timeline_entry = dillo.models.feeds.ActionExtra.objects.filter(
-            action=adjacent_action
-        ).first()
-        if not adjancent_timeline_entry:
-            log.error('Missing adjacent timeline entry for action %i' % action.id)
+        if parent_action_id:
+            ExploreFeedItem.objects.filter(action_id=parent_action_id).update(
+                near_actions_count=F('near_actions_count') + 1
+            )
         else:
-            parent_action = (
-                adjancent_timeline_entry.parent_action or adjancent_timeline_entry.action
+            ExploreFeedItem.objects.create(action=action, score=ExploreFeedItem.get_score(action))
+
+
+def delete_feed_entries_in_chunks(entries, chunk_size: int, offset: int = 0) -> int:
+    """Delete entries chunk by chunk, keeping the first offset entries.
+
+    Every chunk is deleted in its own short statement, so that rows are
+    not locked for long. Return the number of deleted entries.
+    """
+    pause = getattr(settings, 'FEED_PRUNING_CHUNK_PAUSE', 0.1)
+    deleted_count = 0
+    while True:
+        ids = list(entries.values_list('id', flat=True)[offset : offset + chunk_size])
+        if not ids:
+            return deleted_count
+        deleted_count += dillo.models.feeds.FeedEntry.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < chunk_size:
+            return deleted_count
+        time.sleep(pause)
+
+
+@background(remove_existing_tasks=True)
+def prune_feed_entries():
+    """Enforce the retention policy of feed entries.
+
+    Keep the newest FEED_TIMELINE_MAX_ENTRIES timeline entries (default 500)
+    of each user, and delete read notifications older than
+    FEED_READ_NOTIFICATIONS_MAX_AGE days (default 90). Entries are deleted
+    in chunks of FEED_PRUNING_CHUNK_SIZE (default 1000).
+    """
+    FeedEntry = dillo.models.feeds.FeedEntry
+    chunk_size = getattr(settings, 'FEED_PRUNING_CHUNK_SIZE', 1000)
+    max_entries = getattr(settings, 'FEED_TIMELINE_MAX_ENTRIES', 500)
+    max_age = getattr(settings, 'FEED_READ_NOTIFICATIONS_MAX_AGE', 90)
+
+    read_notifications = FeedEntry.objects.filter(
+        category='notification',
+        is_read=True,
+        created_at__lt=timezone.now() - datetime.timedelta(days=max_age),
+    ).order_by('id')
+    deleted_count = delete_feed_entries_in_chunks(read_notifications, chunk_size)
+    log.info('Deleted %i read notifications' % deleted_count)
+
+    timelines = FeedEntry.objects.filter(category='timeline')
+    user_ids = (
+        timelines.order_by()
+        .values('user_id')
+        .annotate(entries_count=Count('id'))
+        .filter(entries_count__gt=max_entries)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in user_ids:
+        timeline = timelines.filter(user_id=user_id).order_by('-created_at', '-id')
+        deleted_count = delete_feed_entries_in_chunks(timeline, chunk_size, offset=max_entries)
+        log.info('Deleted %i old timeline entries of user %i' % (deleted_count, user_id))
+
+
+# Columns copied from actstream_action to dillo_archivedaction
+ARCHIVED_ACTION_COLUMNS = ', '.join(
+    [
+        'id',
+        'actor_content_type_id',
+        'actor_object_id',
+        'verb',
+        'description',
+        'target_content_type_id',
+        'target_object_id',
+        'action_object_content_type_id',
+        'action_object_object_id',
+        'timestamp',
+        'public',
+        'data',
+    ]
+)
+
+
+def move_actions_to_archive(action_ids) -> int:
+    """Move actions to the archive table in a single statement.
+
+    Return the number of moved actions.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM actstream_action WHERE id = ANY(%s)
+                RETURNING {ARCHIVED_ACTION_COLUMNS}
             )
+            INSERT INTO dillo_archivedaction ({ARCHIVED_ACTION_COLUMNS}, archived_at)
+            SELECT {ARCHIVED_ACTION_COLUMNS}, NOW() FROM moved
+            """,
+            [list(action_ids)],
+        )
+        return cursor.rowcount
+
+
+@background(remove_existing_tasks=True)
+def archive_actions():
+    """Move actions older than ACTIONS_ARCHIVE_AFTER_DAYS (default 365) to the archive.
 
-    log.debug('Adding extra info to action %i' % action.id)
-    dillo.models.feeds.ActionExtra.objects.create(
-        action=action, parent_action=parent_action, is_on_explore_feed=True
+    Actions still referenced by a feed entry or by the extra info of an
+    action are kept. Actions are moved in chunks of ACTIONS_ARCHIVE_CHUNK_SIZE
+    (default 1000).
+    """
+    ActionExtra = dillo.models.feeds.ActionExtra
+    chunk_size = getattr(settings, 'ACTIONS_ARCHIVE_CHUNK_SIZE', 1000)
+    max_age = getattr(settings, 'ACTIONS_ARCHIVE_AFTER_DAYS', 365)
+    pause = getattr(settings, 'FEED_PRUNING_CHUNK_PAUSE', 0.1)
+
+    old_actions = (
+        models_actstream.Action.objects.filter(
+            timestamp__lt=timezone.now() - datetime.timedelta(days=max_age)
+        )
+        .exclude(id__in=dillo.models.feeds.FeedEntry.objects.values('action_id'))
+        .exclude(id__in=ActionExtra.objects.values('action_id'))
+        .exclude(
+            id__in=ActionExtra.objects.filter(parent_action__isnull=False).values(
+                'parent_action_id'
+            )
+        )
+        .order_by('id')
     )
+    archived_count = 0
+    last_id = 0
+    while True:
+        ids = list(old_actions.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        archived_count += move_actions_to_archive(ids)
+        last_id = ids[-1]
+        if len(ids) < chunk_size:
+            break
+        time.sleep(pause)
+    log.info('Archived %i actions' % archived_count)
 
 
 if settings.BACKGROUND_TASKS_AS_FOREGROUND:
     # Will execute activity_fanout_to_feeds immediately
     log.debug('Executing background tasks synchronously')
     activity_fanout_to_feeds = activity_fanout_to_feeds.task_function
+    fanout_shard = fanout_shard.task_function
     repopulate_timeline_content = repopulate_timeline_content.task_function
+    prune_feed_entries = prune_feed_entries.task_function
+    archive_actions = archive_actions.task_function
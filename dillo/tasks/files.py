@@ -32,6 +32,14 @@ def move_blob_from_upload_to_storage(key):
     )
 
 
+def move_blobs_from_upload_to_storage(prefix):
+    """Move all the blobs starting with prefix from the upload bucket."""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=settings.AWS_UPLOADS_BUCKET_NAME, Prefix=prefix):
+        for blob in page.get('Contents', []):
+            move_blob_from_upload_to_storage(blob['Key'])
+
+
 @background()
 def async_move_blob_from_upload_to_storage(key):
     """Call the actual move function.
@@ -1,28 +1,120 @@
+import datetime
 import logging
 import typing
 
-import requests
 from allauth.account.models import EmailAddress
 from background_task import background
 from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
 from micawber.contrib.mcdjango import providers
+from micawber.exceptions import ProviderException
 
 import dillo.models.profiles
+from dillo import http_client
 from dillo.tasks.storage import download_image_from_web
 
 log = logging.getLogger(__name__)
 
+DEFAULT_REEL_EMBED_MAX_AGE = 60 * 60 * 24 * 7
+DEFAULT_REEL_EMBED_REFRESH_LIMIT = 500
+
 
 @background()
-def update_profile_reel_thumbnail(user_id):
+def update_profile_reel(user_id, with_thumbnail: bool = True):
+    """Fetch the oEmbed data of a profile reel.
 
+    Store the embed html in the profile and download the thumbnail, if
+    with_thumbnail or if the profile has none. If the data can not be
+    fetched, an embed html previously stored is kept.
+    """
     profile = dillo.models.profiles.Profile.objects.get(user_id=user_id)
-    oembed_data = providers.request(profile.reel)
+    if not profile.reel:
+        return
+    # Update the fields directly, as saving the profile would trigger another update
+    profiles = dillo.models.profiles.Profile.objects.filter(pk=profile.pk, reel=profile.reel)
+    try:
+        oembed_data = providers.request(profile.reel)
+    except ProviderException as e:
+        log.warning("Failed fetching reel oEmbed data for user %i: %s" % (user_id, e))
+        # Try again at the next refresh, not at every refresh
+        profiles.update(reel_embed_updated_at=timezone.now())
+        return
+    log.debug("Update profile reel embed for user %i" % user_id)
+    profiles.update(
+        reel_embed_html=oembed_data.get('html', ''), reel_embed_updated_at=timezone.now()
+    )
     if 'thumbnail_url' not in oembed_data:
         return
-    url = oembed_data['thumbnail_url']
-    log.debug("Update profile for user %i" % user_id)
-    download_image_from_web(url, profile.reel_thumbnail_16_9)
+    if with_thumbnail or not profile.reel_thumbnail_16_9:
+        log.debug("Update profile for user %i" % user_id)
+        # Saving the stale profile would reset the embed fields updated above
+        thumbnail = profile.reel_thumbnail_16_9
+        download_image_from_web(oembed_data['thumbnail_url'], thumbnail, save=False)
+        profiles.update(
+            reel_thumbnail_16_9=thumbnail.name,
+            reel_thumbnail_16_9_height=profile.reel_thumbnail_16_9_height,
+            reel_thumbnail_16_9_width=profile.reel_thumbnail_16_9_width,
+        )
+
+
+@background()
+def update_profile_reel_thumbnail(user_id):
+    """Kept for tasks queued before update_profile_reel existed."""
+    update_profile_reel(user_id)
+
+
+@background(remove_existing_tasks=True)
+def refresh_profile_reel_embeds():
+    """Queue the update of the reel embeds older than PROFILE_REEL_EMBED_MAX_AGE.
+
+    Embeds never fetched come first. At most PROFILE_REEL_EMBED_REFRESH_LIMIT
+    updates are queued at every call.
+    """
+    max_age = getattr(settings, 'PROFILE_REEL_EMBED_MAX_AGE', DEFAULT_REEL_EMBED_MAX_AGE)
+    limit = getattr(settings, 'PROFILE_REEL_EMBED_REFRESH_LIMIT', DEFAULT_REEL_EMBED_REFRESH_LIMIT)
+    outdated_at = timezone.now() - datetime.timedelta(seconds=max_age)
+    user_ids = list(
+        dillo.models.profiles.Profile.objects.exclude(reel='')
+        .filter(Q(reel_embed_updated_at__isnull=True) | Q(reel_embed_updated_at__lt=outdated_at))
+        .order_by(F('reel_embed_updated_at').asc(nulls_first=True))
+        .values_list('user_id', flat=True)[:limit]
+    )
+    for user_id in user_ids:
+        update_profile_reel(user_id, with_thumbnail=False)
+    log.info("Queued reel embed update for %i profiles" % len(user_ids))
+
+
+def _download_profile_avatar(user_id: int, url: str, replace: bool):
+    try:
+        profile = dillo.models.profiles.Profile.objects.get(user_id=user_id)
+    except dillo.models.profiles.Profile.DoesNotExist:
+        log.info("Profile for user %i not found, skipping avatar update" % user_id)
+        return
+    if profile.avatar and not replace:
+        return
+    log.debug("Update profile avatar for user %i" % user_id)
+    download_image_from_web(url, profile.avatar, save=False)
+    profile.save(update_fields=['avatar', 'avatar_height', 'avatar_width'])
+
+
+@background()
+def download_profile_avatar(user_id: int, url: str, replace: bool = True):
+    """Download an image from the web and use it as avatar of a user.
+
+    If replace is False, an avatar already assigned to the user is kept.
+    """
+    _download_profile_avatar(user_id, url, replace)
+
+
+@background(remove_existing_tasks=True)
+def download_profile_gravatar(user_id: int, url: str):
+    """Download the Gravatar of a user, unless an avatar is assigned meanwhile.
+
+    Pending downloads for the same user and url are replaced, so that
+    reloading the profile setup does not queue them more than once.
+    """
+    _download_profile_avatar(user_id, url, replace=False)
 
 
 @background()
@@ -58,7 +150,7 @@ def update_mailing_list_subscription(user_email: str, is_subscribed: typing.Opti
     api_url_base = f"https://api.mailgun.net/v3"
     api_url_newsletter = f"{api_url_base}/lists/{settings.MAILING_LIST_NEWSLETTER_EMAIL}"
     # Look for member in the mailing list.
-    r_update = requests.put(
+    r_update = http_client.put(
         f"{api_url_newsletter}/members/{user_email}",
         auth=('api', settings.ANYMAIL['MAILGUN_API_KEY']),
         data={
@@ -77,7 +169,7 @@ def update_mailing_list_subscription(user_email: str, is_subscribed: typing.Opti
         return
     # If a member was not found and we want it subscribed.
     elif r_update.status_code == 404 and is_subscribed:
-        r_create = requests.post(
+        r_create = http_client.post(
             f"{api_url_newsletter}/members",
             auth=('api', settings.ANYMAIL['MAILGUN_API_KEY']),
             data={
@@ -95,8 +187,37 @@ def update_mailing_list_subscription(user_email: str, is_subscribed: typing.Opti
         log.error("Newsletter API returned status code %i" % r_update.status_code)
 
 
+@background()
+def delete_mailing_list_member(user_email: str):
+    """Delete an email address from the newsletter."""
+
+    if not hasattr(settings, 'ANYMAIL'):
+        log.info("Mailgun not configured, skipping mailing list subscription update")
+        return
+
+    if not hasattr(settings, 'MAILING_LIST_NEWSLETTER_EMAIL'):
+        log.debug("Newsletter not configured, skipping mailing list subscription update")
+        return
+
+    api_url_base = "https://api.mailgun.net/v3"
+    api_url_newsletter = f"{api_url_base}/lists/{settings.MAILING_LIST_NEWSLETTER_EMAIL}"
+    r = http_client.delete(
+        f"{api_url_newsletter}/members/{user_email}",
+        auth=('api', settings.ANYMAIL['MAILGUN_API_KEY']),
+    )
+    if r.status_code not in {200, 404}:
+        log.error("Newsletter API returned status code %i" % r.status_code)
+        return
+    log.info("Deleted %s from mailing list" % user_email)
+
+
 if settings.BACKGROUND_TASKS_AS_FOREGROUND:
     # Will execute activity_fanout_to_feeds immediately
     log.debug('Executing background tasks synchronously')
+    update_profile_reel = update_profile_reel.task_function
     update_profile_reel_thumbnail = update_profile_reel_thumbnail.task_function
+    refresh_profile_reel_embeds = refresh_profile_reel_embeds.task_function
+    download_profile_avatar = download_profile_avatar.task_function
+    download_profile_gravatar = download_profile_gravatar.task_function
     update_mailing_list_subscription = update_mailing_list_subscription.task_function
+    delete_mailing_list_member = delete_mailing_list_member.task_function
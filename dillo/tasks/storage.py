@@ -3,11 +3,11 @@ import tempfile
 from urllib.parse import urlparse
 
 import boto3
-import requests
 from django.conf import settings
 from django.core.files.images import ImageFile
 
 import dillo.models
+from dillo import http_client
 
 log = logging.getLogger(__name__)
 
@@ -43,9 +43,13 @@ def get_storage_paths() -> (str, str):
         raise ValueError('Unsupported storage_backend: %s' % storage_backend)
 
 
-def download_image_from_web(url, attribute):
+def download_image_from_web(url, attribute, save=True):
+    """Download an image and assign it to attribute, an ImageField of a model instance.
+
+    If save is False, the instance is not saved once the image is assigned.
+    """
     # Build request (streaming)
-    r = requests.get(url, stream=True)
+    r = http_client.get(url, stream=True)
     # Get the path component from the url
     path_comp = urlparse(url)[2]
     hashed_path = dillo.models.mixins.get_upload_to_hashed_path(None, path_comp)
@@ -53,7 +57,7 @@ def download_image_from_web(url, attribute):
     # Download the file
     with tempfile.TemporaryFile() as fp:
         log.debug("Downloading file %s to %s" % (url, fp.name))
-        for chunk in r.iter_content(chunk_size=128):
+        for chunk in r.iter_content(chunk_size=http_client.STREAM_CHUNK_SIZE):
             fp.write(chunk)
         log.debug("Assigning file to model instance")
-        attribute.save(str(hashed_path), ImageFile(fp))
+        attribute.save(str(hashed_path), ImageFile(fp), save=save)
@@ -0,0 +1,65 @@
+import datetime
+import logging
+
+from background_task import background
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Extract, Now, Power
+from django.utils import timezone
+from taggit.models import Tag
+
+import dillo.models.posts
+import dillo.models.tags
+
+log = logging.getLogger(__name__)
+
+
+@background(remove_existing_tasks=True)
+def update_trending_tags():
+    """Compute the trending score of the tags used in recent public posts.
+
+    Every post created in the past TRENDING_TAGS_DAYS (default 15) adds to
+    the score of its tags a weight that halves every TRENDING_TAGS_HALF_LIFE
+    hours (default 72). Tags that are no longer used in recent posts are
+    reset to 0, then the cached trending tags are cleared.
+    """
+    TagStats = dillo.models.tags.TagStats
+    days = getattr(settings, 'TRENDING_TAGS_DAYS', 15)
+    half_life = getattr(settings, 'TRENDING_TAGS_HALF_LIFE', 72)
+
+    age_in_hours = (
+        Extract(
+            ExpressionWrapper(Now() - F('post__created_at'), output_field=DurationField()),
+            'epoch',
+        )
+        / 3600.0
+    )
+    scores = dict(
+        Tag.objects.filter(
+            post__created_at__gte=timezone.now() - datetime.timedelta(days=days),
+            post__visibility='public',
+        )
+        .annotate(score=Sum(Power(Value(0.5), age_in_hours / half_life), output_field=FloatField()))
+        .values_list('id', 'score')
+    )
+
+    with transaction.atomic():
+        TagStats.objects.filter(trending_score__gt=0).exclude(tag_id__in=scores).update(
+            trending_score=0
+        )
+        TagStats.objects.bulk_create(
+            [TagStats(tag_id=tag_id) for tag_id in scores], ignore_conflicts=True
+        )
+        stats = list(TagStats.objects.filter(tag_id__in=scores))
+        for s in stats:
+            s.trending_score = scores[s.tag_id]
+        TagStats.objects.bulk_update(stats, ['trending_score'], batch_size=1000)
+    cache.delete(dillo.models.posts.TRENDING_TAGS_CACHE_KEY)
+    log.info('Updated the trending score of %i tags' % len(scores))
+
+
+if settings.BACKGROUND_TASKS_AS_FOREGROUND:
+    log.debug('Executing background tasks synchronously')
+    update_trending_tags = update_trending_tags.task_function
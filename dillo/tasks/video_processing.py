@@ -1,82 +1,94 @@
-import pathlib
 import logging
 
 from background_task import background
 from django.conf import settings
-from django.urls import reverse
+from django.db import transaction
+from django.utils import timezone
 
-import dillo.coconut.job
-import dillo.models.static_assets
-from dillo.tasks.storage import get_storage_paths
+import dillo.encoding
 
 log = logging.getLogger(__name__)
 
+# Order in which the events of a job are processed, regardless of the order
+# they were received in.
+ENCODING_EVENTS_ORDER = {
+    'source.transferred': 0,
+    'job.progress': 1,
+    'output.processed': 2,
+    'job.completed': 3,
+}
+
 
 @background()
-def create_coconut_job(content_type_id: str, object_id: str, video_id: int):
-    """Create a video encoding job.
+def create_video_encoding_job(content_type_id: str, object_id: str, video_id: int):
+    """Create a video encoding job, with the configured encoding backend.
 
     Because of the @background decorator, we only accept hashable
     arguments.
-
-    The video versions produced are the following:
-    - a regular 720p, h264 with mp4 container
-    - an httpstream using fragmented mp4, compatible with DASH and HLS
-      with two variants (these are WIP and should be tweaked):
-      - mp4:480p_1500k
-      - mp4:720p
     """
-    if not settings.COCONUT_API_KEY:
-        log.info('Missing COCONUT_API_KEY: no video encoding will be performed')
-        return
-
-    storage_base_src, storage_base_dst = get_storage_paths()
-
-    # Outputs
-    outputs = {}
-
-    video = dillo.models.static_assets.Video.objects.get(id=video_id)
-    source_path = pathlib.PurePath(video.static_asset.source.name)
+    dillo.encoding.get_encoder().submit(content_type_id, object_id, video_id)
 
-    # The jpg:1280x thumbnail
-    outputs['jpg:1280x'] = f"{storage_base_dst}{source_path.with_suffix('.thumbnail.jpg')}"
 
-    # The gif:240x preview
-    outputs['gif:240x'] = f"{storage_base_dst}{source_path.with_suffix('.preview.gif')}"
-
-    # The mp4:720p version of the path (relative to MEDIA_ROOT)
-    outputs['mp4:0x720_3000k'] = f"{storage_base_dst}{source_path.with_suffix('.720p.mp4')}"
-
-    # The httpstream packaging configuration
-    httpstream_packaging = 'dash+hlsfmp4=/stream'
+@background()
+def create_coconut_job(content_type_id: str, object_id: str, video_id: int):
+    """Create a video encoding job with Coconut.
 
-    # The httpstream variants
-    httpstream_variants = 'variants=mp4:480p_1500k,mp4:720p'
+    Kept for tasks queued before create_video_encoding_job was introduced.
+    """
+    from dillo.encoding.coconut import CoconutEncoder
 
-    # TODO(fsiddi) enable support for httpstream
-    # outputs['httpstream'] = f'{job_storage_base_out}{source_path.parent}, ' \
-    #     f'{httpstream_packaging}, {httpstream_variants}'
+    CoconutEncoder().submit(content_type_id, object_id, video_id)
 
-    # Webhook for encoding updates
-    job_webhook = reverse(
-        'coconut-webhook',
-        kwargs={'content_type_id': content_type_id, 'object_id': object_id, 'video_id': video_id},
-    )
 
-    j = dillo.coconut.job.create(
-        api_key=settings.COCONUT_API_KEY,
-        source=f'{storage_base_src}{source_path}',
-        webhook=f'{settings.COCONUT_DECLARED_HOSTNAME}{job_webhook}, events=true, metadata=true',
-        outputs=outputs,
-    )
+@background(schedule=1, remove_existing_tasks=True)
+def process_video_encoding_events(video_id: int):
+    """Process the pending encoding events of a video.
 
-    if j['status'] == 'processing':
-        log.info('Started processing job %i' % j['id'])
-    else:
-        log.error('Error processing job %i' % (j['id']))
+    Events are stored by the coconut_webhook. Since pending tasks for the
+    same video are replaced, a burst of events is handled by a single task.
+    Events of any job other than the one recorded on the video, the latest
+    submitted, are skipped.
+    """
+    from dillo.coconut import events
+    from dillo.models.static_assets import Video, VideoEncodingEvent
+
+    with transaction.atomic():
+        # Lock the video, so that its events are never processed concurrently
+        video = (
+            Video.objects.select_for_update()
+            .select_related('static_asset')
+            .filter(id=video_id)
+            .first()
+        )
+        if not video:
+            return
+        started_at = timezone.now()
+        pending = list(
+            VideoEncodingEvent.objects.filter(
+                video=video, processed_at__isnull=True
+            ).select_related('entity_content_type')
+        )
+        pending.sort(key=lambda e: (e.job_id, ENCODING_EVENTS_ORDER.get(e.event, 2), e.id))
+        entities = {}
+        for encoding_event in pending:
+            # Job ids are not ordered across encoders, only the current job counts
+            if video.encoding_job_id and encoding_event.job_id != video.encoding_job_id:
+                log.debug('Skipping %s, not from the current job' % encoding_event)
+                continue
+            entity_key = (encoding_event.entity_content_type_id, encoding_event.entity_object_id)
+            if entity_key not in entities:
+                entities[entity_key] = encoding_event.entity
+            events.process_event(encoding_event.payload, video, entities[entity_key])
+
+        # Progress events updated in the meantime are processed by the next task
+        VideoEncodingEvent.objects.filter(
+            id__in=[e.id for e in pending], updated_at__lte=started_at
+        ).update(processed_at=timezone.now())
 
 
 if settings.BACKGROUND_TASKS_AS_FOREGROUND:
     # Will execute activity_fanout_to_feeds immediately
     log.debug('Executing background tasks synchronously')
+    create_video_encoding_job = create_video_encoding_job.task_function
     create_coconut_job = create_coconut_job.task_function
+    process_video_encoding_events = process_video_encoding_events.task_function
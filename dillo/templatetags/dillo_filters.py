@@ -13,6 +13,7 @@ from bleach import linkifier
 from bleach.linkifier import build_url_re
 from bs4 import BeautifulSoup
 
+from dillo import http_client
 from dillo.shortcodes import render as shortcode_render
 from dillo.markdown import render as markdown_render
 from dillo.markdown import sanitize
@@ -224,7 +225,7 @@ def parse_phabricator_tasks(markup):
             data = {'api.token': settings.PHABRICATOR_API_TOKEN, 'task_id': ob_id}
 
             try:
-                response = requests.post(query_url, data=data)
+                response = http_client.post(query_url, data=data)
                 r = response.json()
                 r = r['result']
 
@@ -247,7 +248,7 @@ def parse_phabricator_tasks(markup):
             data = {'api.token': settings.PHABRICATOR_API_TOKEN, 'ids[0]': ob_id}
 
             try:
-                response = requests.post(query_url, data=data)
+                response = http_client.post(query_url, data=data)
                 r = response.json()
                 r = r['result']
 
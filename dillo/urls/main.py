@@ -21,6 +21,7 @@ import dillo.views.users.homepage
 import dillo.views.users.notifications
 import dillo.views.users.profile
 import dillo.views.reels
+import dillo.views.tags
 import dillo.views.jobs
 import dillo.views.actstream
 import dillo.views.explore
@@ -145,6 +146,11 @@ urlpatterns += [
         name='post_toggle_pinned',
     ),
     path('p/<slug:hash_id>/status', dillo.views.posts.publish.post_status, name='post_status'),
+    path(
+        'api/processing-status',
+        dillo.views.posts.publish.api_processing_statuses,
+        name='api-processing-status',
+    ),
     path(
         'p/<slug:hash_id>/upload',
         dillo.views.posts.publish.post_file_upload,
@@ -304,6 +310,11 @@ urlpatterns += [
         dillo.views.posts.queries.PostsSearchEmbedView.as_view(),
         name='embed_posts_search',
     ),
+    path(
+        'api/tags/autocomplete',
+        dillo.views.tags.api_tags_autocomplete,
+        name='api-tags-autocomplete',
+    ),
 ]
 
 # Reels
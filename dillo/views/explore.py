@@ -1,6 +1,9 @@
-from actstream.models import Action
+from django.db.models import Q
+from django.http import Http404
 from django.urls import reverse
 from django.views.generic import ListView
+
+from dillo.models.feeds import ExploreFeedItem
 from dillo.views.mixins import PostListView
 
 
@@ -11,29 +14,56 @@ class ExploreFeedView(PostListView):
 
 
 class ExploreFeedEmbedView(ListView):
-    """List of all relevant activities."""
+    """List of all relevant activities.
 
-    model = Action
+    Pages are requested with the cursor of the last item of the previous
+    page, formatted as '<score>_<action id>', instead of a page number.
+    """
 
-    def get_queryset(self):
-        return Action.objects.filter(
-            extra__is_on_explore_feed=True, extra__parent_action__isnull=True
-        )
+    model = ExploreFeedItem
 
-    def get_template_names(self):
+    def get_layout(self):
         current_layout = self.request.session.get('layout', 'list')
         next_layout = self.request.GET.get('layout', current_layout)  # 'list' or 'grid'
         if current_layout != next_layout:
             self.request.session['layout'] = next_layout
-        if next_layout == 'list':
-            return ['dillo/feeds/explore_list_embed.pug']
-        elif next_layout == 'grid':
+        return next_layout
+
+    def get_queryset(self):
+        items = (
+            ExploreFeedItem.objects.select_related(
+                'action', 'action__actor_content_type', 'action__action_object_content_type'
+            )
+            .prefetch_related('action__actor', 'action__actor__profile', 'action__action_object')
+            .order_by('-score', '-action_id')
+        )
+        cursor = self.request.GET.get('cursor')
+        if not cursor:
+            return items
+        try:
+            score, action_id = cursor.split('_')
+            score, action_id = float(score), int(action_id)
+        except ValueError:
+            raise Http404("Invalid cursor")
+        return items.filter(Q(score__lt=score) | Q(score=score, action_id__lt=action_id))
+
+    def get_template_names(self):
+        if self.get_layout() == 'grid':
             return ['dillo/feeds/explore_grid_embed.pug']
+        return ['dillo/feeds/explore_list_embed.pug']
 
-    def get_paginate_by(self, queryset):
-        current_layout = self.request.session.get('layout', 'list')
-        next_layout = self.request.GET.get('layout', current_layout)
-        if next_layout == 'list':
-            return 5
-        elif next_layout == 'grid':
+    def get_page_size(self):
+        if self.get_layout() == 'grid':
             return 15
+        return 5
+
+    def get_context_data(self, **kwargs):
+        page_size = self.get_page_size()
+        # Fetch one more item, to know if there is a next page
+        items = list(self.object_list[: page_size + 1])
+        context = super().get_context_data(object_list=items[:page_size], **kwargs)
+        context['next_cursor'] = None
+        if len(items) > page_size:
+            last_item = items[page_size - 1]
+            context['next_cursor'] = f'{last_item.score!r}_{last_item.action_id}'
+        return context
@@ -1,5 +1,3 @@
-import requests.exceptions
-import webpreview.excepts
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Count
@@ -11,11 +9,9 @@ from django.utils.html import strip_tags
 from django.views import View
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import TemplateView, ListView
-from micawber.contrib.mcdjango import providers
-from micawber.exceptions import ProviderNotFoundException
 from sorl.thumbnail import get_thumbnail
-from webpreview import web_preview
 
+from dillo import link_preview
 from dillo.models.posts import get_trending_tags, Post
 from dillo.models.events import Event
 from dillo.shortcodes import render as shortcode_render
@@ -191,31 +187,7 @@ class ApiLinkPreview(View):
     @method_decorator(ensure_csrf_cookie)
     @method_decorator(login_required)
     def post(self, request, *args, **kwargs):
-        content = request.POST['content']
-        try:
-            oembed_preview = providers.request(content)
-        except ProviderNotFoundException:
-            oembed_preview = {}
-
-        # Always generate web_preview as fallback for oembed_preview
-        try:
-            title, description, image = web_preview(content, parser='html.parser')
-        except requests.exceptions.InvalidURL:
-            return JsonResponse({'preview': None, 'title': None})
-        except webpreview.excepts.EmptyURL:
-            return JsonResponse({'preview': None, 'title': None})
-
-        if 'html' in oembed_preview:
-            preview_html = oembed_preview['html']
-        elif image:
-            preview_html = f'<img src="{image}" alt="Website Preview" />'
-        else:
-            preview_html = '<div class="unavailable">Preview not available for this URL</div>'
-
-        if 'title' in oembed_preview:
-            title = oembed_preview['title']
-
-        return JsonResponse({'preview': preview_html, 'title': title})
+        return JsonResponse(link_preview.get_preview(request.POST['content']))
 
 
 class OgData:
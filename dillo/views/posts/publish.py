@@ -1,7 +1,8 @@
+import hashlib
 import json
 import logging
 import pathlib
-import subprocess
+import time
 
 import magic
 import boto3
@@ -12,18 +13,21 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import SuspiciousOperation
-from django.http import JsonResponse
+from django.db.models import Prefetch, Q
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.views.generic import FormView
 
 from dillo import forms
+from dillo.coconut.events import ProcessingStatusListener
 from dillo.models.posts import Post
-from dillo.models.static_assets import StaticAsset, Video, Image
+from dillo.models.static_assets import StaticAsset, Video, Image, VideoEncodingEvent
 from dillo.models.mixins import get_upload_to_hashed_path
 from dillo.tasks.files import move_blob_from_upload_to_storage
-from dillo.coconut import events
+from dillo.tasks.video_processing import process_video_encoding_events
+from dillo.encoding import get_video_data_with_ffprobe
 from dillo.templatetags.dillo_filters import compact_number
 
 log = logging.getLogger(__name__)
@@ -86,21 +90,6 @@ class PostCreateView(LoginRequiredMixin, FormView):
             return self.form_invalid(form)
 
 
-def get_video_data_with_ffprobe(filepath) -> dict:
-    """Return video duration and resolution given an input file path."""
-    ffprobe_inspect = [
-        'ffprobe',
-        '-loglevel',
-        'error',
-        '-show_streams',
-        filepath,
-        '-print_format',
-        'json',
-    ]
-
-    return json.loads(subprocess.check_output(ffprobe_inspect))
-
-
 def process_video_data(filepath):
     ffprobe_output = get_video_data_with_ffprobe(filepath)
     video_stream = None
@@ -295,30 +284,30 @@ def coconut_webhook(request, content_type_id, object_id, video_id):
     if request.content_type != 'application/json':
         raise SuspiciousOperation('Coconut webhook endpoint was sent non-JSON data')
     job = json.loads(request.body)
-    content_type = ContentType.objects.get_for_id(content_type_id)
-    entity = get_object_or_404(content_type.model_class(), pk=object_id)
-    video = get_object_or_404(Video, id=video_id)
-    if video.encoding_job_id != job['id']:
-        # If the job id changed, we likely restarted the job (manually)
-        video.encoding_job_status = None
-        video.encoding_job_id = job['id']
-        video.save()
-
-    log.info('Updating video %i processing status: %s' % (video_id, job['event']))
-    # On source.transferred
-    if job['event'] == 'source.transferred':
-        events.source_transferred(job, video)
-    # On output.processed (thumbnail)
-    elif job['event'] == 'output.processed' and job['format'].startswith('jpg'):
-        events.output_processed_images(job, video)
-    # On output.processed (video variation)
-    elif job['event'] == 'output.processed' and (
-        job['format'].startswith('mp4') or job['format'].startswith('gif')
-    ):
-        events.output_processed_video(job, video)
-    # On job.completed (unused for now)
-    elif job['event'] == 'job.completed':
-        events.job_completed(job, video, entity)
+    content_type = get_object_or_404(ContentType, id=content_type_id)
+    if content_type.model_class() is None:
+        raise Http404('Entity not found')
+    get_object_or_404(content_type.model_class(), pk=object_id)
+    get_object_or_404(Video, id=video_id)
+    # Store the event and process it in the background. Events are
+    # deduplicated, so retried deliveries are acknowledged and ignored.
+    key = {'job_id': job['id'], 'event': job['event'], 'format': job.get('format', '')}
+    fields = {
+        'video_id': video_id,
+        'entity_content_type_id': content_type_id,
+        'entity_object_id': object_id,
+        'payload': job,
+    }
+    if job['event'] == 'job.progress':
+        # Progress is coalesced, only the latest one is kept for each job
+        VideoEncodingEvent.objects.update_or_create(
+            **key, defaults={**fields, 'processed_at': None}
+        )
+    else:
+        VideoEncodingEvent.objects.bulk_create(
+            [VideoEncodingEvent(**key, **fields)], ignore_conflicts=True
+        )
+    process_video_encoding_events(video_id)
     return JsonResponse({'status': 'ok'})
 
 
@@ -354,6 +343,64 @@ def post_status(request, hash_id):
     return JsonResponse({'status': post.status})
 
 
+def get_processing_statuses(user, hash_ids) -> dict:
+    """Status and encoding progress of the processing posts of a user.
+
+    Posts in hash_ids are included even if they are no longer processing,
+    so that their final status can be reported.
+    """
+    posts = (
+        Post.objects.filter(user=user)
+        .filter(Q(status='processing') | Q(hash_id__in=hash_ids))
+        .prefetch_related(
+            Prefetch(
+                'media',
+                queryset=StaticAsset.objects.filter(source_type='video').select_related('video'),
+            )
+        )
+    )
+    return {
+        str(post.hash_id): {
+            'status': post.status,
+            'progress': [
+                static_asset.video.encoding_job_progress for static_asset in post.media.all()
+            ],
+        }
+        for post in posts
+    }
+
+
+def get_processing_statuses_version(statuses: dict) -> str:
+    return hashlib.md5(json.dumps(statuses, sort_keys=True).encode()).hexdigest()
+
+
+@login_required
+def api_processing_statuses(request):
+    """Long-poll the status and encoding progress of the processing posts of the user.
+
+    Replaces polling post_status for each post while videos are encoded.
+    Posts listed in the 'post' parameters are included even when no longer
+    processing, so that the page can tell they were published.
+
+    If the 'version' parameter matches the current statuses, the response
+    is delayed until the video event handlers notify a change (see
+    dillo.coconut.events.notify_processing_status), for at most
+    PROCESSING_STATUS_TIMEOUT seconds (default 20).
+    """
+    hash_ids = request.GET.getlist('post')
+    version = request.GET.get('version')
+    timeout = getattr(settings, 'PROCESSING_STATUS_TIMEOUT', 20)
+    deadline = time.monotonic() + timeout
+    # Listen before querying, so that no change is missed in between
+    with ProcessingStatusListener(request.user.id) as listener:
+        statuses = get_processing_statuses(request.user, hash_ids)
+        while statuses and get_processing_statuses_version(statuses) == version:
+            if not listener.wait(deadline - time.monotonic()):
+                break
+            statuses = get_processing_statuses(request.user, hash_ids)
+    return JsonResponse({'posts': statuses, 'version': get_processing_statuses_version(statuses)})
+
+
 @require_POST
 @csrf_exempt
 @login_required
@@ -1,9 +1,10 @@
-from actstream.models import followers
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from taggit.models import Tag
 
 from dillo.models.posts import Post
+from dillo.query import search_posts
+from dillo.models.tags import get_tag_followers_count
 from dillo.views.mixins import PostListView, PostListEmbedView
 
 
@@ -14,7 +15,7 @@ class PostByTagsListView(PostListView):
         context['tag_name'] = tag_name
         # TODO(fsiddi) Refactor tag_name as tag.name
         context['tag'] = get_object_or_404(Tag, name=tag_name)
-        context['tag_followers_count'] = len(followers(context['tag']))
+        context['tag_followers_count'] = get_tag_followers_count(context['tag'])
         context['query_url'] = reverse('embed_posts_list_tag', kwargs={'tag_name': tag_name})
         return context
 
@@ -31,12 +32,8 @@ class PostsSearchEmbedView(PostListEmbedView):
     """Searched posts."""
 
     def get_queryset(self):
-        """Fetch only published and public posts."""
-        search_term = self.request.GET.get('q')
-        queryset = Post.objects.filter(
-            title__search=search_term, visibility='public', status='published',
-        ).order_by('-published_at')
-        return queryset
+        """Fetch only published and public posts, most relevant first."""
+        return search_posts(self.request.GET.get('q', ''))
 
 
 class PostsByTagListEmbedView(PostListEmbedView):
@@ -0,0 +1,30 @@
+from django.http import HttpResponseBadRequest, JsonResponse
+
+from dillo.models.tags import USAGE_COUNT_FIELDS, get_most_used_tags
+
+# Maximum number of tags returned by the autocomplete
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+def api_tags_autocomplete(request):
+    """Most used tags starting with the 'q' parameter, with their usage count.
+
+    The 'type' parameter selects which usage counts, 'post' (default) or
+    'profile', and 'limit' the number of tags (default 10).
+    """
+    model_name = request.GET.get('type', 'post')
+    if model_name not in USAGE_COUNT_FIELDS:
+        return HttpResponseBadRequest('Unknown type')
+    try:
+        limit = min(int(request.GET.get('limit', 10)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid limit')
+    prefix = request.GET.get('q', '').strip().lstrip('#')
+    stats = get_most_used_tags(model_name, prefix=prefix, limit=limit)
+    return JsonResponse(
+        {
+            'tags': [
+                {'value': s.tag.name, 'label': s.tag.name, 'count': s.usage_count} for s in stats
+            ]
+        }
+    )
@@ -1,11 +1,41 @@
+"""Find the author of a video, from a link to it.
+
+The extraction is done with youtube_dl, which is slow and imported only
+when needed. Extractions run in a thread pool of USER_FROM_OEMBED_LINK_WORKERS
+threads (default 2), and requests wait for them at most
+USER_FROM_OEMBED_LINK_TIMEOUT seconds (default 10). Results are cached by
+normalized URL, and requests for a URL being extracted wait for the same
+extraction. When too many extractions are pending, requests are turned
+down instead of queued.
+"""
+import concurrent.futures
+import hashlib
 import logging
-from django.http import Http404, JsonResponse
-import youtube_dl
+import threading
+import typing
 from typing import TypedDict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+
+from dillo.link_preview import normalize_url
 
 log = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT = 10
+DEFAULT_CACHE_TTL = 60 * 60 * 24 * 7
+DEFAULT_NEGATIVE_CACHE_TTL = 60 * 60
+# Pending extractions allowed for each worker, before turning down requests
+MAX_PENDING_PER_WORKER = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+# Extractions in progress, by normalized URL
+_in_flight: typing.Dict[str, concurrent.futures.Future] = {}
+_in_flight_lock = threading.Lock()
+
 
 class Profile(TypedDict):
     username: str
@@ -16,11 +46,35 @@ class Profile(TypedDict):
     extractor_key: str
 
 
-def user_from_oembed_link(request):
-    try:
-        url = request.GET['postContentUrl']
-    except KeyError:
-        raise Http404("No url specified")
+class ExtractionBusy(Exception):
+    """Too many extractions are pending."""
+
+
+def get_workers() -> int:
+    return getattr(settings, 'USER_FROM_OEMBED_LINK_WORKERS', DEFAULT_WORKERS)
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Return the thread pool running youtube_dl, creating it if needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=get_workers(), thread_name_prefix='youtube-dl'
+            )
+    return _executor
+
+
+def profile_cache_key(url: str) -> str:
+    return f'dillo:user-from-oembed-link:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def extract_profile(url: str) -> typing.Optional[Profile]:
+    """Extract the uploader of a video with youtube_dl.
+
+    Return None if the url is not supported or has no uploader.
+    """
+    import youtube_dl
 
     ydl_opts = {
         'quiet': True,
@@ -30,14 +84,73 @@ def user_from_oembed_link(request):
     }
 
     with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        profile = Profile(
-            username=info['uploader_id'],
-            url_profile=info['uploader_url'],
-            fullname=info['uploader'],
-            extractor=info['extractor'],
-            extractor_key=info['extractor_key'],
-            url_content=info['webpage_url'],
+        try:
+            info = ydl.extract_info(url, download=False)
+            return Profile(
+                username=info['uploader_id'],
+                url_profile=info['uploader_url'],
+                fullname=info['uploader'],
+                extractor=info['extractor'],
+                extractor_key=info['extractor_key'],
+                url_content=info['webpage_url'],
+            )
+        except (youtube_dl.utils.DownloadError, KeyError) as e:
+            log.debug('No user found for %s: %s' % (url, e))
+            return None
+
+
+def on_extraction_done(url: str, future: concurrent.futures.Future):
+    """Cache the result of an extraction, and stop tracking it."""
+    if future.exception() is not None:
+        log.error('Failed extracting user from %s: %s' % (url, future.exception()))
+    elif future.result() is None:
+        # Cache missing profiles as well, as an empty dict
+        ttl = getattr(
+            settings, 'USER_FROM_OEMBED_LINK_NEGATIVE_CACHE_TTL', DEFAULT_NEGATIVE_CACHE_TTL
         )
+        cache.set(profile_cache_key(url), {}, ttl)
+    else:
+        ttl = getattr(settings, 'USER_FROM_OEMBED_LINK_CACHE_TTL', DEFAULT_CACHE_TTL)
+        cache.set(profile_cache_key(url), future.result(), ttl)
+    # Stop tracking only once cached, so that no request starts another extraction
+    with _in_flight_lock:
+        _in_flight.pop(url, None)
+
+
+def get_extraction(url: str) -> concurrent.futures.Future:
+    """Return the extraction of the profile for url, starting it if needed.
+
+    Raise ExtractionBusy if too many extractions are pending.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(url)
+        if future is not None:
+            return future
+        if len(_in_flight) >= get_workers() * MAX_PENDING_PER_WORKER:
+            raise ExtractionBusy()
+        future = get_executor().submit(extract_profile, url)
+        _in_flight[url] = future
+    future.add_done_callback(lambda f: on_extraction_done(url, f))
+    return future
+
+
+def user_from_oembed_link(request):
+    try:
+        url = normalize_url(request.GET['postContentUrl'])
+    except KeyError:
+        raise Http404("No url specified")
+
+    profile = cache.get(profile_cache_key(url))
+    if profile is None:
+        timeout = getattr(settings, 'USER_FROM_OEMBED_LINK_TIMEOUT', DEFAULT_TIMEOUT)
+        try:
+            profile = get_extraction(url).result(timeout=timeout)
+        except ExtractionBusy:
+            return JsonResponse({'error': 'Too many requests, try again later'}, status=503)
+        except concurrent.futures.TimeoutError:
+            # The extraction goes on, and its result will be cached
+            return JsonResponse({'error': 'Timed out, try again later'}, status=504)
+    if not profile:
+        raise Http404("No user found")
 
     return JsonResponse({**profile})
@@ -3,22 +3,28 @@ from dataclasses import dataclass
 from typing import Optional, List
 
 from django.core.paginator import Paginator
-from django.db.models import Count
+from django.db.models import Count, Q, QuerySet
 from django.http import JsonResponse
 from django.views.generic import TemplateView
+from taggit.models import Tag
 
-from dillo.models.profiles import Profile, Badge
+from dillo.models.directory import DirectoryEntry, get_directory_facet_counts
+from dillo.models.profiles import Badge
 from dillo.models.cities import City
 from dillo.views.globe import get_globe_locations
 
 log = logging.getLogger(__name__)
 
+# Tags listed in the directory filter before searching
+FACET_TAGS_COUNT = 20
+
 
 @dataclass
 class SelectItem:
     value: int
     label: str
     is_selected: bool = False
+    count: int = 0
 
 
 @dataclass
@@ -90,19 +96,47 @@ class FilterMixin(TemplateView):
 
         return super().dispatch(request, *args, **kwargs)
 
-    def _facet_badges(self):
+    def get_directory_entries(self) -> QuerySet:
+        """Directory entries matching the badges and tags of the URL."""
+        entries = DirectoryEntry.objects.filter(
+            is_looking_for_work=self.url_params.is_looking_for_work
+        )
+        if self.url_params.tags:
+            tag_ids = Tag.objects.filter(name__in=self.url_params.tags).values_list('id', flat=True)
+            entries = entries.filter(tag_ids__overlap=list(tag_ids))
+        if self.url_params.badges:
+            entries = entries.filter(badge_ids__overlap=self.url_params.badges)
+        return entries
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['url_params'] = self.url_params
+        context['sort'] = self.url_params.sort
+        return context
+
+
+class UserListView(FilterMixin):
+    template_name = 'dillo/directory/user_directory.pug'
+
+    def _facet_badges(self, badge_counts):
         badges = []
         for badge in Badge.objects.all():
-            s = SelectItem(value=badge.id, label=badge.name)
+            s = SelectItem(value=badge.id, label=badge.name, count=badge_counts.get(badge.id, 0))
             if badge.id in self.url_params.badges:
                 s.is_selected = True
             badges.append(s)
         return badges
 
-    def _facet_tags(self):
+    def _facet_tags(self, tag_counts):
+        """The most used tags of profiles, and the selected ones.
+
+        Other tags are suggested as the user types, by api-tags-autocomplete.
+        """
+        most_used_tag_ids = sorted(tag_counts, key=tag_counts.get, reverse=True)[:FACET_TAGS_COUNT]
+        tags = Tag.objects.filter(Q(id__in=most_used_tag_ids) | Q(name__in=self.url_params.tags))
         tags_list = []
-        for tag in Profile.tags.all():
-            s = SelectItem(value=tag.name, label=tag.name)
+        for tag in sorted(tags, key=lambda t: (-tag_counts.get(t.id, 0), t.name)):
+            s = SelectItem(value=tag.name, label=tag.name, count=tag_counts.get(tag.id, 0))
             if tag.name in self.url_params.tags:
                 s.is_selected = True
             tags_list.append(s)
@@ -112,46 +146,31 @@ class FilterMixin(TemplateView):
         return City.objects.filter(id__in=self.url_params.cities)
 
     def search_facets(self):
+        facet_counts = get_directory_facet_counts(self.url_params.is_looking_for_work)
         return SearchFacets(
-            badges=self._facet_badges(),
-            tags=self._facet_tags(),
+            badges=self._facet_badges(facet_counts['badges']),
+            tags=self._facet_tags(facet_counts['tags']),
             cities=self._facet_cities(),
         )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['url_params'] = self.url_params
         context['search_facets'] = self.search_facets()
-        context['sort'] = self.url_params.sort
         return context
 
 
-class UserListView(FilterMixin):
-    template_name = 'dillo/directory/user_directory.pug'
-
-
 class ApiUserListView(FilterMixin):
     template_name = 'dillo/directory/user_list_embed.pug'
 
     def get_queryset(self):
-        qs = (
-            Profile.objects.filter(
-                user__is_active=True,
-                is_looking_for_work=self.url_params.is_looking_for_work,
-                # trust_level__gt=0,
-            )
-            .prefetch_related('badges')
-            .prefetch_related('user__post_set')
-            .annotate(posts_count=Count('user__post'))
-            .order_by(self.url_params.sort)
-        )
-        if self.url_params.tags:
-            qs = qs.filter(tags__name__in=self.url_params.tags).distinct()
-        if self.url_params.badges:
-            qs = qs.filter(badges__in=self.url_params.badges).distinct()
+        entries = self.get_directory_entries()
         if self.url_params.cities:
-            qs = qs.filter(city_ref_id__in=self.url_params.cities).distinct()
-        return qs
+            entries = entries.filter(city_ref_id__in=self.url_params.cities)
+        return (
+            entries.select_related('profile__user')
+            .prefetch_related('profile__badges')
+            .order_by(self.url_params.sort, 'profile_id')
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -163,22 +182,12 @@ class ApiUserListView(FilterMixin):
 class ApiUserGlobeView(FilterMixin):
     def get(self, request, *args, **kwargs):
         qs = (
-            Profile.objects.filter(
-                user__is_active=True,
-                is_looking_for_work=self.url_params.is_looking_for_work,
-                # trust_level__gt=0,
-            )
+            self.get_directory_entries()
             .filter(city_ref__isnull=False)
-            .order_by('-likes_count')
-            .prefetch_related('city_ref')
             .values('city_ref_id', 'city_ref__lat', 'city_ref__lng', 'city_ref__name')
-            .annotate(count=Count('city_ref_id'))
+            .annotate(count=Count('profile_id'))
+            .order_by()
         )
-        if self.url_params.tags:
-            qs = qs.filter(tags__name__in=self.url_params.tags).distinct()
-        if self.url_params.badges:
-            qs = qs.filter(badges__in=self.url_params.badges).distinct()
-
         locations = get_globe_locations(qs)
 
         return JsonResponse({'locations': locations})
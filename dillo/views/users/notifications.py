@@ -1,6 +1,7 @@
 import logging
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.views import View
@@ -41,6 +42,9 @@ class ApiFeedNotificationsView(View):
             if not page_obj.has_next()
             else f"{reverse('api-notifications')}?page={page_obj.next_page_number()}"
         )
+        # Usernames of the latest actors of aggregated notifications
+        actor_ids = {i for n in page_obj.object_list for i in n.latest_actor_ids}
+        usernames = dict(User.objects.filter(pk__in=actor_ids).values_list('id', 'username'))
         for notification in page_obj.object_list:
             n = {
                 'actor': {
@@ -54,6 +58,15 @@ class ApiFeedNotificationsView(View):
                 'actionObjectUrl': notification.action.action_object.get_absolute_url(),
                 'actionObject': str(notification.action.action_object),
                 'timeSince': compact_naturaltime(notification.action.timestamp),
+                'actorsCount': notification.actors_count,
+                'latestActors': [
+                    {
+                        'username': usernames[i],
+                        'profileUrl': reverse('profile-detail', kwargs={'username': usernames[i]}),
+                    }
+                    for i in notification.latest_actor_ids
+                    if i in usernames
+                ],
             }
             r.results.append(n)
         return JsonResponse(r.serialize())
@@ -1,6 +1,5 @@
 import hashlib
 import logging
-import random
 from urllib.parse import urlencode
 
 from actstream.models import Follow
@@ -11,15 +10,15 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.messages.views import SuccessMessageMixin
 from django.db import transaction
-from django.db.models import F
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.views.generic import DetailView, UpdateView, FormView, View
 from taggit.models import Tag
 
+import dillo.counters
 import dillo.models.mixins
 import dillo.tasks
-import dillo.tasks.storage
+import dillo.tasks.profile
 from dillo import forms
 from dillo.models.posts import get_trending_tags, Post
 from dillo.models.profiles import Profile
@@ -69,20 +68,10 @@ class ProfileDetailView(DetailView):
             image_alt=image_alt,
         )
 
-    def dispatch(self, request, *args, **kwargs):
-        # Update view count, only every 10th page view in average
-        hit_factor = settings.ITEM_HITS_FACTOR
-        hit_threshold = 0.1 / hit_factor  # For example 0.01
-        # Only if the random number between 0 and 1 is smaller than 0.01
-        if (random.random() / hit_factor) < hit_threshold:
-            # Add some variety to the count increase by adding or subtracting some
-            # random numbers (in average it does not count)
-            views_count_increase = hit_factor + random.choice([-3, -1, 1, 3])
-            # Increase view count
-            Profile.objects.filter(user=self.get_object()).update(
-                views_count=F('views_count') + views_count_increase
-            )
-        return super().dispatch(request, *args, **kwargs)
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        dillo.counters.profile_views.increment(self.object.id)
+        return response
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -209,7 +198,7 @@ class ProfileSetupTemplateViewMixin(LoginRequiredMixin, View):
         if not self.next_setup_stage_name:
             profile.is_setup_complete = True
         profile.setup_stage = self.next_setup_stage_name
-        profile.save()
+        profile.save(update_fields=['is_setup_complete', 'setup_stage'])
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -233,7 +222,7 @@ class ProfileSetupAvatar(ProfileSetupUpdateViewMixin):
     message = 'Choose an avatar that represents you!\nClick on the image to change it.'
     fields = ['avatar']
 
-    def download_and_assign_gravatar(self, user: User):
+    def get_gravatar_url(self, user: User):
         email = user.email
         # TODO(fsiddi) If a plus is found in the email, try to remove it and query Gravatar
         default = "identicon"
@@ -244,17 +233,17 @@ class ProfileSetupAvatar(ProfileSetupUpdateViewMixin):
             + ".jpg?"
         )
         gravatar_url += urlencode({'d': default, 's': str(size)})
+        return gravatar_url
 
-        log.debug("Update profile avatar for user %i" % user.id)
-        dillo.tasks.storage.download_image_from_web(gravatar_url, user.profile.avatar)
-
-    def dispatch(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
         # If user does not have an avatar, try to fetch it from Gravatar
         user = request.user
         if not user.profile.avatar:
-            self.download_and_assign_gravatar(user)
+            log.debug("Queue Gravatar download for user %i" % user.id)
+            # Keep the avatar if the user uploads one before the download is done
+            dillo.tasks.profile.download_profile_gravatar(user.id, self.get_gravatar_url(user))
 
-        return super().dispatch(request, *args, **kwargs)
+        return super().get(request, *args, **kwargs)
 
     def get_initial(self):
         """Force update avatar."""
@@ -268,7 +257,10 @@ class ProfileSetupAvatar(ProfileSetupUpdateViewMixin):
 
         form = super().get_form(form_class)
         form.fields['avatar'].label = ''
-        form.fields['avatar'].widget = forms.ImageWidget()
+        # Display the Gravatar until it is downloaded, or another avatar is uploaded
+        form.fields['avatar'].widget = forms.ImageWidget(
+            placeholder_url=self.get_gravatar_url(self.request.user)
+        )
         return form
 
 
@@ -381,7 +373,7 @@ class ProfileSetup(LoginRequiredMixin, View):
             log.warning('Resetting setup_stage to avatar')
             setup_view_name = 'avatar'
             user_profile.setup_stage = setup_view_name
-            user_profile.save()
+            user_profile.save(update_fields=['setup_stage'])
 
         view = profile_setup_map[user_profile.setup_stage].as_view()
         return view(request, *args, **kwargs)
@@ -67,6 +67,7 @@ STATIC_ROOT = BASE_DIR / 'public/static'
 MEDIA_ROOT = BASE_DIR / 'public/media'
 
 BACKGROUND_TASKS_AS_FOREGROUND = True
+COUNTERS_FLUSH_INTERVAL = 0
 HASHID_FIELD_SALT = 'salt'
 
 TEMPLATES = [
@@ -0,0 +1,41 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from benchmarks.run import compare, run_benchmarks
+from dillo.models.feeds import FeedEntry
+
+
+class BenchmarksTest(TestCase):
+    def setUp(self):
+        call_command(
+            'generate_community',
+            users=30,
+            tags=5,
+            seed=1,
+            force=True,
+            stdout=io.StringIO(),
+        )
+
+    def test_run_benchmarks(self):
+        entries_count = FeedEntry.objects.count()
+        cases = ['comments_list', 'user_list', 'notifications', 'activity_fanout_to_feeds']
+        results = run_benchmarks(iterations=2, warmup=0, only=cases)
+        self.assertEqual(cases, list(results['cases']))
+        for metrics in results['cases'].values():
+            self.assertGreater(metrics['queries'], 0)
+            self.assertGreaterEqual(metrics['p95_ms'], metrics['p50_ms'])
+        # Changes of the benchmarked tasks are rolled back
+        self.assertEqual(entries_count, FeedEntry.objects.count())
+
+    def test_compare(self):
+        baseline = {'cases': {'user_list': {'p95_ms': 10, 'queries': 5, 'peak_memory_kb': 100}}}
+        results = {'cases': {'user_list': {'p95_ms': 12, 'queries': 5, 'peak_memory_kb': 100}}}
+        self.assertEqual([], compare(results, baseline, tolerance=0.25))
+        results['cases']['user_list']['queries'] = 6
+        results['cases']['user_list']['p95_ms'] = 13
+        self.assertEqual(
+            ['user_list: p95_ms 13 (baseline 10)', 'user_list: queries 6 (baseline 5)'],
+            compare(results, baseline, tolerance=0.25),
+        )
@@ -0,0 +1,43 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from dillo import counters
+from dillo.models.profiles import Profile
+from dillo.models.static_assets import StaticAsset
+from dillo.tests.factories.users import UserFactory
+
+
+class BufferedCounterTest(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        self.other_user = UserFactory()
+
+    def get_views_count(self, user) -> int:
+        return Profile.objects.get(user=user).views_count
+
+    @override_settings(COUNTERS_FLUSH_INTERVAL=60)
+    def test_increments_buffered(self):
+        for _ in range(3):
+            counters.profile_views.increment(self.user.id)
+        counters.profile_views.increment(self.other_user.id, 3)
+        self.assertEqual(3, counters.profile_views.get_pending(self.user.id))
+        self.assertEqual(0, self.get_views_count(self.user))
+        with self.assertNumQueries(1):
+            counters.flush()
+        self.assertEqual(3, self.get_views_count(self.user))
+        self.assertEqual(3, self.get_views_count(self.other_user))
+        self.assertEqual(0, counters.profile_views.get_pending(self.user.id))
+
+    def test_increments_flushed_immediately(self):
+        counters.profile_views.increment(self.user.id)
+        self.assertEqual(1, self.get_views_count(self.user))
+
+    def test_video_views_count_increase(self):
+        static_asset = StaticAsset.objects.create(
+            source='ab/abcd.mp4', source_type='video', source_filename='abcd.mp4', user=self.user
+        )
+        url = reverse('video_views_count_increase', kwargs={'video_id': static_asset.id})
+        self.client.post(url)
+        self.client.post(url)
+        static_asset.video.refresh_from_db()
+        self.assertEqual(2, static_asset.video.views_count)
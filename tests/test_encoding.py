@@ -0,0 +1,301 @@
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+import dillo.encoding
+from dillo.coconut import events
+from dillo.encoding.coconut import CoconutEncoder
+from dillo.encoding import STREAM_MANIFEST
+from dillo.encoding.local import (
+    LocalEncoder,
+    EncodingReport,
+    encode_output,
+    get_ffmpeg_command,
+    get_stream_variants,
+    new_job_id,
+)
+from dillo.models.static_assets import StaticAsset, VideoEncodingEvent
+from dillo.tasks.video_processing import process_video_encoding_events
+from dillo.tests.factories.posts import PostFactory
+
+# A short test pattern, quicker to encode than the upload test files
+TEST_VIDEO_STREAMS = [{'codec_type': 'video', 'width': 320, 'height': 240}]
+TEST_VIDEO_LAVFI = 'testsrc=size=320x240:rate=24:duration=2'
+
+
+class EncodingTest(SimpleTestCase):
+    def test_get_outputs(self):
+        outputs = dillo.encoding.get_outputs('ab/abcd.mp4')
+        self.assertEqual(
+            {
+                'jpg:1280x': 'ab/abcd.thumbnail.jpg',
+                'mp4:0x720_3000k': 'ab/abcd.720p.mp4',
+                'httpstream': 'ab/abcd.stream',
+                'webp:240x': 'ab/abcd.preview.webp',
+                'mp4:240x_400k_noa': 'ab/abcd.preview.mp4',
+            },
+            outputs,
+        )
+
+    @override_settings(VIDEO_PREVIEW_FORMATS=['gif'])
+    def test_get_outputs_gif_preview(self):
+        outputs = dillo.encoding.get_outputs('ab/abcd.mp4')
+        self.assertEqual('ab/abcd.preview.gif', outputs['gif:240x'])
+        self.assertNotIn('webp:240x', outputs)
+
+    def test_get_encoder_default(self):
+        self.assertIsInstance(dillo.encoding.get_encoder(), CoconutEncoder)
+
+    @override_settings(VIDEO_ENCODING_BACKEND='local')
+    def test_get_encoder_local(self):
+        self.assertIsInstance(dillo.encoding.get_encoder(), LocalEncoder)
+
+    @override_settings(VIDEO_ENCODING_BACKEND='dillo.encoding.local.LocalEncoder')
+    def test_get_encoder_dotted_path(self):
+        self.assertIsInstance(dillo.encoding.get_encoder(), LocalEncoder)
+
+    @override_settings(FFMPEG_BIN='/opt/ffmpeg')
+    def test_get_ffmpeg_command(self):
+        command = get_ffmpeg_command('mp4:0x720_3000k', 'in.mp4', 'out.720p.mp4')
+        self.assertEqual('/opt/ffmpeg', command[0])
+        self.assertEqual('in.mp4', command[command.index('-i') + 1])
+        self.assertEqual('out.720p.mp4', command[-1])
+
+    def test_get_stream_variants(self):
+        streams = [{'codec_type': 'audio'}, {'codec_type': 'video', 'height': 540}]
+        self.assertEqual([(360, '800k'), (480, '1500k')], get_stream_variants(streams))
+        streams = [{'codec_type': 'video', 'height': 240}]
+        self.assertEqual([(360, '800k')], get_stream_variants(streams))
+
+    def test_get_ffmpeg_command_httpstream(self):
+        streams = [{'codec_type': 'audio'}, {'codec_type': 'video', 'height': 720}]
+        command = get_ffmpeg_command('httpstream', 'in.mp4', 'out.stream', streams)
+        self.assertEqual('out.stream/%v/index.m3u8', command[-1])
+        self.assertEqual('v:0,a:0 v:1,a:1 v:2,a:2', command[command.index('-var_stream_map') + 1])
+
+    def test_realtime_factor(self):
+        self.assertEqual(0, EncodingReport(job_id=1, source_duration=10).realtime_factor)
+        report = EncodingReport(job_id=1, source_duration=10, wall_time=4)
+        self.assertEqual(2.5, report.realtime_factor)
+
+    def test_new_job_id(self):
+        # Never mistaken for a Coconut job id, which is positive
+        self.assertLess(new_job_id(), 0)
+        self.assertNotEqual(new_job_id(), new_job_id())
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg is not available')
+    def test_encode_outputs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src = pathlib.Path(tmp_dir) / 'test.mp4'
+            subprocess.run(
+                ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', TEST_VIDEO_LAVFI, str(src)],
+                check=True,
+            )
+            outputs = dillo.encoding.get_outputs(src.name)
+            outputs['gif:240x'] = 'test.preview.gif'
+            for format, key in outputs.items():
+                dst = pathlib.Path(tmp_dir) / key
+                elapsed = encode_output(format, src, dst, TEST_VIDEO_STREAMS)
+                self.assertGreater(elapsed, 0)
+                if format == 'httpstream':
+                    dst = dst / STREAM_MANIFEST
+                self.assertGreater(dst.stat().st_size, 0)
+
+
+class EncodingEventsTest(TestCase):
+    def setUp(self) -> None:
+        self.post = PostFactory(status='processing')
+        static_asset = StaticAsset.objects.create(
+            source='ab/abcd.mp4',
+            source_type='video',
+            source_filename='abcd.mp4',
+            user=self.post.user,
+        )
+        # The Video is created when saving a StaticAsset of type 'video'
+        self.video = static_asset.video
+
+    def test_process_event_source_transferred(self):
+        job = {
+            'id': 1,
+            'event': 'source.transferred',
+            'metadata': {
+                'source': {
+                    'streams': [
+                        {'codec_type': 'audio'},
+                        {
+                            'codec_type': 'video',
+                            'width': 1280,
+                            'height': 720,
+                            'r_frame_rate': '24/1',
+                        },
+                    ]
+                }
+            },
+        }
+        events.process_event(job, self.video, self.post)
+        self.video.refresh_from_db()
+        self.assertEqual(1, self.video.encoding_job_id)
+        self.assertEqual(24, self.video.framerate)
+        self.assertAlmostEqual(1280 / 720, self.video.aspect)
+
+    def test_process_event_output_processed_stream(self):
+        self.assertIsNone(self.video.url_stream)
+        job = {'id': 1, 'event': 'output.processed', 'format': 'httpstream'}
+        with self.settings(DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage'):
+            events.process_event(job, self.video, self.post)
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.has_stream)
+        self.assertTrue(self.video.url_stream.endswith('/ab/abcd.stream/master.m3u8'))
+
+    def test_process_event_output_processed_preview(self):
+        self.assertTrue(self.video.url_preview.endswith('/ab/abcd.preview.gif'))
+        self.assertIsNone(self.video.url_preview_video)
+        with self.settings(DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage'):
+            for format, url in [
+                ('webp:240x', '/ab/abcd.preview.webp'),
+                ('gif:240x', '/ab/abcd.preview.gif'),
+                ('mp4:240x_400k_noa', '/ab/abcd.preview.mp4'),
+            ]:
+                job = {'id': 1, 'event': 'output.processed', 'format': format, 'url': url}
+                events.process_event(job, self.video, self.post)
+        self.video.refresh_from_db()
+        # The webp preview is kept, even if the gif is processed later
+        self.assertTrue(self.video.url_preview.endswith('/ab/abcd.preview.webp'))
+        self.assertTrue(self.video.url_preview_video.endswith('/ab/abcd.preview.mp4'))
+
+    def test_process_event_job_id_changed(self):
+        self.video.encoding_job_id = 1
+        self.video.encoding_job_status = 'job.completed'
+        self.video.save()
+        job = {'id': 2, 'event': 'job.progress', 'progress': '10%'}
+        events.process_event(job, self.video, self.post)
+        self.video.refresh_from_db()
+        self.assertEqual(2, self.video.encoding_job_id)
+        self.assertIsNone(self.video.encoding_job_status)
+        self.assertEqual('10%', self.video.encoding_job_progress)
+
+
+class ProcessingStatusNotificationTest(TransactionTestCase):
+    def test_process_event_notifies_owner(self):
+        post = PostFactory(status='processing')
+        other_post = PostFactory(status='processing')
+        static_asset = StaticAsset.objects.create(
+            source='ab/abcd.mp4', source_type='video', source_filename='abcd.mp4', user=post.user
+        )
+        job = {'id': 1, 'event': 'job.progress', 'progress': '10%'}
+        with events.ProcessingStatusListener(post.user_id) as listener:
+            self.assertFalse(listener.wait(0))
+            events.process_event(job, static_asset.video, other_post)
+            self.assertFalse(listener.wait(0))
+            events.process_event(job, static_asset.video, post)
+            self.assertTrue(listener.wait(1))
+
+
+class CoconutWebhookTest(TestCase):
+    def setUp(self) -> None:
+        self.post = PostFactory(status='processing')
+        static_asset = StaticAsset.objects.create(
+            source='ab/abcd.mp4',
+            source_type='video',
+            source_filename='abcd.mp4',
+            user=self.post.user,
+        )
+        self.video = static_asset.video
+        self.webhook_url = reverse(
+            'coconut-webhook',
+            kwargs={
+                'content_type_id': self.post.content_type_id,
+                'object_id': self.post.id,
+                'video_id': self.video.id,
+            },
+        )
+
+    def send_event(self, job: dict):
+        response = self.client.post(self.webhook_url, job, content_type='application/json')
+        self.assertEqual(200, response.status_code)
+
+    def test_duplicate_events(self):
+        job = {'id': 1, 'event': 'job.completed'}
+        self.send_event(job)
+        self.send_event(job)
+        self.assertEqual(1, VideoEncodingEvent.objects.count())
+        self.video.refresh_from_db()
+        self.assertEqual('job.completed', self.video.encoding_job_status)
+        self.assertIsNotNone(VideoEncodingEvent.objects.get().processed_at)
+
+    def test_progress_events_coalesced(self):
+        self.send_event({'id': 1, 'event': 'job.progress', 'progress': '10%'})
+        self.send_event({'id': 1, 'event': 'job.progress', 'progress': '45%'})
+        self.assertEqual(1, VideoEncodingEvent.objects.count())
+        self.video.refresh_from_db()
+        self.assertEqual('45%', self.video.encoding_job_progress)
+
+    def test_events_processed_in_order(self):
+        source_transferred = {
+            'id': 1,
+            'event': 'source.transferred',
+            'metadata': {
+                'source': {
+                    'streams': [
+                        {'codec_type': 'video', 'width': 64, 'height': 64, 'r_frame_rate': '25/1'}
+                    ]
+                }
+            },
+        }
+        # Received out of order, and not processed yet
+        for job in [{'id': 1, 'event': 'job.completed'}, source_transferred]:
+            VideoEncodingEvent.objects.create(
+                video=self.video,
+                entity=self.post,
+                job_id=job['id'],
+                event=job['event'],
+                payload=job,
+            )
+        process_video_encoding_events(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual(25, self.video.framerate)
+        self.assertEqual('job.completed', self.video.encoding_job_status)
+        self.assertFalse(VideoEncodingEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_outdated_job_events_skipped(self):
+        self.send_event({'id': 2, 'event': 'job.progress', 'progress': '10%'})
+        self.send_event({'id': 1, 'event': 'job.progress', 'progress': '90%'})
+        self.video.refresh_from_db()
+        self.assertEqual(2, self.video.encoding_job_id)
+        self.assertEqual('10%', self.video.encoding_job_progress)
+
+    @override_settings(COCONUT_API_KEY='key', COCONUT_DECLARED_HOSTNAME='https://dillo.test')
+    def test_coconut_job_after_local_job(self):
+        # Job ids are not ordered across encoders
+        self.video.encoding_job_id = 1700000000
+        self.video.save()
+        with mock.patch('dillo.coconut.job.create', return_value={'id': 3, 'status': 'processing'}):
+            CoconutEncoder().submit(self.post.content_type_id, self.post.id, self.video.id)
+        self.send_event({'id': 3, 'event': 'job.progress', 'progress': '10%'})
+        self.video.refresh_from_db()
+        self.assertEqual(3, self.video.encoding_job_id)
+        self.assertEqual('10%', self.video.encoding_job_progress)
+
+    def test_unknown_ids(self):
+        job = {'id': 1, 'event': 'job.completed'}
+        for kwargs in (
+            {'video_id': self.video.id + 1},
+            {'object_id': self.post.id + 1},
+            {'content_type_id': 0},
+        ):
+            url_kwargs = {
+                'content_type_id': self.post.content_type_id,
+                'object_id': self.post.id,
+                'video_id': self.video.id,
+                **kwargs,
+            }
+            url = reverse('coconut-webhook', kwargs=url_kwargs)
+            response = self.client.post(url, job, content_type='application/json')
+            self.assertEqual(404, response.status_code)
+        self.assertFalse(VideoEncodingEvent.objects.exists())
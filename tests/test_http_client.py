@@ -0,0 +1,95 @@
+import http.server
+import threading
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from dillo import http_client
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Reply with the status code found in the request path, e.g. /status/503."""
+
+    def do_GET(self):
+        status = int(self.path.rsplit('/', 1)[-1]) if self.path.startswith('/status/') else 200
+        self.server.hits.append(self.path)
+        body = b'x' * 100_000 if self.path == '/large' else b'ok'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(HTTP_CLIENT_TIMEOUT=2)
+class HttpClientTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.hits = []
+        cls.host = f'127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.hits.clear()
+        http_client.reset_stats()
+
+    def test_get(self):
+        response = http_client.get(f'http://{self.host}/hello')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'ok', response.content)
+        stats = http_client.get_stats()[self.host]
+        self.assertEqual(1, stats.requests)
+        self.assertEqual(0, stats.errors)
+        self.assertGreater(stats.total_time, 0)
+
+    def test_session_reused_per_host(self):
+        session = http_client.get_session(self.host)
+        self.assertIs(session, http_client.get_session(self.host))
+        self.assertIsNot(session, http_client.get_session('example.com'))
+
+    def test_stream(self):
+        response = http_client.get(f'http://{self.host}/large', stream=True)
+        chunks = list(response.iter_content(chunk_size=http_client.STREAM_CHUNK_SIZE))
+        self.assertEqual(2, len(chunks))
+        self.assertEqual(100_000, sum(len(chunk) for chunk in chunks))
+
+    @override_settings(HTTP_CLIENT_RETRIES=2)
+    def test_retry_idempotent_request(self):
+        response = http_client.get(f'http://{self.host}/status/503')
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(3, len(self.server.hits))
+        stats = http_client.get_stats()[self.host]
+        self.assertEqual(3, stats.errors)
+        self.assertEqual(2, stats.retries)
+
+    def test_no_retry_post_request(self):
+        response = http_client.post(f'http://{self.host}/status/503')
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(1, len(self.server.hits))
+
+    def test_no_retry_client_error(self):
+        response = http_client.get(f'http://{self.host}/status/404')
+        self.assertEqual(404, response.status_code)
+        self.assertEqual(1, len(self.server.hits))
+        self.assertEqual(0, http_client.get_stats()[self.host].errors)
+
+    @override_settings(HTTP_CLIENT_RETRIES=1)
+    def test_connection_error(self):
+        # Nothing listens on port 9 (discard) of localhost
+        with self.assertRaises(requests.ConnectionError):
+            http_client.get('http://127.0.0.1:9/')
+        stats = http_client.get_stats()['127.0.0.1:9']
+        self.assertEqual(2, stats.requests)
+        self.assertEqual(2, stats.errors)
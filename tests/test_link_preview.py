@@ -0,0 +1,109 @@
+import http.server
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from dillo import link_preview
+
+PAGE = b'''<html><head>
+<meta property="og:title" content="A page" />
+<meta property="og:description" content="With a preview" />
+<meta property="og:image" content="http://example.com/image.jpg" />
+</head><body></body></html>'''
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serve a page with Open Graph tags, slowly under /slow."""
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path == '/slow':
+            time.sleep(2)
+        elif self.path == '/delayed':
+            time.sleep(0.3)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(LINK_PREVIEW_TIMEOUT=1)
+class LinkPreviewTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.hits = []
+        # Clients give up on the slow page, ignore the broken pipes
+        cls.server.handle_error = lambda request, client_address: None
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.hits.clear()
+        cache.clear()
+
+    def test_fetch_preview(self):
+        preview, is_complete = link_preview.fetch_preview(f'{self.base_url}/page')
+        self.assertTrue(is_complete)
+        self.assertEqual('A page', preview['title'])
+        self.assertIn('http://example.com/image.jpg', preview['preview'])
+
+    def test_fetch_preview_invalid_url(self):
+        preview, is_complete = link_preview.fetch_preview('')
+        self.assertEqual({'preview': None, 'title': None}, preview)
+        self.assertFalse(is_complete)
+
+    def test_fetch_preview_timeout(self):
+        start = time.monotonic()
+        preview, is_complete = link_preview.fetch_preview(f'{self.base_url}/slow')
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertFalse(is_complete)
+        self.assertEqual(link_preview.UNAVAILABLE_HTML, preview['preview'])
+        self.assertIsNone(preview['title'])
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            'https://youtube.com/watch?t=10&v=abc',
+            link_preview.normalize_url(
+                ' HTTPS://YouTube.com:443/watch?v=abc&utm_source=x&t=10#comments '
+            ),
+        )
+        self.assertEqual(
+            'http://example.com:8080/', link_preview.normalize_url('http://example.com:8080')
+        )
+        self.assertEqual('not a link', link_preview.normalize_url('not a link'))
+
+    def test_get_preview_cached(self):
+        first = link_preview.get_preview(f'{self.base_url}/page')
+        second = link_preview.get_preview(f'{self.base_url}/page?utm_medium=email#top')
+        self.assertEqual(first, second)
+        self.assertEqual(['/page'], self.server.hits)
+
+    @override_settings(LINK_PREVIEW_NEGATIVE_CACHE_TTL=60)
+    def test_get_preview_negative_cache(self):
+        with mock.patch.object(link_preview.cache, 'set') as cache_set:
+            link_preview.get_preview(f'{self.base_url}/slow')
+        self.assertEqual(60, cache_set.call_args[0][2])
+
+    def test_get_preview_coalesced(self):
+        url = f'{self.base_url}/delayed'
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            previews = list(executor.map(link_preview.get_preview, [url] * 4))
+        self.assertEqual(4, len(previews))
+        self.assertEqual('A page', previews[0]['title'])
+        self.assertEqual(['/delayed'], self.server.hits)
@@ -1,21 +1,33 @@
 import datetime
+import io
 import os
 import pathlib
 import tempfile
+from unittest import mock
+
+import PIL.Image
 from actstream import models as models_actstream
 from actstream.actions import unfollow, follow
 from django.core import mail
+from django.core.management import call_command
+from django.db.models import Sum
 from django.test import TestCase, SimpleTestCase, override_settings
 from django.urls import reverse
 from django.utils.text import slugify
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 import dillo.models.events
+import dillo.models.feeds
 import dillo.models.mixins
 import dillo.models.posts
 import dillo.models.profiles
+import dillo.models.tags
+import dillo.tasks.profile
+import dillo.tasks.tags
 from dillo.models.posts import Post
 from dillo.models.comments import Comment
+from dillo.query import search_posts
 from dillo.tests.factories.users import UserFactory
 from dillo.tests.factories.posts import PostFactory
 from dillo.tests.factories.comments import CommentForPostFactory
@@ -97,6 +109,65 @@ class ProfileModelTest(TestCase):
         self.user.profile.save()
         self.assertIsNotNone(self.user.profile.reel)
 
+    @mock.patch('dillo.tasks.profile.providers.request')
+    def test_reel_embed(self, request_oembed):
+        request_oembed.return_value = {'html': '<iframe src="https://vimeo.com"></iframe>'}
+        profile = dillo.models.profiles.Profile.objects.get(user=self.user)
+        profile.reel = 'https://vimeo.com/325910798'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual('<iframe src="https://vimeo.com"></iframe>', profile.reel_embed_html)
+        self.assertIsNotNone(profile.reel_embed_updated_at)
+        request_oembed.assert_called_once_with('https://vimeo.com/325910798')
+        # Removing the reel removes its embed
+        profile = dillo.models.profiles.Profile.objects.get(user=self.user)
+        profile.reel = ''
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual('', profile.reel_embed_html)
+        self.assertIsNone(profile.reel_embed_updated_at)
+
+    @override_settings(
+        DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+        MEDIA_ROOT=tempfile.TemporaryDirectory(prefix='animato_test').name,
+    )
+    @mock.patch('dillo.tasks.storage.http_client.get')
+    @mock.patch('dillo.tasks.profile.providers.request')
+    def test_reel_embed_with_thumbnail(self, request_oembed, http_get):
+        request_oembed.return_value = {
+            'html': '<iframe src="https://vimeo.com"></iframe>',
+            'thumbnail_url': 'https://i.vimeocdn.com/video/1.jpg',
+        }
+        thumbnail = io.BytesIO()
+        PIL.Image.new('RGB', (64, 36)).save(thumbnail, 'JPEG')
+        http_get.return_value.iter_content.return_value = [thumbnail.getvalue()]
+        profile = dillo.models.profiles.Profile.objects.get(user=self.user)
+        profile.reel = 'https://vimeo.com/325910798'
+        profile.save()
+        profile.refresh_from_db()
+        # The embed is kept once the thumbnail is downloaded
+        self.assertEqual('<iframe src="https://vimeo.com"></iframe>', profile.reel_embed_html)
+        self.assertIsNotNone(profile.reel_embed_updated_at)
+        self.assertTrue(profile.reel_thumbnail_16_9.name.endswith('.jpg'))
+        self.assertEqual(64, profile.reel_thumbnail_16_9_width)
+        self.assertEqual(36, profile.reel_thumbnail_16_9_height)
+
+    @mock.patch('dillo.tasks.profile.providers.request')
+    def test_refresh_reel_embeds(self, request_oembed):
+        request_oembed.return_value = {'html': '<iframe></iframe>'}
+        outdated_at = timezone.now() - datetime.timedelta(days=30)
+        dillo.models.profiles.Profile.objects.filter(user=self.user).update(
+            reel='https://vimeo.com/325910798', reel_embed_updated_at=outdated_at
+        )
+        dillo.models.profiles.Profile.objects.exclude(user=self.user).update(
+            reel='https://vimeo.com/1', reel_embed_updated_at=timezone.now()
+        )
+        dillo.tasks.profile.refresh_profile_reel_embeds()
+        request_oembed.assert_called_once_with('https://vimeo.com/325910798')
+        profile = dillo.models.profiles.Profile.objects.get(user=self.user)
+        self.assertEqual('<iframe></iframe>', profile.reel_embed_html)
+        self.assertGreater(profile.reel_embed_updated_at, outdated_at)
+
     def test_first_name_guess(self):
         self.assertIsNone(self.user.profile.first_name_guess)
         # Set name attribute.
@@ -139,6 +210,27 @@ class PostModelTest(TestCase):
         self.assertIn('animato', saved_post.tags.names())
         self.assertIn('con', saved_post.tags.names())
 
+    def test_tag_usage_counts(self):
+        from taggit.models import Tag
+        from dillo.models.tags import TagStats
+
+        post = Post.objects.create(user=self.user, title='Velocità #con #animato')
+        self.user.profile.tags.add('animato')
+        stats = TagStats.objects.get(tag__name='animato')
+        self.assertEqual(2, stats.posts_count)
+        self.assertEqual(1, stats.profiles_count)
+        # Removing the hashtag from the title removes the tag
+        post.title = 'Velocità #con'
+        post.save()
+        self.assertEqual(1, TagStats.objects.get(tag__name='animato').posts_count)
+
+        TagStats.objects.all().delete()
+        call_command('recount_tag_usage', stdout=io.StringIO())
+        stats = TagStats.objects.get(tag__name='animato')
+        self.assertEqual(1, stats.posts_count)
+        self.assertEqual(1, stats.profiles_count)
+        self.assertEqual(1, Tag.objects.get(name='con').stats.posts_count)
+
     def test_post_no_tags(self):
 
         # Create Post without a title
@@ -221,17 +313,46 @@ class PostModelTest(TestCase):
 
     def test_trending_tags(self):
         dillo.models.posts.Post.objects.create(user=self.user, title='Post with #b3d')
+        dillo.tasks.tags.update_trending_tags()
         # Ensure that there are 2 trending tags
         self.assertEqual(len(dillo.models.posts.get_trending_tags()), 2)
         dillo.models.posts.Post.objects.create(user=self.user, title='Post with #b3d')
+        dillo.tasks.tags.update_trending_tags()
         # Ensure that #b3d is at the first place
         self.assertEqual(dillo.models.posts.get_trending_tags()[0].slug, 'b3d')
         # Now add 2 more posts with #animato
         dillo.models.posts.Post.objects.create(user=self.user, title='Post with #animato')
         dillo.models.posts.Post.objects.create(user=self.user, title='Post with #animato')
+        # Trending tags are cached until the next update
+        self.assertEqual(dillo.models.posts.get_trending_tags()[0].slug, 'b3d')
+        dillo.tasks.tags.update_trending_tags()
         # Ensure that #animato is at first place
         self.assertEqual(dillo.models.posts.get_trending_tags()[0].slug, 'animato')
 
+    def test_trending_tags_decay(self):
+        dillo.models.posts.Post.objects.create(user=self.user, title='Post with #b3d')
+        # An older post with the same tag weighs less
+        old_post = dillo.models.posts.Post.objects.create(user=self.user, title='Old #animato')
+        dillo.models.posts.Post.objects.filter(id=old_post.id).update(
+            created_at=timezone.now() - datetime.timedelta(days=3)
+        )
+        with self.settings(TRENDING_TAGS_HALF_LIFE=72):
+            dillo.tasks.tags.update_trending_tags()
+        stats = dillo.models.tags.TagStats.objects.get(tag__name='animato')
+        # The post of the setup, and half of the older post
+        self.assertAlmostEqual(1.5, stats.trending_score, places=2)
+        # Tags used only in posts older than TRENDING_TAGS_DAYS are reset
+        with self.settings(TRENDING_TAGS_DAYS=1):
+            dillo.tasks.tags.update_trending_tags()
+        stats.refresh_from_db()
+        self.assertAlmostEqual(1, stats.trending_score, places=2)
+        dillo.models.posts.Post.objects.filter(tags__name='b3d').update(
+            created_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        with self.settings(TRENDING_TAGS_DAYS=1):
+            dillo.tasks.tags.update_trending_tags()
+        self.assertEqual(0, dillo.models.tags.TagStats.objects.get(tag__name='b3d').trending_score)
+
 
 class CommentModelTest(TestCase):
     def setUp(self):
@@ -320,6 +441,46 @@ class ActivitiesTest(TestCase):
         unfollow(self.user_harry, hogwarts_tag)
         self.assertEqual(0, len(user_stream(self.user_harry)))
 
+    def test_follow_counts(self):
+        from taggit.models import Tag
+        from dillo.models.tags import get_tag_followers_count
+
+        hogwarts_tag = Tag.objects.get(name='hogwarts')
+        follow(self.user_harry, self.user_ron)
+        follow(self.user_harry, hogwarts_tag, actor_only=False)
+        follow(self.user_ron, hogwarts_tag, actor_only=False)
+        self.assertEqual(1, User.objects.get(pk=self.user_ron.pk).profile.followers_count)
+        self.assertEqual(1, User.objects.get(pk=self.user_harry.pk).profile.following_count)
+        self.assertEqual(2, get_tag_followers_count(hogwarts_tag))
+        unfollow(self.user_harry, self.user_ron)
+        unfollow(self.user_harry, hogwarts_tag)
+        self.assertEqual(0, User.objects.get(pk=self.user_ron.pk).profile.followers_count)
+        self.assertEqual(0, User.objects.get(pk=self.user_harry.pk).profile.following_count)
+        self.assertEqual(1, get_tag_followers_count(hogwarts_tag))
+
+    def test_follow_counts_login(self):
+        # Load the profile before it is followed
+        user_ron = User.objects.select_related('profile').get(pk=self.user_ron.pk)
+        follow(self.user_harry, self.user_ron)
+        # Saving the ip on login does not reset the followers count
+        self.client.force_login(user_ron)
+        self.assertEqual(1, User.objects.get(pk=self.user_ron.pk).profile.followers_count)
+
+    def test_recount_follows(self):
+        from taggit.models import Tag
+        from dillo.models.tags import get_tag_followers_count, TagStats
+
+        hogwarts_tag = Tag.objects.get(name='hogwarts')
+        follow(self.user_harry, self.user_ron)
+        follow(self.user_harry, hogwarts_tag, actor_only=False)
+        dillo.models.profiles.Profile.objects.update(followers_count=5, following_count=5)
+        TagStats.objects.all().delete()
+        call_command('recount_follows', stdout=io.StringIO())
+        self.assertEqual(1, User.objects.get(pk=self.user_ron.pk).profile.followers_count)
+        self.assertEqual(0, User.objects.get(pk=self.user_ron.pk).profile.following_count)
+        self.assertEqual(1, User.objects.get(pk=self.user_harry.pk).profile.following_count)
+        self.assertEqual(1, get_tag_followers_count(hogwarts_tag))
+
 
 class TemplateFiltersTest(TestCase):
     def test_tags_parsing(self):
@@ -475,6 +636,18 @@ class FeedElementModelTest(TestCase):
         # We still have one notification, from the previous activity
         self.assertEqual(1, notifications_count)
 
+    def test_comment_notifications_aggregation(self):
+        user3 = UserFactory(username='testuser3')
+        CommentForPostFactory(user=self.user2, content='Nice idea!', entity=self.post)
+        comment = CommentForPostFactory(user=user3, content='Agreed!', entity=self.post)
+        # Comments on the same post are aggregated in one notification
+        notifications = self.user1.feed_entries.filter(category='notification')
+        self.assertEqual(1, notifications.count())
+        notification = notifications.get()
+        self.assertEqual(2, notification.actors_count)
+        self.assertEqual([user3.id, self.user2.id], notification.latest_actor_ids)
+        self.assertEqual(comment.id, notification.action.action_object.id)
+
     def test_user_liked_your_comment_notification(self):
         # Create comment
         comment_content = 'Nice idea! #idea'
@@ -607,6 +780,120 @@ class FeedElementModelTest(TestCase):
         # There will be no entry in the timeline
         self.assertEqual(0, self.user2.feed_entries.filter(category='timeline').count())
 
+    def test_explore_feed_item_grouping(self):
+        ExploreFeedItem = dillo.models.feeds.ExploreFeedItem
+        self.post.publish()
+        new_post = dillo.models.posts.Post.objects.create(user=self.user1, title='Second post')
+        new_post.publish()
+        # Both posts are grouped in the same item
+        item = ExploreFeedItem.objects.get()
+        self.assertEqual(self.post, item.action.action_object)
+        self.assertEqual(1, item.near_actions_count)
+        # Deleting the second post updates the count
+        new_post.delete()
+        item.refresh_from_db()
+        self.assertEqual(0, item.near_actions_count)
+
+    def test_activity_fanout_run_again(self):
+        from dillo.tasks.feeds import activity_fanout_to_feeds
+
+        ExploreFeedItem = dillo.models.feeds.ExploreFeedItem
+        self.post.publish()
+        new_post = dillo.models.posts.Post.objects.create(user=self.user1, title='Second post')
+        new_post.publish()
+        action = dillo.models.feeds.ActionExtra.objects.get(parent_action__isnull=False).action
+        # Running the fanout of an action again does not group it again
+        activity_fanout_to_feeds(action.id)
+        activity_fanout_to_feeds(action.id)
+        item = ExploreFeedItem.objects.get()
+        self.assertEqual(1, item.near_actions_count)
+        self.assertEqual(2, dillo.models.feeds.ActionExtra.objects.count())
+
+    @override_settings(ACTIONS_GROUPING_WINDOW=0)
+    def test_explore_feed_grouping_window(self):
+        self.post.publish()
+        new_post = dillo.models.posts.Post.objects.create(user=self.user1, title='Second post')
+        new_post.publish()
+        # Posts are not grouped, and the group starts from the newest post
+        self.assertEqual(2, dillo.models.feeds.ExploreFeedItem.objects.count())
+        group = dillo.models.feeds.ActionGroup.objects.get()
+        self.assertEqual(new_post, group.parent_action.action_object)
+
+    @override_settings(FEED_FANOUT_SHARD_SIZE=1)
+    def test_fanout_shards(self):
+        from dillo.tasks.feeds import fanout_shard
+
+        user3 = UserFactory(username='testuser3')
+        follow(self.user2, self.user1)
+        follow(user3, self.user1)
+        self.post.publish()
+        action = self.user1.feed_entries.get(category='timeline').action
+        for user in (self.user2, user3):
+            self.assertEqual(1, user.feed_entries.filter(category='timeline').count())
+        # Running a shard again does not duplicate entries
+        fanout_shard(action.id, [self.user2.id, user3.id], 'timeline')
+        self.assertEqual(3, dillo.models.feeds.FeedEntry.objects.filter(action=action).count())
+
+    @override_settings(TIMELINE_REPOPULATION_DEPTH=2)
+    def test_timeline_repopulated_on_follow(self):
+        posts = [self.post] + [
+            dillo.models.posts.Post.objects.create(user=self.user1, title=f'Post {i}')
+            for i in range(2)
+        ]
+        for post in posts:
+            post.publish()
+        # The latest posts are added to the timeline
+        follow(self.user2, self.user1)
+        timeline = self.user2.feed_entries.filter(category='timeline')
+        self.assertEqual({posts[1], posts[2]}, {entry.action.action_object for entry in timeline})
+        # Unfollowing removes all posts
+        unfollow(self.user2, self.user1)
+        self.assertEqual(0, self.user2.feed_entries.filter(category='timeline').count())
+
+    @override_settings(FEED_TIMELINE_MAX_ENTRIES=2, FEED_PRUNING_CHUNK_SIZE=2)
+    def test_prune_feed_entries(self):
+        from dillo.tasks.feeds import prune_feed_entries
+
+        FeedEntry = dillo.models.feeds.FeedEntry
+        action = models_actstream.Action.objects.create(actor=self.user1, verb='tested')
+        timeline = [
+            FeedEntry.objects.create(user=self.user2, action=action, category='timeline')
+            for _ in range(5)
+        ]
+        old_read = FeedEntry.objects.create(user=self.user2, action=action, is_read=True)
+        old_unread = FeedEntry.objects.create(user=self.user2, action=action)
+        recent_read = FeedEntry.objects.create(user=self.user2, action=action, is_read=True)
+        FeedEntry.objects.filter(pk__in=[old_read.pk, old_unread.pk]).update(
+            created_at=timezone.now() - datetime.timedelta(days=100)
+        )
+
+        prune_feed_entries()
+        self.assertEqual(
+            {timeline[3].pk, timeline[4].pk, old_unread.pk, recent_read.pk},
+            set(self.user2.feed_entries.values_list('pk', flat=True)),
+        )
+
+    def test_archive_actions(self):
+        from dillo.tasks.feeds import archive_actions
+
+        Action = models_actstream.Action
+        old_action = Action.objects.create(actor=self.user1, verb='tested')
+        old_in_feed = Action.objects.create(actor=self.user1, verb='tested')
+        recent_action = Action.objects.create(actor=self.user1, verb='tested')
+        dillo.models.feeds.FeedEntry.objects.create(user=self.user2, action=old_in_feed)
+        Action.objects.filter(pk__in=[old_action.pk, old_in_feed.pk]).update(
+            timestamp=timezone.now() - datetime.timedelta(days=400)
+        )
+
+        archive_actions()
+        self.assertFalse(Action.objects.filter(pk=old_action.pk).exists())
+        self.assertTrue(Action.objects.filter(pk=old_in_feed.pk).exists())
+        self.assertTrue(Action.objects.filter(pk=recent_action.pk).exists())
+        archived = dillo.models.feeds.ArchivedAction.objects.get()
+        self.assertEqual(old_action.pk, archived.pk)
+        self.assertEqual('tested', archived.verb)
+        self.assertEqual(str(self.user1.pk), archived.actor_object_id)
+
     def test_post_in_own_timeline(self):
         # User 1 timeline contains one post
         self.assertEqual(0, self.user1.feed_entries.filter(category='timeline').count())
@@ -666,3 +953,50 @@ class ModificationAwarenessMixinTest(TestCase):
     def test_change_awareness_for_profile(self):
         self.user.profile.name = 'James'
         self.user.profile.save()
+
+
+class GenerateCommunityCommandTest(TestCase):
+    def generate(self, prefix: str):
+        call_command(
+            'generate_community',
+            users=30,
+            tags=5,
+            seed=1,
+            prefix=prefix,
+            force=True,
+            stdout=io.StringIO(),
+        )
+        follows = models_actstream.Follow.objects.filter(user__username__startswith=f'{prefix}-')
+        return sorted(
+            (follow.user.username[len(prefix) :], str(follow.follow_object)[len(prefix) :])
+            for follow in follows
+        )
+
+    def test_generate_community(self):
+        follows = self.generate('a')
+        self.assertTrue(follows)
+        self.assertTrue(Post.objects.filter(user__username__startswith='a-').exists())
+        self.assertTrue(
+            dillo.models.feeds.FeedEntry.objects.filter(user__username__startswith='a-').exists()
+        )
+        # Counters are up to date
+        user = User.objects.get(username='a-0')
+        self.assertEqual(
+            models_actstream.Follow.objects.following_qs(user, User).count(),
+            user.profile.following_count,
+        )
+        # Posts are indexed for search
+        posts = Post.objects.filter(user__username__startswith='a-')
+        self.assertFalse(posts.filter(search_vector__isnull=True).exists())
+        self.assertTrue(search_posts('render').filter(user__username__startswith='a-').exists())
+        post_ids = Post.objects.filter(user__username__startswith='a-').values('id')
+        likes_count = dillo.models.mixins.Likes.objects.filter(object_id__in=post_ids).count()
+        self.assertTrue(likes_count)
+        self.assertEqual(
+            likes_count,
+            dillo.models.profiles.Profile.objects.filter(user__username__startswith='a-').aggregate(
+                Sum('likes_count')
+            )['likes_count__sum'],
+        )
+        # The same seed gives the same community
+        self.assertEqual(follows, self.generate('b'))
@@ -1,6 +1,13 @@
-from django.test import SimpleTestCase, Client, override_settings
+import datetime
 
-from dillo.query import parse_text_query
+from django.contrib.postgres.search import SearchQuery
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.utils import timezone
+
+from dillo.models.posts import SEARCH_CONFIG
+from dillo.query import parse_text_query, search_posts
+from dillo.tests.factories.comments import CommentForPostFactory
+from dillo.tests.factories.posts import PostFactory
 
 
 class TestViewsMixin(SimpleTestCase):
@@ -10,26 +17,64 @@ class TestViewsMixin(SimpleTestCase):
     def test_parse_text_query_single_word(self):
         text = 'animation'
         filters = parse_text_query(text, self.filters)
-        self.assertEqual({'title__search': text}, filters)
+        self.assertEqual({'search_vector': SearchQuery(text, config=SEARCH_CONFIG)}, filters)
 
     def test_parse_text_query_multiple_words(self):
         text = 'animation tutorial'
         filters = parse_text_query(text, self.filters)
-        self.assertEqual({'title__search': text}, filters)
+        self.assertEqual({'search_vector': SearchQuery(text, config=SEARCH_CONFIG)}, filters)
 
     def test_parse_text_query_multiple_words_and_user(self):
         text = 'animation tutorial user=harry'
         filters = parse_text_query(text, self.filters)
         self.assertEqual(
-            {'title__search': 'animation tutorial', 'user__username': 'harry'}, filters
+            {
+                'search_vector': SearchQuery('animation tutorial', config=SEARCH_CONFIG),
+                'user__username': 'harry',
+            },
+            filters,
         )
 
     def test_parse_text_query_multiple_words_and_other_query(self):
         text = 'animation tutorial other=content'
         filters = parse_text_query(text, self.filters)
-        self.assertEqual({'title__search': text}, filters)
+        self.assertEqual({'search_vector': SearchQuery(text, config=SEARCH_CONFIG)}, filters)
 
     def test_parse_text_query_only_user(self):
         text = 'user=harry'
         filters = parse_text_query(text, self.filters)
         self.assertEqual({'user__username': 'harry'}, filters)
+
+
+class SearchPostsTest(TestCase):
+    def setUp(self):
+        self.post_old = PostFactory(title='Dragon sculpt timelapse', status='published')
+        self.post_recent = PostFactory(title='Dragon sculpt #timelapse', status='published')
+        self.post_other = PostFactory(title='Walkcycle of a robot', status='published')
+        for post, days in [(self.post_old, 300), (self.post_recent, 1), (self.post_other, 2)]:
+            post.published_at = timezone.now() - datetime.timedelta(days=days)
+            post.save()
+
+    def test_search_posts(self):
+        # Matching posts only, with similar ranks sorted by recency
+        self.assertEqual([self.post_recent, self.post_old], list(search_posts('dragon sculpt')))
+        # Tags are part of the search vector
+        self.assertEqual([self.post_recent], list(search_posts('timelapse'))[:1])
+
+    def test_search_posts_by_author(self):
+        username = self.post_other.user.username
+        self.assertEqual([self.post_other], list(search_posts(f'robot user={username}')))
+        self.assertEqual([], list(search_posts(f'dragon user={username}')))
+        # The author name is part of the search vector too
+        self.assertIn(self.post_other, search_posts(username))
+        profile = self.post_other.user.profile
+        profile.name = 'Harriet'
+        profile.save()
+        self.assertEqual([self.post_other], list(search_posts('harriet')))
+
+    def test_search_posts_commented_by(self):
+        comment = CommentForPostFactory(entity=self.post_old)
+        CommentForPostFactory(entity=self.post_old, user=comment.user)
+        self.assertEqual(
+            [self.post_old], list(search_posts(f'dragon commented-by={comment.user.username}'))
+        )
@@ -1,9 +1,17 @@
+import io
 import tempfile
+from unittest import mock
+
+from actstream.actions import follow
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
+from django.utils.html import escape
+from taggit.models import Tag
 
 import dillo.models
 import dillo.models.events
@@ -12,10 +20,12 @@ import dillo.models.feeds
 from dillo.models.messages import ContentReports
 from dillo.models.posts import Post
 from dillo.models.comments import Comment
-from dillo.models.profiles import Profile
+from dillo.models.directory import DirectoryEntry, get_directory_facet_counts
+from dillo.models.profiles import Badge, Profile
 from dillo.tests.factories.users import UserFactory
 from dillo.tests.factories.comments import CommentForPostFactory
 from dillo.tests.factories.posts import PostFactory
+from dillo.views.users.profile import ProfileSetup, ProfileSetupAvatar
 
 
 class TestViewsMixin(TestCase):
@@ -339,6 +349,23 @@ class NotificationViewsTest(TestViewsMixin):
         ).count()
         self.assertEqual(notifications_count, 0)
 
+    def test_aggregated_notifications_api(self):
+        user3 = UserFactory(username='user3')
+        # Likes of the same post are aggregated in one notification
+        self.post.like_toggle(self.user2)
+        self.post.like_toggle(user3)
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('api-notifications'))
+        results = response.json()['results']
+        self.assertEqual(1, len(results))
+        self.assertEqual('user3', results[0]['actor']['username'])
+        self.assertEqual(2, results[0]['actorsCount'])
+        self.assertEqual(
+            ['user3', 'user2'], [actor['username'] for actor in results[0]['latestActors']]
+        )
+        response = self.client.get(reverse('notifications'))
+        self.assertContains(response, 'and 1 other')
+
 
 @override_settings(STATICFILES_STORAGE='pipeline.storage.PipelineStorage')
 class EventViewsTest(TestCase):
@@ -562,6 +589,34 @@ class SignUpViewTest(TestCase):
         self.assertEqual(user_name, user.profile.name)
 
 
+class ProfileSetupViewTest(TestViewsMixin):
+    @mock.patch('dillo.tasks.profile.download_image_from_web')
+    def test_profile_setup_avatar_gravatar(self, download_image_from_web):
+        request = RequestFactory().get(reverse('profile_setup'))
+        request.user = self.user1
+        response = ProfileSetupAvatar.as_view()(request)
+        self.assertEqual(200, response.status_code)
+        download_image_from_web.assert_called_once()
+        gravatar_url = download_image_from_web.call_args[0][0]
+        self.assertTrue(gravatar_url.startswith('https://www.gravatar.com/avatar/'))
+        # The Gravatar is displayed while it is being downloaded
+        avatar_field = str(response.context_data['form']['avatar'])
+        self.assertIn(escape(gravatar_url), avatar_field)
+
+    @mock.patch('dillo.tasks.profile.download_image_from_web')
+    def test_profile_setup_stage_reset_keeps_counts(self, download_image_from_web):
+        user = User.objects.select_related('profile').get(pk=self.user1.pk)
+        user.profile.setup_stage = 'unknown'
+        # The profile is followed after it was loaded
+        follow(self.user2, self.user1)
+        request = RequestFactory().get(reverse('profile_setup'))
+        request.user = user
+        ProfileSetup.as_view()(request)
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual('avatar', profile.setup_stage)
+        self.assertEqual(1, profile.followers_count)
+
+
 class FollowToggleTest(TestViewsMixin):
     def test_follow_toggle(self):
         post = PostFactory(user=self.user1)
@@ -586,3 +641,211 @@ class FollowToggleTest(TestViewsMixin):
         response = self.client.get(url_follow_toggle)
         self.assertEqual(response.status_code, 200)
         self.assertJSONEqual(response.content, {'status': 'ok', 'action': 'Unfollowed'})
+
+
+class ProcessingStatusViewTest(TestViewsMixin):
+    def setUp(self) -> None:
+        super().setUp()
+        self.post = Post.objects.get(pk=PostFactory(user=self.user1, status='processing').pk)
+        self.url = reverse('api-processing-status')
+
+    def test_processing_posts(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {self.post.hash_id: {'status': 'processing', 'progress': []}},
+            response.json()['posts'],
+        )
+        # Posts followed by the page are reported once published
+        self.post.status = 'published'
+        self.post.save()
+        response = self.client.get(self.url, {'post': self.post.hash_id})
+        self.assertEqual('published', response.json()['posts'][self.post.hash_id]['status'])
+
+    @override_settings(PROCESSING_STATUS_TIMEOUT=0)
+    def test_processing_posts_unchanged(self):
+        self.client.force_login(self.user1)
+        version = self.client.get(self.url).json()['version']
+        # Without changes, the same statuses are returned once timed out
+        response = self.client.get(self.url, {'version': version})
+        self.assertEqual(version, response.json()['version'])
+        self.assertEqual('processing', response.json()['posts'][self.post.hash_id]['status'])
+
+    def test_other_user(self):
+        self.client.force_login(self.user2)
+        response = self.client.get(self.url, {'post': self.post.hash_id})
+        self.assertEqual({}, response.json()['posts'])
+
+    def test_anonymous(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+
+class UserFromOembedLinkViewTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.url = reverse('api-user-from-oembed-link')
+        self.profile = {
+            'username': 'blender',
+            'url_profile': 'https://vimeo.com/blender',
+            'url_content': 'https://vimeo.com/325910798',
+            'fullname': 'Blender',
+            'extractor': 'vimeo',
+            'extractor_key': 'Vimeo',
+        }
+
+    @mock.patch('dillo.views.user_from_oembed_link.extract_profile')
+    def test_profile_cached(self, extract_profile):
+        extract_profile.return_value = self.profile
+        response = self.client.get(self.url, {'postContentUrl': 'https://vimeo.com/325910798'})
+        self.assertJSONEqual(response.content, self.profile)
+        # The same link, with a fragment, is not extracted again
+        response = self.client.get(self.url, {'postContentUrl': 'https://vimeo.com/325910798#t=5'})
+        self.assertJSONEqual(response.content, self.profile)
+        extract_profile.assert_called_once_with('https://vimeo.com/325910798')
+
+    @mock.patch('dillo.views.user_from_oembed_link.extract_profile')
+    def test_profile_not_found(self, extract_profile):
+        extract_profile.return_value = None
+        for _ in range(2):
+            response = self.client.get(self.url, {'postContentUrl': 'https://example.com/video'})
+            self.assertEqual(response.status_code, 404)
+        extract_profile.assert_called_once()
+
+    def test_no_url(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class ExploreFeedEmbedViewTest(TestCase):
+    def setUp(self) -> None:
+        self.posts = []
+        for i in range(6):
+            post = PostFactory(user=UserFactory(username=f'user{i}'), title=f'Post {i}')
+            post.publish()
+            self.posts.append(post)
+
+    def test_keyset_pagination(self):
+        url = reverse('embed-explore-feed')
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        items = response.context['object_list']
+        # Newest first, and one more page
+        self.assertEqual(self.posts[:0:-1], [item.action.action_object for item in items])
+        next_cursor = response.context['next_cursor']
+        self.assertIsNotNone(next_cursor)
+
+        response = self.client.get(url, {'cursor': next_cursor})
+        items = response.context['object_list']
+        self.assertEqual([self.posts[0]], [item.action.action_object for item in items])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('embed-explore-feed'), {'cursor': 'nope'})
+        self.assertEqual(404, response.status_code)
+
+
+class TagsAutocompleteViewTest(TestCase):
+    def setUp(self) -> None:
+        user = UserFactory()
+        PostFactory(user=user, title='First #animation #animatic')
+        PostFactory(user=user, title='Second #animation')
+        PostFactory(user=user, title='Third #rigging')
+        user.profile.tags.add('animatic')
+        self.url = reverse('api-tags-autocomplete')
+
+    def test_autocomplete(self):
+        response = self.client.get(self.url, {'q': '#Anim'})
+        self.assertEqual(
+            [
+                {'value': 'animation', 'label': 'animation', 'count': 2},
+                {'value': 'animatic', 'label': 'animatic', 'count': 1},
+            ],
+            response.json()['tags'],
+        )
+        response = self.client.get(self.url, {'q': 'anim', 'type': 'profile'})
+        self.assertEqual(['animatic'], [tag['value'] for tag in response.json()['tags']])
+        # Without prefix, the most used tags
+        response = self.client.get(self.url, {'limit': 1})
+        self.assertEqual(['animation'], [tag['value'] for tag in response.json()['tags']])
+
+    def test_autocomplete_invalid_type(self):
+        response = self.client.get(self.url, {'type': 'user'})
+        self.assertEqual(400, response.status_code)
+
+
+class UserDirectoryViewsTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.badge = Badge.objects.create(
+            name='Mentor',
+            slug='mentor',
+            description='Mentor',
+            image='badges/mentor.png',
+            image_width=64,
+            image_height=64,
+        )
+        self.user1 = UserFactory(username='user1')
+        self.user1.profile.tags.add('animation', 'rigging')
+        self.user1.profile.badges.add(self.badge)
+        PostFactory(user=self.user1)
+        self.user2 = UserFactory(username='user2')
+        self.user2.profile.tags.add('animation')
+        self.inactive_user = UserFactory(username='inactive')
+        self.inactive_user.profile.tags.add('animation')
+        self.inactive_user.is_active = False
+        self.inactive_user.save()
+        # The posts count is updated periodically
+        call_command('update_user_directory', stdout=io.StringIO())
+
+    def get_usernames(self, **params):
+        response = self.client.get(reverse('api-user-list'), params)
+        self.assertEqual(200, response.status_code)
+        return [entry.profile.user.username for entry in response.context['page_obj']]
+
+    def test_directory_entries(self):
+        entry = DirectoryEntry.objects.get(profile_id=self.user1.id)
+        self.assertEqual(1, entry.posts_count)
+        self.assertEqual([self.badge.id], entry.badge_ids)
+        self.assertEqual(2, len(entry.tag_ids))
+        self.assertFalse(DirectoryEntry.objects.filter(profile_id=self.inactive_user.id).exists())
+        # Entries are updated via signals
+        self.user1.profile.tags.remove('rigging')
+        self.user1.profile.badges.clear()
+        entry.refresh_from_db()
+        self.assertEqual([], entry.badge_ids)
+        self.assertEqual(1, len(entry.tag_ids))
+
+    def test_directory_entry_profile_save(self):
+        profile = Profile.objects.get(user=self.user2)
+        with mock.patch('dillo.models.directory.update_directory_entries') as update_entries:
+            # Saves that do not change the directory do not update it
+            profile.ip_address = '127.0.0.1'
+            profile.save(update_fields=['ip_address'])
+            profile.bio = 'Animator'
+            profile.save()
+            update_entries.assert_not_called()
+        profile.is_looking_for_work = True
+        profile.save()
+        self.assertTrue(DirectoryEntry.objects.get(profile_id=self.user2.id).is_looking_for_work)
+
+    def test_user_list_filters(self):
+        self.assertEqual(['user1', 'user2'], sorted(self.get_usernames()))
+        self.assertEqual(['user1'], self.get_usernames(tag='rigging'))
+        self.assertEqual(
+            ['user1', 'user2'], self.get_usernames(tag='animation', sort='-posts_count')
+        )
+        self.assertEqual(['user1'], self.get_usernames(badge=self.badge.id))
+        self.assertEqual([], self.get_usernames(tag='unknown'))
+
+    def test_facet_counts(self):
+        facet_counts = get_directory_facet_counts(False)
+        animation = Tag.objects.get(name='animation')
+        self.assertEqual(2, facet_counts['tags'][animation.id])
+        self.assertEqual({self.badge.id: 1}, facet_counts['badges'])
+        # Counts are cached until the next update of the directory
+        self.user2.profile.badges.add(self.badge)
+        self.assertEqual({self.badge.id: 1}, get_directory_facet_counts(False)['badges'])
+        call_command('update_user_directory', stdout=io.StringIO())
+        self.assertEqual({self.badge.id: 2}, get_directory_facet_counts(False)['badges'])